@@ -1,75 +1,433 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 import pandas as pd
 import numpy as np
 import json
 import os
+import gc
 import glob
+import hashlib
+import signal
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+
+from measure_store import (
+    build_measure_store, build_place_store, data_version,
+    COUNTY_RESPONSE_COLUMNS, STATE_RESPONSE_COLUMNS, VALUE_DECIMALS
+)
+from sdoh_store import open_sdoh_store, write_sdoh_columns
+from overlay import CLASS_COLUMNS, build_overlay, overlay_columns
+from wire_format import columns_response as encode_columns_response, matrix_json_chunks, negotiate_format
+from spatial_index import GridIndex, parse_bbox, snap_bbox
+from clusters import build_cluster_pyramid_from_stores, load_cluster_pyramid
+from measure_stats import summarize_values
+from health_score import HealthScoreEngine, DEFAULT_WEIGHTS
+from hotspots import HotspotEngine, PERMUTATIONS, SIGNIFICANCE, WEIGHT_KINDS, cluster_labels, hotspot_labels, load_or_build_weights
+from correlation import METHODS, DEFAULT_TOP_K, load_or_build_correlations
+from manifest import load_manifest_version
+from place_ingest import ingest_place_data
+from profiling import RequestProfiler
+from ranking import DEFAULT_K as DEFAULT_RANK_K, MAX_K as MAX_RANK_K, ORDERS as RANK_ORDERS, StateSegments, rank_rows
+from similarity import DEFAULT_K as DEFAULT_SIMILAR_K, MAX_K as MAX_SIMILAR_K, SimilarityEngine
+from snapshot import DataSnapshot, SnapshotHolder
+from instrumentation import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestTimer, cache_lookups, queued_logger, render_metrics,
+    snapshot_load_seconds
+)
+from response_cache import CachedResponse, ResponseCache, VERSION_PARAM, code_version
+from rollup import (
+    LEVELS, aggregate_data_by_state, build_rollup_cube_from_stores, load_rollup_cube
+)
 
 app = Flask(__name__)
 
+# Records are written by a listener thread, off the request path
+log = queued_logger('health_equity')
+
+# Geographies served by the measure endpoints (?level=)
+GEO_LEVELS = ['county', 'place']
+
+# /api/measures-matrix streams its JSON body from this many measures up
+MATRIX_STREAM_MEASURES = 64
+
+MATRIX_GEO_COLUMNS = ['CountyFIPS', 'LocationName', 'StateDesc', 'lat', 'lng', 'TotalPopulation']
+
+# Largest /api/catchment radius (miles) and nearest-county count
+MAX_CATCHMENT_MILES = 500
+MAX_CATCHMENT_COUNTIES = 500
+
 # Global variables for caching
-locations_data = None
-measures_data = None
-sdoh_data = None
-sdoh_measures_data = None
+response_cache = ResponseCache()
 
-def load_locations_data():
-    """Load preprocessed county locations data"""
-    global locations_data
-    if locations_data is None:
+# Opt-in request profiles (HEALTH_EQUITY_PROFILE_* environment variables, see profiling.py)
+profiler = RequestProfiler.from_environ()
+
+def request_phase(phase):
+    """Context manager booking its time to a phase of the current request's metrics"""
+    timer = g.get('timer') if has_request_context() else None
+    return nullcontext() if timer is None else timer.phase(phase)
+
+def request_route():
+    """Metrics label of the request: its URL rule, so every measure shares one series"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() that books its encoding time to the request's serialize phase"""
+    
+    def response(self, *args, **kwargs):
+        with request_phase('serialize'):
+            return super().response(*args, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def columns_response(*args, **kwargs):
+    with request_phase('serialize'):
+        return encode_columns_response(*args, **kwargs)
+
+@app.before_request
+def start_request_timer():
+    g.timer = RequestTimer()
+
+@app.after_request
+def record_request_metrics(response):
+    timer = g.pop('timer', None)
+    if timer is not None:
+        # Streamed bodies have no length until they are sent
+        body_bytes = None if response.is_streamed else response.content_length
+        timer.record(request_route(), response.status_code, body_bytes)
+    return response
+
+@app.before_request
+def start_request_profile():
+    if profiler.enabled and request.path.startswith('/api/') and profiler.wants(request.headers):
+        g.profile = profiler.start()
+
+@app.after_request
+def save_request_profile(response):
+    sampler = g.pop('profile', None)
+    if sampler is not None:
         try:
-            locations_data = pd.read_csv('data/county_locations_summary.csv')
-            # Ensure TotalPopulation is numeric (handle comma-separated values)
-            locations_data['TotalPopulation'] = locations_data['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
-            print(f"Loaded {len(locations_data)} county locations from cache")
-        except FileNotFoundError:
-            print("County locations summary not found, creating from raw data...")
-            create_county_locations_summary()
-            locations_data = pd.read_csv('data/county_locations_summary.csv')
-            # Ensure TotalPopulation is numeric (handle comma-separated values)
-            locations_data['TotalPopulation'] = locations_data['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
-    return locations_data
+            name = profiler.finish(sampler, route=request_route(), path=request.full_path.rstrip('?'),
+                                   status=response.status_code)
+            response.headers['X-Profile-Id'] = name
+        except OSError as e:
+            # A profile is never worth failing the request it measured
+            log.warning(f"Could not save request profile: {e}")
+    return response
+
+def read_locations_data():
+    """Read preprocessed county locations data"""
+    try:
+        locations = pd.read_csv('data/county_locations_summary.csv')
+        log.info(f"Loaded {len(locations)} county locations from cache")
+    except FileNotFoundError:
+        log.info("County locations summary not found, creating from raw data...")
+        create_county_locations_summary()
+        locations = pd.read_csv('data/county_locations_summary.csv')
+    # Ensure TotalPopulation is numeric (handle comma-separated values)
+    locations['TotalPopulation'] = locations['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
+    return locations
+
+def read_measures_data():
+    """Read available measures"""
+    try:
+        measures = pd.read_csv('data/available_measures.csv')
+        log.info(f"Loaded {len(measures)} measures from cache")
+    except FileNotFoundError:
+        log.info("Measures data not found, creating from raw data...")
+        create_measures_list()
+        measures = pd.read_csv('data/available_measures.csv')
+    return measures
+
+def open_sdoh_columns(locations):
+    """Memory-map the SDOH columns (built from the cleaned CSV if missing)"""
+    store = open_sdoh_store()
+    if store is None and os.path.exists('data/sdoh_county_cleaned.csv'):
+        log.info("SDOH columns not found, creating from cleaned SDOH data...")
+        sdoh_df = pd.read_csv('data/sdoh_county_cleaned.csv', dtype={'CountyFIPS': str})
+        sdoh_df['CountyFIPS'] = sdoh_df['CountyFIPS'].str.zfill(5)
+        write_sdoh_columns(sdoh_df, locations['CountyFIPS'])
+        del sdoh_df
+        store = open_sdoh_store()
+    if store is None:
+        log.warning("SDOH data not found")
+    else:
+        # Join county names and coordinates once instead of per request; the SDOH
+        # rows are keyed by zero-padded FIPS strings, /api/locations keeps its ints
+        store.attach_locations(locations.assign(CountyFIPS=locations['CountyFIPS'].astype(str).str.zfill(5)))
+        log.info(f"Mapped {len(store.columns)} SDOH columns for {len(store)} counties")
+    return store
+
+def read_sdoh_measures_data():
+    """Read SDOH measures"""
+    try:
+        sdoh_measures = pd.read_csv('data/sdoh_measures.csv')
+        log.info(f"Loaded {len(sdoh_measures)} SDOH measures from cache")
+    except FileNotFoundError:
+        log.info("SDOH measures not found")
+        sdoh_measures = pd.DataFrame()
+    return sdoh_measures
+
+def read_rollup_cube(store, sdoh_store):
+    """Load the persisted county -> state -> division -> nation rollups"""
+    cube = load_rollup_cube()
+    if cube is None:
+        log.info("Rollups not found, building from resident data...")
+        cube = build_rollup_cube_from_stores(store, sdoh_store)
+    elif sdoh_store is not None and not cube.has_measure('sdoh', sdoh_store.columns[0]):
+        log.info("Rollups predate the SDOH columns, rebuilding from resident data...")
+        cube = build_rollup_cube_from_stores(store, sdoh_store)
+    log.info(f"Loaded rollups for {len(cube.measures)} measures")
+    return cube
+
+def read_cluster_pyramid(store, sdoh_store):
+    """Load the persisted zoom-level cluster pyramid"""
+    pyramid = load_cluster_pyramid()
+    if pyramid is None:
+        log.info("Clusters not found, building from resident data...")
+        pyramid = build_cluster_pyramid_from_stores(store, sdoh_store)
+    elif sdoh_store is not None and not pyramid.has_measure('sdoh', sdoh_store.columns[0]):
+        log.info("Clusters predate the SDOH columns, rebuilding from resident data...")
+        pyramid = build_cluster_pyramid_from_stores(store, sdoh_store)
+    log.info(f"Loaded clusters for {len(pyramid.measures)} measures at zooms {sorted(pyramid.zooms)}")
+    return pyramid
+
+def read_correlations(store, sdoh_store):
+    """Load the health x SDOH correlation matrix, computing it once per data version"""
+    if sdoh_store is None:
+        return None
+    matrix, version = load_or_build_correlations(store, sdoh_store)
+    log.info(f"Loaded correlations for {len(matrix.health_measures)} x {len(matrix.sdoh_columns)} measures (version {version})")
+    return matrix
+
+def read_spatial_weights(store):
+    """Load the county spatial weights, building them once per set of centroids"""
+    weights, version = load_or_build_weights(store)
+    log.info(f"Loaded spatial weights ({', '.join(f'{kind}: {w.indices.size} links' for kind, w in weights.items())}, version {version})")
+    return weights
+
+def build_snapshot():
+    """Load every resident structure into a new, fully built snapshot"""
+    started = time.perf_counter()
+    manifest_version = load_manifest_version()
+    
+    locations = read_locations_data()
+    store = build_measure_store()
+    log.info(f"Loaded {store.values.shape[1]} measures for {len(store)} counties into memory")
+    place = build_place_store()
+    if place is None:
+        log.info("Place-level data not found")
+    else:
+        log.info(f"Loaded {place.values.shape[1]} measures for {len(place)} places into memory")
+    sdoh = open_sdoh_columns(locations)
+    
+    # Grid indexes over the county ('health'), place and SDOH rows
+    indexes = {'health': GridIndex(store.geo['lat'], store.geo['lng'])}
+    if place is not None:
+        indexes['place'] = GridIndex(place.geo['lat'], place.geo['lng'])
+    if sdoh is not None:
+        indexes['sdoh'] = GridIndex(sdoh.geo['lat'], sdoh.geo['lng'])
+    
+    # Rows of each state in the same stores, for rankings within a state
+    segments = {'health': StateSegments(store.geo['StateDesc'].values)}
+    if place is not None:
+        segments['place'] = StateSegments(place.geo['StateDesc'].values)
+    if sdoh is not None:
+        segments['sdoh'] = StateSegments(sdoh.geo['StateDesc'])
+    
+    # The preprocessing manifest already hashes every data file; hash the arrays without one
+    version = manifest_version
+    if version is None:
+        arrays = [store.values, store.low, store.high]
+        if sdoh is not None:
+            arrays.append(sdoh.matrix)
+        version = data_version(*arrays)
+    version = hashlib.sha1((version + code_version()).encode()).hexdigest()[:16]
+    
+    snapshot = DataSnapshot(
+        locations_data=locations,
+        measures_data=read_measures_data(),
+        measure_store=store,
+        place_store=place,
+        sdoh_store=sdoh,
+        sdoh_measures_data=read_sdoh_measures_data(),
+        rollup_cube=read_rollup_cube(store, sdoh),
+        cluster_pyramid=read_cluster_pyramid(store, sdoh),
+        correlations=read_correlations(store, sdoh),
+        health_score_engine=HealthScoreEngine(store),
+        similarity_engine=SimilarityEngine(store, sdoh, place),
+        hotspot_engine=HotspotEngine(store, sdoh, read_spatial_weights(store)),
+        spatial_indexes=indexes,
+        state_segments=segments,
+        measure_stats_cache={},
+        manifest_version=manifest_version,
+        version=version,
+        loaded_at=time.time(),
+        load_seconds=time.perf_counter() - started,
+    )
+    snapshot_load_seconds.observe(snapshot.load_seconds)
+    log.info(f"Built data snapshot {version} in {snapshot.load_seconds:.2f}s")
+    return snapshot
+
+# Cached responses of an old snapshot can never be hit again, so a swap drops them
+snapshots = SnapshotHolder(build_snapshot, on_swap=lambda snapshot: response_cache.clear())
+
+def current_snapshot():
+    """The request's data snapshot, pinned on first use so a swap mid-request can't mix versions"""
+    if not has_request_context():
+        return snapshots.get()
+    if 'snapshot' not in g:
+        with request_phase('load'):
+            g.snapshot = snapshots.get()
+    return g.snapshot
+
+@app.before_request
+def watch_manifest():
+    # One watcher per process (also per pre-forked worker)
+    snapshots.watch(load_manifest_version)
+
+def load_locations_data():
+    return current_snapshot().locations_data
 
 def load_measures_data():
-    """Load available measures"""
-    global measures_data
-    if measures_data is None:
-        try:
-            measures_data = pd.read_csv('data/available_measures.csv')
-            print(f"Loaded {len(measures_data)} measures from cache")
-        except FileNotFoundError:
-            print("Measures data not found, creating from raw data...")
-            create_measures_list()
-            measures_data = pd.read_csv('data/available_measures.csv')
-    return measures_data
-
-def load_sdoh_data():
-    """Load SDOH county data"""
-    global sdoh_data
-    if sdoh_data is None:
-        try:
-            sdoh_data = pd.read_csv('data/sdoh_county_cleaned.csv')
-            print(f"Loaded {len(sdoh_data)} SDOH county records from cache")
-        except FileNotFoundError:
-            print("SDOH data not found")
-            sdoh_data = pd.DataFrame()
-    return sdoh_data
+    return current_snapshot().measures_data
+
+def load_measure_store():
+    """Resident county x measure store"""
+    return current_snapshot().measure_store
+
+def load_place_store():
+    """Resident place (city/town) x measure store, or None without place-level files"""
+    return current_snapshot().place_store
+
+def load_sdoh_store():
+    """Memory-mapped SDOH columns, or None without SDOH data"""
+    return current_snapshot().sdoh_store
 
 def load_sdoh_measures_data():
-    """Load SDOH measures"""
-    global sdoh_measures_data
-    if sdoh_measures_data is None:
+    return current_snapshot().sdoh_measures_data
+
+def load_rollup_cube_data():
+    return current_snapshot().rollup_cube
+
+def load_cluster_pyramid_data():
+    return current_snapshot().cluster_pyramid
+
+def load_correlations():
+    return current_snapshot().correlations
+
+def load_health_score_engine():
+    return current_snapshot().health_score_engine
+
+def load_similarity_engine():
+    return current_snapshot().similarity_engine
+
+def load_hotspot_engine():
+    return current_snapshot().hotspot_engine
+
+def load_spatial_index(source):
+    """Grid index over the rows of the county ('health'), place ('place') or SDOH ('sdoh') store"""
+    return current_snapshot().spatial_indexes[source]
+
+def load_state_segments(source):
+    """Per-state row positions of the county ('health'), place ('place') or SDOH ('sdoh') store"""
+    return current_snapshot().state_segments[source]
+
+def load_data_version():
+    """Version of the served data and code, used for ETags and immutable URLs"""
+    return current_snapshot().version
+
+def measure_level():
+    """Geography of the request's level= parameter ('county' by default, or 'place')"""
+    level = request.args.get('level', 'county')
+    if level not in GEO_LEVELS:
+        raise ValueError(f"Unknown level, expected one of {GEO_LEVELS}")
+    return level
+
+def load_level_store(level):
+    """Resident measure store of a geography level (None if it is not available)"""
+    return load_place_store() if level == 'place' else load_measure_store()
+
+def viewport_rows(source):
+    """Row mask for the request's bbox= (and optional zoom=), or None for every county"""
+    bbox = request.args.get('bbox')
+    if not bbox:
+        return None
+    bbox = parse_bbox(bbox)
+    zoom = request.args.get('zoom', type=float)
+    if zoom is not None:
+        bbox = snap_bbox(bbox, zoom)
+    return load_spatial_index(source).mask(bbox)
+
+def preload_data():
+    """Build and publish the data snapshot now, instead of on the first request"""
+    return snapshots.get()
+
+def create_app(preload=True):
+    """Application factory for pre-fork servers, e.g.
+    
+        gunicorn --preload -w 4 'app:create_app()'
+    
+    With --preload the data is loaded once in the master before it forks,
+    so every worker shares the resident arrays copy-on-write (the SDOH
+    columns are memory-mapped and shared through the page cache) instead of
+    loading its own copy.  gc.freeze() moves the loaded objects out of the
+    collector's reach, so collections in the workers don't write to (and
+    copy) their pages.  Without ``preload`` the snapshot is built in a
+    background thread; /readyz reports when it is published.
+    
+    SIGHUP rebuilds and swaps the snapshot in the process that receives it,
+    as does a new preprocessing manifest version (see snapshot.py).
+    """
+    if preload:
+        preload_data()
+        gc.freeze()
+    else:
+        threading.Thread(target=snapshots.get, name='snapshot-load', daemon=True).start()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: snapshots.reload_async())
+    return app
+
+def cached_response(view):
+    """Serve a GET endpoint from the pre-serialized, pre-compressed response cache
+    
+    Entries are keyed by path, query and negotiated format for the current
+    data version; only 200 responses are stored.  Requests carrying the
+    current version as ?v= are marked immutable.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
         try:
-            sdoh_measures_data = pd.read_csv('data/sdoh_measures.csv')
-            print(f"Loaded {len(sdoh_measures_data)} SDOH measures from cache")
-        except FileNotFoundError:
-            print("SDOH measures not found")
-            sdoh_measures_data = pd.DataFrame()
-    return sdoh_measures_data
+            fmt = negotiate_format(request)
+        except ValueError:
+            return view(*args, **kwargs)
+        
+        version = load_data_version()
+        query = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != VERSION_PARAM))
+        key = (request.path, query, fmt, version)
+        
+        entry = response_cache.get(key)
+        cache_lookups.inc(request_route(), 'miss' if entry is None else 'hit')
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            # Streamed bodies are sent as produced, not buffered into the cache
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            with request_phase('serialize'):
+                entry = CachedResponse(response.get_data(), response.mimetype, version)
+            response_cache.put(key, entry)
+        
+        return entry.serve(request, immutable=request.args.get(VERSION_PARAM) == version)
+    return wrapper
 
 def create_county_locations_summary():
     """Create county locations summary from raw data (one-time setup)"""
-    print("Creating county locations summary from raw data...")
+    log.info("Creating county locations summary from raw data...")
     
     # Load the county dataset
     df = pd.read_csv('data/PLACES__County_Data_(GIS_Friendly_Format),_2020_release_20250914.csv')
@@ -109,57 +467,31 @@ def create_county_locations_summary():
     
     # Save county summary
     counties.to_csv('data/county_locations_summary.csv', index=False)
-    print(f"Saved {len(counties)} counties to county_locations_summary.csv")
+    log.info(f"Saved {len(counties)} counties to county_locations_summary.csv")
 
 def create_locations_summary():
     """Create locations summary from raw data (one-time setup)"""
-    print("Creating locations summary from raw data...")
-    
-    # Load the full dataset
-    df = pd.read_csv('data/PLACES__Local_Data_for_Better_Health,_Place_Data_2020_release_20250913.csv')
-    
-    # Clean data
-    df = df.dropna(subset=['Data_Value', 'Geolocation'])
-    df['Data_Value'] = pd.to_numeric(df['Data_Value'], errors='coerce')
-    df = df.dropna(subset=['Data_Value'])
+    log.info("Creating locations summary from raw data...")
     
-    # Extract coordinates
-    df['lat'] = df['Geolocation'].str.extract(r'POINT \(([^ ]+) ([^)]+)\)')[1].astype(float)
-    df['lng'] = df['Geolocation'].str.extract(r'POINT \(([^ ]+) ([^)]+)\)')[0].astype(float)
-    df = df.dropna(subset=['lat', 'lng'])
-    
-    # Create locations summary
-    locations = df.groupby(['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation']).size().reset_index(name='measure_count')
+    # Stream the place-level file in chunks rather than loading it whole
+    locations = ingest_place_data(create_short_measure_name).locations()
     
     # Save to file
     os.makedirs('data', exist_ok=True)
     locations.to_csv('data/locations_summary.csv', index=False)
-    print(f"Created locations summary with {len(locations)} locations")
+    log.info(f"Created locations summary with {len(locations)} locations")
 
 def create_measures_list():
     """Create measures list from raw data (one-time setup)"""
-    print("Creating measures list from raw data...")
-    
-    # Load the full dataset to get all measures
-    df = pd.read_csv('data/PLACES__Local_Data_for_Better_Health,_Place_Data_2020_release_20250913.csv')
-    
-    # Get unique measures and create short names
-    measures = df['Measure'].unique()
-    measures_data = []
-    
-    for measure in measures:
-        short_name = create_short_measure_name(measure)
-        measures_data.append({
-            'Measure_Clean': measure,
-            'Measure_Short': short_name
-        })
+    log.info("Creating measures list from raw data...")
     
-    measures_df = pd.DataFrame(measures_data)
+    # Stream the place-level file in chunks rather than loading it whole
+    measures_df = ingest_place_data(create_short_measure_name).measures()
     
     # Save to file
     os.makedirs('data', exist_ok=True)
     measures_df.to_csv('data/available_measures.csv', index=False)
-    print(f"Created measures list with {len(measures_df)} measures")
+    log.info(f"Created measures list with {len(measures_df)} measures")
 
 def create_short_measure_name(measure):
     """Create a shorter, more readable measure name"""
@@ -198,16 +530,24 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/locations')
+@cached_response
 def get_locations():
     """API endpoint to get locations data"""
     try:
         locations_df = load_locations_data()
+        try:
+            rows = viewport_rows('health')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if rows is not None:
+            locations_df = locations_df[rows]
         result = locations_df.to_dict('records')
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/measures')
+@cached_response
 def get_measures():
     """API endpoint to get available measures"""
     try:
@@ -218,149 +558,191 @@ def get_measures():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/state-measure-data/<measure_name>')
+@cached_response
 def get_state_measure_data(measure_name):
     """API endpoint to get state aggregate data for a specific measure"""
     try:
-        # Check if we have a preprocessed county state file for this measure
-        safe_filename = create_safe_filename(measure_name)
-        county_state_measure_file = f'data/county_state_measures/{safe_filename}'
-        
-        if os.path.exists(county_state_measure_file):
-            # Load from preprocessed county state file
-            state_data = pd.read_csv(county_state_measure_file)
-            # Ensure TotalPopulation is numeric (handle comma-separated values)
-            state_data['TotalPopulation'] = state_data['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
-            print(f"Loaded {len(state_data)} state records from preprocessed county file: {county_state_measure_file}")
+        try:
+            fmt = negotiate_format(request)
+            level = measure_level()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        store = load_level_store(level)
+        if store is None or not store.has_measure(measure_name):
+            return jsonify([])
+        
+        if level == 'place':
+            # Places have no rollup cube; the response cache keeps the aggregate
+            state_data = aggregate_data_by_state(store.county_frame(measure_name))
         else:
-            # Fallback: aggregate from county data
-            print(f"State file not found, aggregating from county data for measure: {measure_name}")
-            measure_data = get_measure_data(measure_name)
-            if len(measure_data) == 0:
-                return jsonify([])
-            
-            # Aggregate by state
-            state_data = aggregate_data_by_state(measure_data)
-            print(f"Aggregated {len(state_data)} state records from county data")
+            cube = load_rollup_cube_data()
+            if cube.has_measure('health', measure_name):
+                state_data = rollup_frame(cube, 'state', 'health', measure_name, store.unit(measure_name),
+                                          store.value_type(measure_name), store.measure_short(measure_name))
+            else:
+                # Fallback: aggregate from the resident county data
+                log.warning(f"State rollup not found, aggregating from county data for measure: {measure_name}")
+                state_data = aggregate_data_by_state(store.county_frame(measure_name))
         
-        # Convert to list of dictionaries for JSON response
-        state_data_list = state_data.to_dict('records')
-        print(f"Returning {len(state_data_list)} state data points for measure: {measure_name}")
+        if fmt != 'records':
+            return columns_response(fmt, state_data[STATE_RESPONSE_COLUMNS])
         
+        # Convert to list of dictionaries for JSON response
+        state_data_list = state_data[STATE_RESPONSE_COLUMNS].to_dict('records')
         return jsonify(state_data_list)
         
     except Exception as e:
-        print(f"Error loading state data for measure {measure_name}: {str(e)}")
+        log.error(f"Error loading state data for measure {measure_name}: {str(e)}")
         return jsonify([]), 500
 
 @app.route('/api/measure-data/<measure_name>')
+@cached_response
 def get_measure_data(measure_name):
-    """API endpoint to get data for a specific measure"""
+    """API endpoint to get data for a specific measure (?level=place for cities and towns)"""
     try:
-        # Check if we have a preprocessed file for this measure
-        safe_filename = create_safe_filename(measure_name)
-        measure_file = f'data/measures/{safe_filename}'
-        
-        # Use county data
-        county_measure_file = f'data/county_measures/{safe_filename}'
-        
-        if os.path.exists(county_measure_file):
-            # Load from preprocessed county file
-            measure_data = pd.read_csv(county_measure_file)
-            # Ensure TotalPopulation is numeric (handle comma-separated values)
-            measure_data['TotalPopulation'] = measure_data['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
-            print(f"Loaded {len(measure_data)} county records from preprocessed file: {county_measure_file}")
-        else:
+        try:
+            level = measure_level()
+            fmt = negotiate_format(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        store = load_level_store(level)
+        if store is None:
+            return jsonify({"error": "Place-level data not available"}), 404
+        if not store.has_measure(measure_name):
             return jsonify({"error": "Measure not found"}), 404
         
-        # Prepare result
-        result = measure_data[[
-            'LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation',
-            'Data_Value', 'Data_Value_Unit', 'Data_Value_Type',
-            'Low_Confidence_Limit', 'High_Confidence_Limit'
-        ]].to_dict('records')
+        try:
+            rows = viewport_rows('place' if level == 'place' else 'health')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        county_data = store.county_frame(measure_name, rows)[COUNTY_RESPONSE_COLUMNS]
+        if fmt != 'records':
+            return columns_response(fmt, county_data)
         
-        print(f"Returning {len(result)} data points for measure: {measure_name}")
+        # Prepare result from the resident column slices
+        result = county_data.to_dict('records')
         return jsonify(result)
     except Exception as e:
-        print(f"Error loading measure data: {e}")
+        log.error(f"Error loading measure data: {e}")
         return jsonify({"error": str(e)}), 500
 
-def aggregate_data_by_state(measure_data):
-    """Aggregate data by state, calculating weighted averages"""
-    if len(measure_data) == 0:
-        return pd.DataFrame()
-    
-    # Group by state and calculate weighted averages manually
-    state_data = []
-    
-    for state_name, group in measure_data.groupby('StateDesc'):
-        # Calculate basic aggregations
-        avg_lat = group['lat'].mean()
-        avg_lng = group['lng'].mean()
-        total_pop = group['TotalPopulation'].sum()
-        location_count = len(group)
-        
-        # Calculate weighted average for Data_Value
-        valid_data = group.dropna(subset=['Data_Value', 'TotalPopulation'])
-        if len(valid_data) > 0:
-            weights = valid_data['TotalPopulation']
-            values = valid_data['Data_Value']
-            
-            if weights.sum() > 0:
-                weighted_avg = (values * weights).sum() / weights.sum()
-            else:
-                weighted_avg = values.mean()
-        else:
-            weighted_avg = np.nan
-        
-        # Get other fields from first row
-        first_row = group.iloc[0]
-        
-        state_data.append({
-            'StateDesc': state_name,
-            'lat': avg_lat,
-            'lng': avg_lng,
-            'TotalPopulation': total_pop,
-            'Data_Value': weighted_avg,
-            'Data_Value_Unit': first_row['Data_Value_Unit'],
-            'Data_Value_Type': first_row['Data_Value_Type'],
-            'Low_Confidence_Limit': group['Low_Confidence_Limit'].mean(),
-            'High_Confidence_Limit': group['High_Confidence_Limit'].mean(),
-            'Measure_Short': first_row['Measure_Short'],
-            'LocationCount': location_count,
-            'LocationName': state_name
-        })
+@app.route('/api/measures-matrix')
+@cached_response
+def get_measures_matrix():
+    """API endpoint to get counties x k measures in one response
     
-    return pd.DataFrame(state_data)
+    ?m= names PLACES measures (Measure_Clean or Measure_Short) and ?sdoh= SDOH
+    variables (column or Measure_Clean); both repeat and mix freely.  The
+    geography columns are sent once, then a k-column value block.  JSON
+    bodies for many measures (or ?stream=1) are streamed row chunk by chunk.
+    """
+    try:
+        try:
+            rows = viewport_rows('health')
+            fmt = negotiate_format(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        health_names = request.args.getlist('m')
+        sdoh_names = request.args.getlist('sdoh')
+        if not health_names and not sdoh_names:
+            return jsonify({"error": "Pass at least one m= or sdoh= measure"}), 400
+        
+        store = load_measure_store()
+        health_columns, sdoh_columns, measures, unknown = resolve_matrix_measures(store, health_names, sdoh_names)
+        if unknown:
+            return jsonify({"error": f"Unknown measures: {', '.join(unknown)}"}), 404
+        
+        # Column slices of the resident stores, in county store row order
+        fips = store.geo['CountyFIPS'].values
+        blocks = []
+        if health_columns:
+            blocks.append(store.measure_matrix(health_columns))
+        if sdoh_columns:
+            blocks.append(load_sdoh_store().aligned_matrix(fips, sdoh_columns))
+        values = np.hstack(blocks)
+        mask = np.ones(len(fips), dtype=bool) if rows is None else rows
+        values = values[mask]
+        geography = {name: store.geo[name].values[mask] for name in MATRIX_GEO_COLUMNS}
+        
+        if fmt != 'records':
+            columns = dict(geography)
+            for j, measure in enumerate(measures):
+                columns[f"{measure['source']}:{measure['name']}"] = values[:, j]
+            return columns_response(fmt, columns, meta={'measures': measures})
+        
+        chunks = matrix_json_chunks(geography, measures, values)
+        if len(measures) >= MATRIX_STREAM_MEASURES or request.args.get('stream') == '1':
+            return app.response_class(chunks, mimetype='application/json')
+        with request_phase('serialize'):
+            body = ''.join(chunks)
+        return app.response_class(body, mimetype='application/json')
+    except Exception as e:
+        log.error(f"Error building measures matrix: {e}")
+        return jsonify({"error": str(e)}), 500
 
-def calculate_weighted_average(data, value_col, weight_col):
-    """Calculate weighted average of values"""
-    if len(data) == 0:
-        return np.nan
-    
-    # Remove any NaN values
-    valid_data = data.dropna(subset=[value_col, weight_col])
-    if len(valid_data) == 0:
-        return np.nan
-    
-    # Calculate weighted average
-    weights = valid_data[weight_col]
-    values = valid_data[value_col]
+def resolve_matrix_measures(store, health_names, sdoh_names):
+    """Store columns and descriptions of the requested measures (duplicates dropped)"""
+    short_names = dict(zip(store.measures['Measure_Short'], store.measures['Measure_Clean']))
+    health_columns, sdoh_columns, measures, unknown = [], [], [], []
+    for name in health_names:
+        clean = name if store.has_measure(name) else short_names.get(name)
+        if clean is None:
+            unknown.append(name)
+        elif clean not in health_columns:
+            health_columns.append(clean)
+            measures.append({'name': clean, 'source': 'health', 'short_name': store.measure_short(clean),
+                             'unit': store.unit(clean)})
     
-    if weights.sum() == 0:
-        return values.mean()
-    
-    return (values * weights).sum() / weights.sum()
+    sdoh_store = load_sdoh_store()
+    sdoh_measures = load_sdoh_measures_data()
+    by_name, short_by_column = {}, {}
+    if not sdoh_measures.empty:
+        by_name = dict(zip(sdoh_measures['Measure_Clean'], sdoh_measures['SDOH_Column']))
+        short_by_column = dict(zip(sdoh_measures['SDOH_Column'], sdoh_measures['Measure_Short']))
+    for name in sdoh_names:
+        column = name if sdoh_store is not None and sdoh_store.has_column(name) else by_name.get(name)
+        if column is None or sdoh_store is None or not sdoh_store.has_column(column):
+            unknown.append(name)
+        elif column not in sdoh_columns:
+            sdoh_columns.append(column)
+            measures.append({'name': column, 'source': 'sdoh', 'short_name': short_by_column.get(column, column),
+                             'unit': '%'})  # As the SDOH measure endpoints report
+    return health_columns, sdoh_columns, measures, unknown
+
+def frame_records(frame):
+    """Frame rows as dictionaries with missing values as null"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
 
-def create_safe_filename(measure):
-    """Create a safe filename from measure name"""
-    import re
-    # Remove special characters and replace spaces with underscores
-    safe_name = re.sub(r'[^\w\s-]', '', measure)
-    safe_name = re.sub(r'[-\s]+', '_', safe_name)
-    return safe_name[:50] + '.csv'
+def rollup_frame(cube, level, source, measure_name, unit, value_type, measure_short):
+    """Rollup rows for one measure in the shape of the state aggregate files"""
+    frame = cube.frame(level, source, measure_name)
+    frame['StateDesc'] = frame['LocationName']
+    frame['Data_Value_Unit'] = unit
+    frame['Data_Value_Type'] = value_type
+    frame['Measure_Short'] = measure_short
+    return frame
+
+def weighted_column_averages(values, weights):
+    """Weighted average of each column of an n x k matrix, and the rows each one used
+    
+    Rows missing the value or the weight are skipped, and a column whose
+    weights sum to zero gets the plain mean of its values.
+    """
+    valid = ~np.isnan(values) & ~np.isnan(weights)[:, None]
+    weights = np.where(valid, weights[:, None], 0.0)
+    values = np.where(valid, values, 0.0)
+    totals = weights.sum(axis=0)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(totals > 0, (values * weights).sum(axis=0) / totals, values.sum(axis=0) / counts)
+    return averages, counts
 
 @app.route('/api/sdoh-measures')
+@cached_response
 def get_sdoh_measures():
     """API endpoint to get available SDOH measures"""
     try:
@@ -382,14 +764,14 @@ def get_sdoh_measures():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/sdoh-measure-data/<measure_name>')
+@cached_response
 def get_sdoh_measure_data(measure_name):
     """API endpoint to get SDOH data for a specific measure"""
     try:
-        sdoh_data = load_sdoh_data()
+        sdoh_store = load_sdoh_store()
         sdoh_measures = load_sdoh_measures_data()
-        locations_data = load_locations_data()
         
-        if sdoh_data.empty or sdoh_measures.empty or locations_data.empty:
+        if sdoh_store is None or sdoh_measures.empty:
             return jsonify([])
         
         # Find the measure column
@@ -399,37 +781,675 @@ def get_sdoh_measure_data(measure_name):
         
         column_name = measure_row.iloc[0]['SDOH_Column']
         
-        if column_name not in sdoh_data.columns:
+        if not sdoh_store.has_column(column_name):
             return jsonify({"error": "Column not found in data"}), 404
         
-        # Merge SDOH data with locations data to get lat/lng coordinates
-        sdoh_data['CountyFIPS'] = sdoh_data['CountyFIPS'].astype(str).str.zfill(5)
-        locations_data['CountyFIPS'] = locations_data['CountyFIPS'].astype(str).str.zfill(5)
-        
-        merged_data = sdoh_data.merge(
-            locations_data[['CountyFIPS', 'lat', 'lng', 'TotalPopulation', 'CountyName', 'StateDesc']], 
-            on='CountyFIPS', 
-            how='left'
-        )
-        
-        # Prepare data for the map
-        data_list = []
-        for _, row in merged_data.iterrows():
-            if pd.notna(row[column_name]) and pd.notna(row['CountyFIPS']):
-                data_list.append({
-                    'CountyFIPS': str(row['CountyFIPS']).zfill(5),
-                    'LocationName': row['CountyName'] if pd.notna(row['CountyName']) else 'Unknown County',
-                    'StateDesc': row['StateDesc'] if pd.notna(row['StateDesc']) else 'Unknown State',
-                    'lat': float(row['lat']) if pd.notna(row['lat']) else 0,
-                    'lng': float(row['lng']) if pd.notna(row['lng']) else 0,
-                    'TotalPopulation': float(row['TotalPopulation']) if pd.notna(row['TotalPopulation']) else 0,
-                    'Data_Value': float(row[column_name]),
-                    'Data_Value_Unit': '%',  # Most SDOH measures are percentages
-                    'Data_Value_Type': 'SDOH',
-                    'Measure_Short': measure_row.iloc[0]['Measure_Short']
-                })
-        
-        return jsonify(data_list)
+        try:
+            rows = viewport_rows('sdoh')
+            fmt = negotiate_format(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if fmt != 'records':
+            return columns_response(fmt, sdoh_columns(sdoh_store, column_name, measure_row.iloc[0]['Measure_Short'], rows))
+        
+        return jsonify(build_sdoh_records(sdoh_store, column_name, measure_row.iloc[0]['Measure_Short'], rows))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def sdoh_columns(sdoh_store, column_name, measure_short, rows=None):
+    """SDOH map columns for every county with a value"""
+    values = sdoh_store.column(column_name)
+    mask = ~np.isnan(values)
+    if rows is not None:
+        mask &= rows
+    geo = sdoh_store.geo
+    count = int(mask.sum())
+    
+    return {
+        'CountyFIPS': geo['CountyFIPS'][mask],
+        'LocationName': geo['LocationName'][mask],
+        'StateDesc': geo['StateDesc'][mask],
+        'lat': geo['lat'][mask],
+        'lng': geo['lng'][mask],
+        'TotalPopulation': geo['TotalPopulation'][mask],
+        'Data_Value': values[mask],
+        'Data_Value_Unit': np.full(count, '%', dtype=object),  # Most SDOH measures are percentages
+        'Data_Value_Type': np.full(count, 'SDOH', dtype=object),
+        'Measure_Short': np.full(count, measure_short, dtype=object)
+    }
+
+def build_sdoh_records(sdoh_store, column_name, measure_short, rows=None):
+    """Build SDOH map records for every county with a value, column by column"""
+    columns = sdoh_columns(sdoh_store, column_name, measure_short, rows)
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(columns[name].tolist() for name in names))]
+
+@app.route('/api/sdoh-state-measure-data/<measure_name>')
+@cached_response
+def get_sdoh_state_measure_data(measure_name):
+    """API endpoint to get state aggregate data for a specific SDOH measure"""
+    try:
+        sdoh_measures = load_sdoh_measures_data()
+        if sdoh_measures.empty:
+            return jsonify([])
+        
+        measure_row = sdoh_measures[sdoh_measures['Measure_Clean'] == measure_name]
+        if measure_row.empty:
+            return jsonify({"error": "Measure not found"}), 404
+        
+        column_name = measure_row.iloc[0]['SDOH_Column']
+        cube = load_rollup_cube_data()
+        if not cube.has_measure('sdoh', column_name):
+            return jsonify({"error": "Column not found in data"}), 404
+        
+        try:
+            fmt = negotiate_format(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        state_data = rollup_frame(cube, 'state', 'sdoh', column_name, '%', 'SDOH', measure_row.iloc[0]['Measure_Short'])
+        if fmt != 'records':
+            return columns_response(fmt, state_data[STATE_RESPONSE_COLUMNS])
+        return jsonify(frame_records(state_data[STATE_RESPONSE_COLUMNS]))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/rollup/<level>/<measure_name>')
+@cached_response
+def get_rollup_data(level, measure_name):
+    """API endpoint to get state, census division or national rollups for any measure"""
+    try:
+        if level not in LEVELS:
+            return jsonify({"error": f"Unknown level, expected one of {LEVELS}"}), 400
+        
+        cube = load_rollup_cube_data()
+        store = load_measure_store()
+        if store.has_measure(measure_name) and cube.has_measure('health', measure_name):
+            frame = rollup_frame(cube, level, 'health', measure_name, store.unit(measure_name),
+                                 store.value_type(measure_name), store.measure_short(measure_name))
+        else:
+            sdoh_measures = load_sdoh_measures_data()
+            measure_row = sdoh_measures[sdoh_measures['Measure_Clean'] == measure_name] if not sdoh_measures.empty else sdoh_measures
+            if measure_row.empty or not cube.has_measure('sdoh', measure_row.iloc[0]['SDOH_Column']):
+                return jsonify({"error": "Measure not found"}), 404
+            frame = rollup_frame(cube, level, 'sdoh', measure_row.iloc[0]['SDOH_Column'], '%', 'SDOH',
+                                 measure_row.iloc[0]['Measure_Short'])
+        
+        frame = frame.drop(columns='StateDesc')
+        frame['Level'] = level
+        return jsonify(frame_records(frame))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/measure-clusters/<measure_name>')
+@cached_response
+def get_measure_clusters(measure_name):
+    """API endpoint to get population-weighted grid clusters of a health or SDOH measure for a zoom level"""
+    try:
+        zoom = request.args.get('zoom', 0, type=float)
+        try:
+            bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        pyramid = load_cluster_pyramid_data()
+        store = load_measure_store()
+        if store.has_measure(measure_name) and pyramid.has_measure('health', measure_name):
+            source, column = 'health', measure_name
+            unit, value_type, measure_short = store.unit(measure_name), store.value_type(measure_name), store.measure_short(measure_name)
+        else:
+            sdoh_measures = load_sdoh_measures_data()
+            measure_row = sdoh_measures[sdoh_measures['Measure_Clean'] == measure_name] if not sdoh_measures.empty else sdoh_measures
+            if measure_row.empty or not pyramid.has_measure('sdoh', measure_row.iloc[0]['SDOH_Column']):
+                return jsonify({"error": "Measure not found"}), 404
+            source, column = 'sdoh', measure_row.iloc[0]['SDOH_Column']
+            unit, value_type, measure_short = '%', 'SDOH', measure_row.iloc[0]['Measure_Short']
+        
+        clusters = pyramid.clusters(zoom, source, column, bbox)
+        names = list(clusters)
+        records = [dict(zip(names, row)) for row in zip(*(clusters[name].tolist() for name in names))]
+        
+        return jsonify({
+            'measure': measure_name,
+            'zoom': pyramid.clamp_zoom(zoom),
+            'Data_Value_Unit': unit,
+            'Data_Value_Type': value_type,
+            'Measure_Short': measure_short,
+            'clusters': records
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/measure-stats/<measure_name>')
+@cached_response
+def get_measure_stats(measure_name):
+    """API endpoint to get distribution summaries and legend breaks for a health or SDOH measure"""
+    try:
+        store = load_measure_store()
+        if store.has_measure(measure_name):
+            key = ('health', measure_name)
+        else:
+            sdoh_measures = load_sdoh_measures_data()
+            measure_row = sdoh_measures[sdoh_measures['Measure_Clean'] == measure_name] if not sdoh_measures.empty else sdoh_measures
+            sdoh_store = load_sdoh_store()
+            if measure_row.empty or sdoh_store is None or not sdoh_store.has_column(measure_row.iloc[0]['SDOH_Column']):
+                return jsonify({"error": "Measure not found"}), 404
+            key = ('sdoh', measure_row.iloc[0]['SDOH_Column'])
+        
+        stats_cache = current_snapshot().measure_stats_cache
+        if key not in stats_cache:
+            stats_cache[key] = compute_measure_stats(*key)
+        
+        return jsonify(dict(stats_cache[key], measure=measure_name))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def compute_measure_stats(source, measure):
+    """County and state distribution summaries for one measure"""
+    store = load_measure_store()
+    if source == 'health':
+        county_values = store.county_values(measure)
+        county_weights = store.geo['TotalPopulation'].values
+    else:
+        sdoh_store = load_sdoh_store()
+        county_values = sdoh_store.column(measure)
+        county_weights = sdoh_store.geo['TotalPopulation']
+    
+    stats = {
+        'source': source,
+        'county': summarize_values(county_values, county_weights)
+    }
+    
+    cube = load_rollup_cube_data()
+    if cube.has_measure(source, measure):
+        state_frame = cube.frame('state', source, measure)
+        stats['state'] = summarize_values(state_frame['Data_Value'].values, state_frame['TotalPopulation'].values)
+    
+    return stats
+
+@app.route('/api/rank/<measure_name>')
+@cached_response
+def get_rank(measure_name):
+    """API endpoint to get the k highest (or lowest) counties for a health or SDOH measure
+    
+    ?k= rows (default 25), ?order=desc (highest first) or asc, ?state= ranks
+    within one state and ?level=place ranks cities and towns for a PLACES
+    measure.  Each row has its rank and its percentile among the ranked rows.
+    """
+    try:
+        try:
+            level = measure_level()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        k = request.args.get('k', DEFAULT_RANK_K, type=int)
+        if not 1 <= k <= MAX_RANK_K:
+            return jsonify({"error": f"k must be between 1 and {MAX_RANK_K}"}), 400
+        order = request.args.get('order', 'desc')
+        if order not in RANK_ORDERS:
+            return jsonify({"error": f"Unknown order, expected one of {list(RANK_ORDERS)}"}), 400
+        state = request.args.get('state') or None
+        
+        store = load_level_store(level)
+        if store is None:
+            return jsonify({"error": "Place-level data not available"}), 404
+        if store.has_measure(measure_name):
+            source = level if level == 'place' else 'health'
+            values, geo = store.column(measure_name), store.geo
+            unit, measure_short = store.unit(measure_name), store.measure_short(measure_name)
+        else:
+            sdoh_measures = load_sdoh_measures_data()
+            measure_row = sdoh_measures[sdoh_measures['Measure_Clean'] == measure_name] if not sdoh_measures.empty else sdoh_measures
+            sdoh_store = load_sdoh_store()
+            if level == 'place' or measure_row.empty or sdoh_store is None or not sdoh_store.has_column(measure_row.iloc[0]['SDOH_Column']):
+                return jsonify({"error": "Measure not found"}), 404
+            source = 'sdoh'
+            values, geo = sdoh_store.column(measure_row.iloc[0]['SDOH_Column']), sdoh_store.geo
+            unit, measure_short = '%', measure_row.iloc[0]['Measure_Short']
+        
+        segments = load_state_segments(source)
+        if state is not None and state not in segments:
+            return jsonify({"error": "State not found"}), 404
+        positions, percentiles, count = rank_rows(values, k, order, segments.rows(state))
+        
+        # Only the k ranked rows are gathered and serialized
+        names = ['LocationName', 'StateDesc', 'lat', 'lng', 'TotalPopulation']
+        if source != 'place':
+            names.insert(0, 'CountyFIPS')
+        columns = {name: np.asarray(geo[name])[positions].tolist() for name in names}
+        columns['Data_Value'] = np.round(np.asarray(values[positions], dtype=np.float64), VALUE_DECIMALS).tolist()
+        columns['Rank'] = list(range(1, len(positions) + 1))
+        columns['Percentile'] = np.round(percentiles, 2).tolist()
+        names = list(columns)
+        
+        return jsonify({
+            'measure': measure_name,
+            'source': source,
+            'state': state,
+            'order': order,
+            'count': count,
+            'Data_Value_Unit': unit,
+            'Measure_Short': measure_short,
+            'rows': [dict(zip(names, row)) for row in zip(*columns.values())]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/similar/<location>')
+@cached_response
+def get_similar_locations(location):
+    """API endpoint to get the counties most like one county across every measure
+    
+    <location> is a CountyFIPS, or a place name with ?level=place&state=.
+    Counties are compared on every PLACES measure plus the SDOH variables
+    named by ?sdoh= (columns or Measure_Clean; a default set when omitted,
+    none for ?sdoh=).  ?k= sets the number of neighbours.
+    """
+    try:
+        try:
+            level = measure_level()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        k = request.args.get('k', DEFAULT_SIMILAR_K, type=int)
+        if not 1 <= k <= MAX_SIMILAR_K:
+            return jsonify({"error": f"k must be between 1 and {MAX_SIMILAR_K}"}), 400
+        
+        store = load_level_store(level)
+        if store is None:
+            return jsonify({"error": "Place-level data not available"}), 404
+        engine = load_similarity_engine()
+        
+        if level == 'place':
+            if 'sdoh' in request.args:
+                return jsonify({"error": "SDOH variables are only available for counties"}), 400
+            sdoh_columns = []
+            matches = np.flatnonzero((store.geo['LocationName'].values == location)
+                                     & (store.geo['StateDesc'].values == request.args.get('state')))
+            row = int(matches[0]) if len(matches) else None
+        else:
+            if 'sdoh' in request.args:
+                names = [name for name in request.args.getlist('sdoh') if name]
+                _, sdoh_columns, _, unknown = resolve_matrix_measures(store, [], names)
+                if unknown:
+                    return jsonify({"error": f"Unknown SDOH measures: {', '.join(unknown)}"}), 404
+            else:
+                sdoh_columns = engine.default_sdoh_columns()
+            row = store.key_index.get(location.zfill(5))
+        if row is None:
+            return jsonify({"error": "Location not found"}), 404
+        
+        rows, distances = engine.nearest(level, row, k, sdoh_columns)
+        
+        names = ['LocationName', 'StateDesc', 'lat', 'lng', 'TotalPopulation']
+        if level == 'county':
+            names.insert(0, 'CountyFIPS')
+        geo = store.geo[names]
+        neighbours = geo.iloc[rows].to_dict('records')
+        for rank, (neighbour, distance) in enumerate(zip(neighbours, distances.tolist()), start=1):
+            neighbour['Rank'] = rank
+            neighbour['Distance'] = round(distance, 4)
+        
+        return jsonify({
+            'location': geo.iloc[row].to_dict(),
+            'level': level,
+            'health_measures': len(store.measures),
+            'sdoh_columns': list(sdoh_columns),
+            'neighbours': neighbours
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/catchment')
+@cached_response
+def get_catchment():
+    """API endpoint to get the counties around a point, with population-weighted averages
+    
+    ?lat=&lng= is the point (e.g. a facility).  ?radius= takes every county
+    centroid within that many miles, ?n= the n nearest counties.  ?m= PLACES
+    measures and ?sdoh= SDOH variables are averaged over the catchment,
+    weighted by county population.
+    """
+    try:
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({"error": "Pass lat= (-90 to 90) and lng= (-180 to 180)"}), 400
+        radius = request.args.get('radius', type=float)
+        n = request.args.get('n', type=int)
+        if (radius is None) == (n is None):
+            return jsonify({"error": "Pass either radius= (miles) or n= (counties)"}), 400
+        if radius is not None and not 0 < radius <= MAX_CATCHMENT_MILES:
+            return jsonify({"error": f"radius must be between 0 and {MAX_CATCHMENT_MILES} miles"}), 400
+        if n is not None and not 1 <= n <= MAX_CATCHMENT_COUNTIES:
+            return jsonify({"error": f"n must be between 1 and {MAX_CATCHMENT_COUNTIES}"}), 400
+        
+        store = load_measure_store()
+        health_columns, sdoh_columns, measures, unknown = resolve_matrix_measures(
+            store, request.args.getlist('m'), request.args.getlist('sdoh'))
+        if unknown:
+            return jsonify({"error": f"Unknown measures: {', '.join(unknown)}"}), 404
+        
+        # Grid cells prune the candidates, the haversine distance refines them
+        index = load_spatial_index('health')
+        if radius is not None:
+            rows, distances = index.within(lat, lng, radius)
+        else:
+            rows, distances = index.nearest(lat, lng, n)
+        
+        geo = store.geo[MATRIX_GEO_COLUMNS].iloc[rows]
+        population = geo['TotalPopulation'].to_numpy(dtype=np.float64)
+        blocks = [np.empty((len(rows), 0))]
+        if health_columns:
+            blocks.append(store.measure_matrix(health_columns)[rows])
+        if sdoh_columns:
+            blocks.append(load_sdoh_store().aligned_matrix(geo['CountyFIPS'].values, sdoh_columns))
+        averages, counts = weighted_column_averages(np.hstack(blocks), population)
+        for measure, average, count in zip(measures, averages.tolist(), counts.tolist()):
+            measure['value'] = None if np.isnan(average) else round(average, VALUE_DECIMALS)
+            measure['counties'] = count
+        
+        counties = geo.to_dict('records')
+        for county, distance in zip(counties, distances.tolist()):
+            county['Distance'] = round(distance, 2)
+        
+        return jsonify({
+            'lat': lat,
+            'lng': lng,
+            'radius': radius,
+            'n': n,
+            'count': len(counties),
+            'TotalPopulation': float(np.nansum(population)),
+            'measures': measures,
+            'counties': counties
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/hotspots/<measure_name>')
+@cached_response
+def get_hotspots(measure_name):
+    """API endpoint to get Getis-Ord Gi* and Local Moran's I for every county
+    
+    <measure_name> is a PLACES measure or an SDOH variable.  ?weights=knn
+    (each county's nearest counties, default) or band (every county within a
+    distance band).  p-values are permutation pseudo p-values; Hotspot and
+    Cluster label the counties significant at SIGNIFICANCE.
+    """
+    try:
+        kind = request.args.get('weights', 'knn')
+        if kind not in WEIGHT_KINDS:
+            return jsonify({"error": f"Unknown weights, expected one of {WEIGHT_KINDS}"}), 400
+        
+        store = load_measure_store()
+        health_columns, sdoh_columns, measures, unknown = resolve_matrix_measures(store, [measure_name], [])
+        if unknown:
+            health_columns, sdoh_columns, measures, unknown = resolve_matrix_measures(store, [], [measure_name])
+        if unknown:
+            return jsonify({"error": "Measure not found"}), 404
+        source, column = measures[0]['source'], measures[0]['name']
+        
+        engine = load_hotspot_engine()
+        result = engine.analyze(source, column, kind)
+        weights = engine.weights[kind]
+        
+        rows = np.flatnonzero(~np.isnan(result['values']))
+        columns = {name: store.geo[name].values[rows].tolist() for name in MATRIX_GEO_COLUMNS}
+        columns['Data_Value'] = np.round(result['values'][rows], VALUE_DECIMALS).tolist()
+        columns['Neighbours'] = result['neighbours'][rows].tolist()
+        for name, key in (('Gi_Z', 'gi_z'), ('Gi_P', 'gi_p'), ('Moran_I', 'moran_i'), ('Moran_P', 'moran_p')):
+            column_values = np.round(result[key][rows], VALUE_DECIMALS)
+            columns[name] = [None if np.isnan(value) else value for value in column_values.tolist()]
+        columns['Hotspot'] = hotspot_labels(result['gi_z'][rows], result['gi_p'][rows])
+        columns['Cluster'] = cluster_labels(result['values'][rows], result['lag'][rows], result['moran_p'][rows])
+        names = list(columns)
+        
+        return jsonify({
+            'measure': column,
+            'source': source,
+            'Measure_Short': measures[0]['short_name'],
+            'Data_Value_Unit': measures[0]['unit'],
+            'weights': {'kind': kind, 'links': int(weights.indices.size),
+                        'threshold_miles': None if weights.threshold is None else round(weights.threshold, 2)},
+            'permutations': PERMUTATIONS,
+            'significance': SIGNIFICANCE,
+            'count': len(rows),
+            'rows': [dict(zip(names, row)) for row in zip(*columns.values())]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/correlations/<measure_name>')
+@cached_response
+def get_correlations(measure_name):
+    """API endpoint to get the SDOH variables most correlated with a health measure"""
+    try:
+        method = request.args.get('method', 'pearson')
+        if method not in METHODS:
+            return jsonify({"error": f"Unknown method, expected one of {METHODS}"}), 400
+        weighted = request.args.get('weighted', 'false').lower() in ('1', 'true', 'yes')
+        k = request.args.get('k', DEFAULT_TOP_K, type=int)
+        
+        store = load_measure_store()
+        if not store.has_measure(measure_name):
+            return jsonify({"error": "Measure not found"}), 404
+        
+        matrix = load_correlations()
+        if matrix is None:
+            return jsonify({"error": "SDOH data not available"}), 404
+        
+        # Label each SDOH column with its display names
+        sdoh_measures = load_sdoh_measures_data()
+        labels = {}
+        if not sdoh_measures.empty:
+            labels = sdoh_measures.drop_duplicates(subset='SDOH_Column').set_index('SDOH_Column')[['Measure_Clean', 'Measure_Short']].to_dict('index')
+        
+        drivers = []
+        for driver in matrix.top_drivers(measure_name, method, weighted, max(k, 0)):
+            label = labels.get(driver['column'], {})
+            driver['measure'] = label.get('Measure_Clean', driver['column'])
+            driver['measure_short'] = label.get('Measure_Short', driver['column'])
+            drivers.append(driver)
+        
+        return jsonify({
+            'measure': measure_name,
+            'method': method,
+            'weighted': weighted,
+            'drivers': drivers
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/health-score', methods=['GET', 'POST'])
+@cached_response
+def get_health_score():
+    """API endpoint to get composite Health Scores for every county and state
+    
+    Weights default to the README indicators; pass {"weights": {...}, "normalization": ...}
+    as a JSON body, or weights as a JSON query parameter.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        weights = body.get('weights')
+        if weights is None and request.args.get('weights'):
+            try:
+                weights = json.loads(request.args['weights'])
+            except ValueError:
+                return jsonify({"error": "weights must be a JSON object of indicator -> weight"}), 400
+        normalization = body.get('normalization', request.args.get('normalization', 'minmax'))
+        
+        if weights is not None and not isinstance(weights, dict):
+            return jsonify({"error": "weights must be an object of indicator -> weight"}), 400
+        
+        try:
+            scores = load_health_score_engine().score(weights, normalization)
+        except (KeyError, ValueError) as e:
+            return jsonify({"error": str(e.args[0])}), 400
+        
+        return jsonify(scores)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/health-score/weights')
+@cached_response
+def get_health_score_weights():
+    """API endpoint to get the default Health Score indicator weights"""
+    return jsonify(DEFAULT_WEIGHTS)
+
+@app.route('/api/overlay')
+@cached_response
+def get_overlay_data():
+    """API endpoint to get a health measure joined with an SDOH measure on CountyFIPS"""
+    try:
+        health_measure = request.args.get('health', '')
+        sdoh_measure = request.args.get('sdoh', '')
+        view = request.args.get('view', 'county')
+        
+        store = load_measure_store()
+        if not store.has_measure(health_measure):
+            return jsonify({"error": "Health measure not found"}), 404
+        
+        sdoh_store = load_sdoh_store()
+        sdoh_measures = load_sdoh_measures_data()
+        if sdoh_store is None or sdoh_measures.empty:
+            return jsonify({"error": "SDOH data not available"}), 404
+        
+        measure_row = sdoh_measures[sdoh_measures['Measure_Clean'] == sdoh_measure]
+        if measure_row.empty:
+            return jsonify({"error": "SDOH measure not found"}), 404
+        
+        column_name = measure_row.iloc[0]['SDOH_Column']
+        if not sdoh_store.has_column(column_name):
+            return jsonify({"error": "Column not found in data"}), 404
+        
+        try:
+            fmt = negotiate_format(request)
+            rows = None if view == 'state' else viewport_rows('health')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        county_frame = store.county_frame(health_measure, rows)
+        
+        if view == 'state':
+            cube = load_rollup_cube_data()
+            if cube.has_measure('health', health_measure):
+                health_frame = rollup_frame(cube, 'state', 'health', health_measure, store.unit(health_measure),
+                                            store.value_type(health_measure), store.measure_short(health_measure))
+            else:
+                health_frame = aggregate_data_by_state(county_frame)
+            health_frame = health_frame[STATE_RESPONSE_COLUMNS]
+            
+            # Population-weighted SDOH state averages from the rollups
+            if cube.has_measure('sdoh', column_name):
+                state_sdoh = cube.values('state', 'sdoh', column_name)
+            else:
+                state_sdoh = {}
+            sdoh_values = health_frame['StateDesc'].map(state_sdoh).to_numpy(dtype=float)
+            sdoh_all_values = sdoh_values
+            health_all_values = None
+        else:
+            health_frame = county_frame[COUNTY_RESPONSE_COLUMNS + ['CountyFIPS']]
+            sdoh_values = sdoh_store.values_for(column_name, county_frame['CountyFIPS'].values)
+            sdoh_all_values = sdoh_store.column(column_name)
+            # Classes are relative to every county, not just those in the viewport
+            health_all_values = store.county_values(health_measure)
+        
+        if fmt != 'records':
+            overlay = overlay_columns(health_frame, sdoh_values, sdoh_all_values, health_all_values)
+        else:
+            overlay = build_overlay(health_frame, sdoh_values, sdoh_all_values, health_all_values)
+        overlay['health_measure'] = health_measure
+        overlay['sdoh_measure'] = sdoh_measure
+        overlay['sdoh_measure_short'] = measure_row.iloc[0]['Measure_Short']
+        overlay['view'] = 'state' if view == 'state' else 'county'
+        
+        if fmt != 'records':
+            columns = overlay.pop('columns')
+            return columns_response(fmt, columns, meta=overlay, null_values={name: -1 for name in CLASS_COLUMNS})
+        return jsonify(overlay)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/data-version')
+def get_data_version():
+    """API endpoint to get the current data version for immutable, versioned data URLs"""
+    try:
+        response = jsonify({'version': load_data_version()})
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def snapshot_status(snapshot):
+    """Version and load time of a snapshot for the health endpoints"""
+    if snapshot is None:
+        return {'version': None, 'loaded_at': None, 'load_seconds': None}
+    return {
+        'version': snapshot.version,
+        'loaded_at': datetime.fromtimestamp(snapshot.loaded_at, timezone.utc).isoformat(),
+        'load_seconds': round(snapshot.load_seconds, 3),
+    }
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is serving requests, even while data loads"""
+    response = jsonify(dict(snapshot_status(snapshots.current), status='ok'))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 once a data snapshot is published, 503 while the first one loads"""
+    snapshot = snapshots.current
+    status = dict(snapshot_status(snapshot), status='ready' if snapshot else 'loading',
+                  last_reload_error=snapshots.last_error)
+    response = jsonify(status)
+    response.status_code = 200 if snapshot else 503
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Request latency, response size, response cache and snapshot load metrics for Prometheus"""
+    response = app.response_class(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def profile_admin_error():
+    """Error response for the profile endpoints, or None when the request may read profiles"""
+    # Profiles hold stacks, module paths and request URLs, so they are never served without a token
+    if profiler.token is None:
+        return jsonify({"error": "Profile admin is not enabled (set HEALTH_EQUITY_PROFILE_TOKEN)"}), 404
+    if not profiler.authorized(request.headers):
+        return jsonify({"error": "Pass the profiling token in the X-Profile header"}), 403
+    return None
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Admin endpoint listing the slowest kept request profiles"""
+    try:
+        error = profile_admin_error()
+        if error is not None:
+            return error
+        limit = request.args.get('limit', 20, type=int)
+        response = jsonify(profiler.store.slowest(max(limit, 0)))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/profiles/<name>')
+def get_profile(name):
+    """Admin endpoint returning one profile's collapsed stacks (for flame graph tools)"""
+    try:
+        error = profile_admin_error()
+        if error is not None:
+            return error
+        stacks = profiler.store.collapsed(name)
+        if stacks is None:
+            return jsonify({"error": "Profile not found"}), 404
+        response = app.response_class(stacks, mimetype='text/plain')
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -447,4 +1467,7 @@ if __name__ == '__main__':
     os.makedirs('templates', exist_ok=True)
     os.makedirs('static', exist_ok=True)
     
+    # Build the data snapshot before serving the first request
+    preload_data()
+    
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Latency check for the place-level (?level=place) measure endpoint
+Times /api/measure-data for counties and places, whole-country and
+viewport requests, in the records and binary formats.  "cold" runs clear
+the response cache first, so the response is built from the resident store
+and compressed; "warm" runs are response cache hits.  Place-level timings
+are checked against the published targets in PLACE_TARGETS_MS.
+
+Run from the repository root after preprocessing the place-level file:
+    python benchmarks/bench_place_measure_data.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+REPEATS = 20
+
+# A viewport around the Northeast at a city zoom
+VIEWPORT = 'bbox=-80,38,-70,42&zoom=7'
+
+# p50 targets in ms as (cold, warm) (see "Place-level mode" in README.md)
+PLACE_TARGETS_MS = {
+    ('place', 'all', 'records'): (800, 5),
+    ('place', 'all', 'binary'): (250, 5),
+    ('place', 'viewport', 'records'): (120, 5),
+    ('place', 'viewport', 'binary'): (40, 5),
+}
+
+FORMAT_HEADERS = {
+    'records': {},
+    'binary': {'Accept': 'application/vnd.health-equity.columns'},
+}
+
+
+def time_request(client, url, headers, cold):
+    timings = []
+    for _ in range(REPEATS):
+        if cold:
+            app.response_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    return np.percentile(timings, 50), np.percentile(timings, 95), len(response.get_data())
+
+
+def main():
+    client = app.app.test_client()
+    if app.load_place_store() is None:
+        sys.exit("Place-level files not found; run preprocess_places_data() first")
+    measure = app.load_place_store().measures['Measure_Clean'].iat[0]
+    print(f"{len(app.load_measure_store())} counties, {len(app.load_place_store())} places, {REPEATS} runs")
+
+    failed = []
+    for level in ('county', 'place'):
+        for scope, query in (('all', ''), ('viewport', '&' + VIEWPORT)):
+            for fmt, headers in FORMAT_HEADERS.items():
+                url = f"/api/measure-data/{measure}?level={level}{query}"
+                client.get(url, headers=headers)  # load the stores and spatial index
+                targets = PLACE_TARGETS_MS.get((level, scope, fmt), (None, None))
+                for run, target in zip(('cold', 'warm'), targets):
+                    p50, p95, size = time_request(client, url, headers, cold=run == 'cold')
+                    verdict = '' if target is None else ('  ok' if p50 <= target else f'  OVER {target} ms')
+                    if target is not None and p50 > target:
+                        failed.append((level, scope, fmt, run))
+                    print(f"  {level:6} {scope:8} {fmt:7} {run}  p50 {p50:7.2f} ms   p95 {p95:7.2f} ms"
+                          f"   {size / 1024:8.1f} KB{verdict}")
+
+    if failed:
+        sys.exit(f"Missed targets: {failed}")
+
+
+if __name__ == '__main__':
+    main()
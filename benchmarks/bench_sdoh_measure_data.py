@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for /api/sdoh-measure-data
+Times building the response for one SDOH variable across every county,
+comparing the original merge + iterrows loop with the pre-joined columnar path.
+
+Run from the repository root:
+    python benchmarks/bench_sdoh_measure_data.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import build_sdoh_records, load_locations_data
+from sdoh_store import open_sdoh_store, write_sdoh_columns
+
+COLUMN = 'SDOH_BENCH'
+REPEATS = 20
+
+
+def legacy_sdoh_records(sdoh_data, locations_data, column_name, measure_short):
+    """The per-request merge + iterrows implementation this replaces"""
+    sdoh_data['CountyFIPS'] = sdoh_data['CountyFIPS'].astype(str).str.zfill(5)
+    locations_data['CountyFIPS'] = locations_data['CountyFIPS'].astype(str).str.zfill(5)
+
+    merged_data = sdoh_data.merge(
+        locations_data[['CountyFIPS', 'lat', 'lng', 'TotalPopulation', 'CountyName', 'StateDesc']],
+        on='CountyFIPS',
+        how='left'
+    )
+
+    data_list = []
+    for _, row in merged_data.iterrows():
+        if pd.notna(row[column_name]) and pd.notna(row['CountyFIPS']):
+            data_list.append({
+                'CountyFIPS': str(row['CountyFIPS']).zfill(5),
+                'LocationName': row['CountyName'] if pd.notna(row['CountyName']) else 'Unknown County',
+                'StateDesc': row['StateDesc'] if pd.notna(row['StateDesc']) else 'Unknown State',
+                'lat': float(row['lat']) if pd.notna(row['lat']) else 0,
+                'lng': float(row['lng']) if pd.notna(row['lng']) else 0,
+                'TotalPopulation': float(row['TotalPopulation']) if pd.notna(row['TotalPopulation']) else 0,
+                'Data_Value': float(row[column_name]),
+                'Data_Value_Unit': '%',
+                'Data_Value_Type': 'SDOH',
+                'Measure_Short': measure_short
+            })
+    return data_list
+
+
+def time_it(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 95), len(result)
+
+
+def main():
+    locations = load_locations_data().copy()
+
+    # One synthetic SDOH variable for every county, with a few gaps
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 100, len(locations))
+    values[rng.random(len(locations)) < 0.02] = np.nan
+    sdoh_df = pd.DataFrame({'CountyFIPS': locations['CountyFIPS'].values, COLUMN: values})
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_sdoh_columns(sdoh_df, locations['CountyFIPS'], data_dir=data_dir)
+        store = open_sdoh_store(data_dir)
+        store.attach_locations(locations)
+
+        before = time_it(lambda: legacy_sdoh_records(sdoh_df.copy(), locations.copy(), COLUMN, 'Bench'))
+        after = time_it(lambda: build_sdoh_records(store, COLUMN, 'Bench'))
+
+    print(f"SDOH measure response, {before[2]} counties, {REPEATS} runs")
+    print(f"  before (merge + iterrows): p50 {before[0]:8.2f} ms   p95 {before[1]:8.2f} ms")
+    print(f"  after  (pre-joined):       p50 {after[0]:8.2f} ms   p95 {after[1]:8.2f} ms")
+    print(f"  speedup: {before[0] / after[0]:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Preprocessing and endpoint benchmark suite on scaled synthetic inputs
+For each scale (1x, 10x and 100x the real county, place and SDOH files by
+default) this generates the raw inputs (see synthetic_data.py), runs every
+preprocess_data.py stage in its own process, then loads the app in a fresh
+process and requests every Flask route through the test client.
+
+Stages record wall time and the peak RSS of the stage process (including
+its worker processes).  Routes record p50/p95/p99 latency for "cold" runs,
+which clear the response cache first so the response is rebuilt from the
+resident snapshot, and "warm" runs, which are response cache hits, plus the
+status and payload bytes.  The server process records the snapshot build
+time and its peak RSS.
+
+Results are written as JSON (benchmarks/results/<commit>.json by default);
+--compare prints the change against an earlier result and exits non-zero
+when a stage or route p50 got slower by more than REGRESSION_RATIO.
+
+    python benchmarks/bench_suite.py --scales 1,10 --compare benchmarks/results/abc1234.json
+
+100x inputs take about 25 GB of disk (mostly the place-level file) and
+hours of preprocessing on one core.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from synthetic_data import generate
+
+SCALES = (1, 10, 100)
+REPEATS = 20
+
+# A p50 this much slower than the baseline's counts as a regression
+REGRESSION_RATIO = 1.2
+
+# preprocess_data.py functions in dependency order
+STAGES = [
+    ('county', 'preprocess_county_data'),
+    ('places', 'preprocess_places_data'),
+    ('sdoh', 'preprocess_sdoh_data'),
+    ('rollups', 'preprocess_rollups'),
+    ('clusters', 'preprocess_clusters'),
+    ('correlations', 'preprocess_correlations'),
+    ('spatial_weights', 'preprocess_spatial_weights'),
+]
+
+# Query variants per endpoint; every other route is requested once without a query
+VIEWPORT = [('bbox', '-80,38,-70,42'), ('zoom', '7')]
+ROUTE_QUERIES = {
+    'get_locations': [[], VIEWPORT],
+    'get_measure_data': [[], [('format', 'binary')], VIEWPORT, [('level', 'place')],
+                         [('level', 'place'), ('format', 'binary')], [('level', 'place')] + VIEWPORT],
+    'get_state_measure_data': [[], [('level', 'place')]],
+    'get_sdoh_measure_data': [[], [('format', 'binary')]],
+    'get_measure_clusters': [[('zoom', '4')]],
+    'get_overlay_data': [[('health', '{health}'), ('sdoh', '{sdoh}')],
+                         [('health', '{health}'), ('sdoh', '{sdoh}'), ('view', 'state')]],
+    'get_measures_matrix': [[('m', '{health}'), ('m', '{health2}'), ('sdoh', '{sdoh_column}')]],
+    'get_rank': [[('k', '25')], [('k', '25'), ('state', 'Texas'), ('order', 'asc')], [('level', 'place')]],
+    'get_similar_locations': [[('k', '10')], [('k', '10'), ('sdoh', '')]],
+    'get_hotspots': [[], [('weights', 'band')]],
+    'get_catchment': [[('lat', '39.1'), ('lng', '-94.6'), ('radius', '150'), ('m', '{health}'), ('sdoh', '{sdoh}')],
+                      [('lat', '39.1'), ('lng', '-94.6'), ('n', '50'), ('m', '{health}')]],
+}
+
+
+def percentiles(timings):
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+
+
+def peak_rss_mb(rusage):
+    # ru_maxrss is in KB on Linux
+    return round(rusage.ru_maxrss / 1024, 1)
+
+
+def run_process(args, cwd, log_path):
+    """Run a Python subprocess; returns (seconds, peak RSS in MB, exit code)"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_DIR, BENCH_DIR]))
+    started = time.perf_counter()
+    with open(log_path, 'a') as log:
+        process = subprocess.Popen([sys.executable] + args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the child's own peak RSS (and its waited-for children's)
+        _, status, rusage = os.wait4(process.pid, 0)
+    return time.perf_counter() - started, peak_rss_mb(rusage), os.waitstatus_to_exitcode(status)
+
+
+def run_stages(scale_dir):
+    stages = {}
+    for name, function in STAGES:
+        if name in ('correlations', 'spatial_weights'):
+            # Both are cached per data version; time a build, not a load
+            for path in glob.glob(os.path.join(scale_dir, 'data', f'{name}_*.npz')):
+                os.remove(path)
+        seconds, rss, code = run_process(['-c', f'import preprocess_data; preprocess_data.{function}()'],
+                                         scale_dir, os.path.join(scale_dir, f'stage-{name}.log'))
+        stages[name] = {'seconds': round(seconds, 3), 'peak_rss_mb': rss, 'exit_code': code}
+        print(f"  stage {name:13} {seconds:8.2f} s   peak RSS {rss:8.1f} MB" + ('' if code == 0 else f"   exit {code}"))
+    return stages
+
+
+def route_cases(app_module):
+    """(label, url) for every GET route, with sample measures from the loaded data"""
+    store = app_module.load_measure_store()
+    names = list(store.measures['Measure_Clean'])
+    samples = {'health': names[0], 'health2': names[min(1, len(names) - 1)], 'sdoh': '', 'sdoh_column': ''}
+    sdoh_measures = app_module.load_sdoh_measures_data()
+    if not sdoh_measures.empty:
+        samples['sdoh'] = sdoh_measures['Measure_Clean'].iat[0]
+        samples['sdoh_column'] = sdoh_measures['SDOH_Column'].iat[0]
+
+    urls = app_module.app.url_map.bind('localhost')
+    cases = []
+    for rule in sorted(app_module.app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == 'static' or 'GET' not in rule.methods or rule.rule.startswith('/admin/'):
+            continue
+        values = {'level': 'state', 'location': store.geo['CountyFIPS'].iat[0],
+                  'measure_name': samples['sdoh'] if 'sdoh' in rule.endpoint else samples['health']}
+        path = urls.build(rule.endpoint, {name: values[name] for name in rule.arguments})
+        for query in ROUTE_QUERIES.get(rule.endpoint, [[]]):
+            query = urlencode([(key, value.format(**samples)) for key, value in query])
+            label = rule.rule + ('?' + query if query else '')
+            cases.append((label, path + ('?' + query if query else '')))
+    return cases
+
+
+def bench_routes(scale_dir, result_path, repeats):
+    """Body of the server process: load the app, then time every route"""
+    os.chdir(scale_dir)
+    import app
+
+    started = time.perf_counter()
+    app.preload_data()
+    server = {'snapshot_seconds': round(time.perf_counter() - started, 3),
+              'snapshot_rss_mb': peak_rss_mb(resource.getrusage(resource.RUSAGE_SELF))}
+
+    client = app.app.test_client()
+    routes = {}
+    for label, url in route_cases(app):
+        result = {}
+        for run in ('cold', 'warm'):
+            timings = []
+            for _ in range(repeats):
+                if run == 'cold':
+                    app.response_cache.clear()
+                start = time.perf_counter()
+                response = client.get(url)
+                body = response.get_data()
+                timings.append((time.perf_counter() - start) * 1000)
+            result[run] = percentiles(timings)
+        result['status'] = response.status_code
+        result['bytes'] = len(body)
+        routes[label] = result
+
+    server['peak_rss_mb'] = peak_rss_mb(resource.getrusage(resource.RUSAGE_SELF))
+    with open(result_path, 'w') as f:
+        json.dump({'server': server, 'routes': routes}, f)
+
+
+def run_scale(scale, workdir, repeats):
+    scale_dir = os.path.join(workdir, f'scale-{scale}')
+    inputs_path = os.path.join(scale_dir, 'inputs.json')
+    if os.path.exists(inputs_path):
+        with open(inputs_path) as f:
+            inputs = json.load(f)
+        print(f"Scale {scale}x: reusing inputs in {scale_dir}")
+    else:
+        print(f"Scale {scale}x: generating inputs in {scale_dir}...")
+        inputs = generate(scale_dir, scale)
+        with open(inputs_path, 'w') as f:
+            json.dump(inputs, f)
+
+    stages = run_stages(scale_dir)
+
+    result_path = os.path.join(scale_dir, 'routes.json')
+    if os.path.exists(result_path):
+        os.remove(result_path)
+    _, _, code = run_process([os.path.abspath(__file__), '--routes-for', scale_dir, '--result', result_path,
+                                      '--repeats', str(repeats)], scale_dir, os.path.join(scale_dir, 'server.log'))
+    if code != 0 or not os.path.exists(result_path):
+        print(f"  server process failed (exit {code}), see {os.path.join(scale_dir, 'server.log')}")
+        served = {'server': {'exit_code': code}, 'routes': {}}
+    else:
+        with open(result_path) as f:
+            served = json.load(f)
+    print(f"  snapshot build {served['server'].get('snapshot_seconds')} s,"
+          f" server peak RSS {served['server'].get('peak_rss_mb')} MB")
+    for label, result in served['routes'].items():
+        print(f"  {result['status']} {label[:70]:70} cold p50 {result['cold']['p50_ms']:9.2f} ms"
+              f"   warm p50 {result['warm']['p50_ms']:7.2f} ms   {result['bytes'] / 1024:9.1f} KB")
+
+    return {'inputs': inputs, 'stages': stages, 'server': served['server'], 'routes': served['routes']}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def compare(baseline, results):
+    """Print p50 / stage time ratios against a baseline; returns the regressions"""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('created')}):")
+    for scale, current in results['scales'].items():
+        base = baseline.get('scales', {}).get(scale)
+        if base is None:
+            continue
+        pairs = [(f"stage {name}", base['stages'][name]['seconds'], stage['seconds'])
+                 for name, stage in current['stages'].items() if name in base['stages']]
+        for label, route in current['routes'].items():
+            if label in base['routes']:
+                for run in ('cold', 'warm'):
+                    pairs.append((f"{run} {label}", base['routes'][label][run]['p50_ms'], route[run]['p50_ms']))
+        for label, before, after in pairs:
+            ratio = after / before if before else float('inf')
+            flag = ''
+            if ratio > REGRESSION_RATIO:
+                flag = '  REGRESSION'
+                regressions.append((scale, label, ratio))
+            print(f"  {scale:>4}x {label[:80]:80} {before:10.2f} -> {after:10.2f}  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', default=','.join(map(str, SCALES)), help='comma-separated size multiples')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='requests per route and run')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'health-equity-bench'),
+                        help='where inputs and outputs are generated (inputs are reused)')
+    parser.add_argument('--output', help='result JSON (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier result JSON to compare with')
+    parser.add_argument('--routes-for', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.routes_for:
+        bench_routes(args.routes_for, args.result, args.repeats)
+        return
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeats': args.repeats,
+        'scales': {},
+    }
+    for scale in (int(scale) for scale in args.scales.split(',')):
+        results['scales'][str(scale)] = run_scale(scale, os.path.abspath(args.workdir), args.repeats)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results)
+        if regressions:
+            sys.exit(f"{len(regressions)} regressions over x{REGRESSION_RATIO}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Synthetic PLACES county, place-level and SDOH inputs at a multiple of the real size
+Column names and order come from the committed county file header, the SDOH
+coding file and available_measures.csv, so the generated files go through
+preprocess_data.py unchanged.  Values are seeded random draws in plausible
+ranges, written in chunks so even 100x inputs are generated in bounded memory.
+
+    python benchmarks/synthetic_data.py OUTPUT_DIR [SCALE]
+"""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from place_ingest import PLACE_DATA_FILE
+from preprocess_data import COUNTY_DATA_FILE, COUNTY_MEASURE_COLUMNS, SDOH_CODING_FILE, SDOH_DATA_FILE
+from rollup import STATE_DIVISIONS
+
+# Rows at 1x: counties in the 2020 county file, places in the 2020 place file
+BASE_COUNTIES = 3142
+BASE_PLACES = 29_000
+
+# Counties (or places) generated and written per chunk
+CHUNK_ROWS = 20_000
+
+# Inside the bounds preprocessing keeps
+LAT_RANGE = (25.0, 49.0)
+LNG_RANGE = (-124.0, -67.5)
+
+# SDOH identifier columns; every other coded column holds a value
+SDOH_ID_COLUMNS = ['YEAR', 'COUNTYFIPS', 'STATEFIPS', 'STATE', 'COUNTY', 'REGION', 'TERRITORY']
+
+STATES = sorted(STATE_DIVISIONS)
+
+PLACE_COLUMNS = [
+    'Year', 'StateAbbr', 'StateDesc', 'LocationName', 'DataSource', 'Category', 'Measure',
+    'Data_Value_Unit', 'Data_Value_Type', 'Data_Value', 'Data_Value_Footnote_Symbol', 'Data_Value_Footnote',
+    'Low_Confidence_Limit', 'High_Confidence_Limit', 'TotalPopulation', 'Geolocation', 'LocationID',
+    'CategoryID', 'MeasureId', 'DataValueTypeID', 'Short_Question_Text'
+]
+
+
+def chunks(count, size=CHUNK_ROWS):
+    for start in range(0, count, size):
+        yield np.arange(start, min(start + size, count))
+
+
+def geography(ids, rng):
+    """State, state abbreviation, coordinates and comma-formatted population per row id"""
+    states = np.array(STATES, dtype=object)[ids % len(STATES)]
+    abbrs = np.array([state[:2].upper() for state in STATES], dtype=object)[ids % len(STATES)]
+    lat = rng.uniform(*LAT_RANGE, len(ids)).round(6)
+    lng = rng.uniform(*LNG_RANGE, len(ids)).round(6)
+    population = rng.lognormal(10, 1.2, len(ids)).astype(np.int64) + 100
+    return {
+        'StateAbbr': abbrs,
+        'StateDesc': states,
+        'Geolocation': 'POINT (' + pd.Series(lng).astype(str) + ' ' + pd.Series(lat).astype(str) + ')',
+        'TotalPopulation': pd.Series(population).map('{:,}'.format),
+    }
+
+
+def prevalence(rng, count):
+    """Values with their confidence limits, about 1% missing"""
+    values = rng.uniform(2, 80, count).round(1)
+    values[rng.random(count) < 0.01] = np.nan
+    low = (values - rng.uniform(0.5, 3, count)).round(1)
+    high = (values + rng.uniform(0.5, 3, count)).round(1)
+    return values, low, high
+
+
+def write_chunk(frame, path, first):
+    frame.to_csv(path, index=False, header=first, mode='w' if first else 'a')
+
+
+def write_county_data(path, counties, rng):
+    """The county GIS file: one row per county, four columns per measure"""
+    with open(os.path.join(REPO_DIR, COUNTY_DATA_FILE)) as f:
+        columns = pd.read_csv(f, nrows=0).columns
+    measure_ids = [column[:-len('_CrudePrev')] for column in columns if column.endswith('_CrudePrev')]
+
+    for ids in chunks(counties):
+        frame = geography(ids, rng)
+        frame['CountyName'] = 'County ' + pd.Series(ids).astype(str)
+        frame['CountyFIPS'] = pd.Series(ids + 1001).astype(str).str.zfill(5)
+        for measure_id in measure_ids:
+            for kind in ('Crude', 'Adj'):
+                values, low, high = prevalence(rng, len(ids))
+                frame[f'{measure_id}_{kind}Prev'] = values
+                frame[f'{measure_id}_{kind}95CI'] = ('(' + pd.Series(low).astype(str) + ', '
+                                                     + pd.Series(high).astype(str) + ')')
+        write_chunk(pd.DataFrame(frame)[columns], path, ids[0] == 0)
+
+
+def write_sdoh_data(path, counties, rng):
+    """The SDOH data file: one row per county, one column per coded variable"""
+    coding = pd.read_csv(os.path.join(REPO_DIR, SDOH_CODING_FILE), encoding='latin-1')
+    value_columns = [name for name in coding['name'] if name not in SDOH_ID_COLUMNS]
+
+    for ids in chunks(counties):
+        values = rng.uniform(0, 100, (len(ids), len(value_columns))).round(2)
+        values[rng.random(values.shape) < 0.02] = np.nan
+        frame = pd.DataFrame(values, columns=value_columns)
+        states = np.array(STATES, dtype=object)[ids % len(STATES)]
+        frame.insert(0, 'YEAR', 2020)
+        frame.insert(1, 'COUNTYFIPS', ids + 1001)
+        frame.insert(2, 'STATEFIPS', ids % len(STATES) + 1)
+        frame.insert(3, 'STATE', states)
+        frame.insert(4, 'COUNTY', 'County ' + pd.Series(ids).astype(str))
+        frame.insert(5, 'REGION', 'Region')
+        frame.insert(6, 'TERRITORY', 0)
+        write_chunk(frame[[name for name in coding['name'] if name in frame]], path, ids[0] == 0)
+    source = os.path.join(REPO_DIR, SDOH_CODING_FILE)
+    target = os.path.join(os.path.dirname(path), os.path.basename(SDOH_CODING_FILE))
+    if not (os.path.exists(target) and os.path.samefile(source, target)):
+        shutil.copyfile(source, target)
+
+
+def write_place_data(path, places, rng):
+    """The place-level file: one row per place and measure, in the long PLACES layout"""
+    measures = pd.read_csv(os.path.join(REPO_DIR, 'data/available_measures.csv'))
+    short_names = dict(zip(measures['Measure_Clean'], measures['Measure_Short']))
+    place_chunk = max(CHUNK_ROWS // len(COUNTY_MEASURE_COLUMNS), 1)
+
+    for ids in chunks(places, place_chunk):
+        geo = geography(ids, rng)
+        frames = []
+        for column, measure in COUNTY_MEASURE_COLUMNS.items():
+            values, low, high = prevalence(rng, len(ids))
+            frames.append(pd.DataFrame({
+                'Year': 2018, 'StateAbbr': geo['StateAbbr'], 'StateDesc': geo['StateDesc'],
+                'LocationName': 'Place ' + pd.Series(ids).astype(str), 'DataSource': 'BRFSS',
+                'Category': 'Health Outcomes', 'Measure': measure, 'Data_Value_Unit': '%',
+                'Data_Value_Type': 'Crude prevalence', 'Data_Value': values,
+                'Data_Value_Footnote_Symbol': '', 'Data_Value_Footnote': '',
+                'Low_Confidence_Limit': low, 'High_Confidence_Limit': high,
+                'TotalPopulation': geo['TotalPopulation'], 'Geolocation': geo['Geolocation'],
+                'LocationID': pd.Series(ids).astype(str).str.zfill(7), 'CategoryID': 'HLTHOUT',
+                'MeasureId': column[:-len('_AdjPrev')], 'DataValueTypeID': 'CrdPrv',
+                'Short_Question_Text': short_names.get(measure),
+            }))
+        write_chunk(pd.concat(frames, ignore_index=True)[PLACE_COLUMNS], path, ids[0] == 0)
+
+
+def generate(output_dir, scale, seed=0):
+    """Write the three raw inputs for ``scale`` times the real size under ``output_dir``
+
+    Returns the rows and bytes of each file, keyed by its data/ path.
+    """
+    # The generated files replace the real inputs of whatever tree they are written to
+    output = os.path.realpath(output_dir)
+    repo = os.path.realpath(REPO_DIR)
+    if output == repo or os.path.commonpath([output, os.path.join(repo, 'data')]) == os.path.join(repo, 'data'):
+        raise ValueError(f"Refusing to write synthetic data over the repository's data: {output_dir}")
+
+    rng = np.random.default_rng(seed)
+    counties = BASE_COUNTIES * scale
+    places = BASE_PLACES * scale
+    os.makedirs(os.path.join(output_dir, 'data'), exist_ok=True)
+
+    inputs = {}
+    for name, writer, count, rows in ((COUNTY_DATA_FILE, write_county_data, counties, counties),
+                                      (SDOH_DATA_FILE, write_sdoh_data, counties, counties),
+                                      (PLACE_DATA_FILE, write_place_data, places,
+                                       places * len(COUNTY_MEASURE_COLUMNS))):
+        path = os.path.join(output_dir, name)
+        writer(path, count, rng)
+        inputs[name] = {'rows': rows, 'bytes': os.path.getsize(path)}
+    return inputs
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    try:
+        inputs = generate(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)
+    except ValueError as e:
+        sys.exit(str(e))
+    for name, size in inputs.items():
+        print(f"{name}: {size['rows']} rows, {size['bytes'] / 1e6:.1f} MB")
@@ -0,0 +1,135 @@
+"""
+Zoom-level cluster pyramid for the county maps
+Counties are binned into a lat/lng grid per zoom level and every measure is
+rolled up per cell (population-weighted), so low zoom levels serve a few
+hundred aggregated markers instead of every county
+"""
+
+import os
+
+import numpy as np
+
+from rollup import rollup_matrix
+
+CLUSTER_FILE = 'clusters.npz'
+
+# Counties are drawn individually from static/app.js minZoomForMarkers (4) up,
+# so the pyramid stops a little past it
+CLUSTER_ZOOMS = list(range(0, 6))
+
+# Grid cells per map tile edge; a tile spans 360 / 2 ** zoom degrees
+CELLS_PER_TILE = 8
+
+CLUSTER_FIELDS = ['value', 'lat', 'lng', 'population', 'count']
+
+VALUE_DECIMALS = 4
+
+
+def cell_size(zoom):
+    """Grid cell edge in degrees at a zoom level"""
+    return 360.0 / 2 ** zoom / CELLS_PER_TILE
+
+
+def cell_keys(lat, lng, zoom):
+    """Integer grid cell id of every county at a zoom level (-1 without coordinates)"""
+    size = cell_size(zoom)
+    columns = int(np.ceil(360.0 / size))
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    x = np.floor((lng + 180.0) / size)
+    y = np.floor((lat + 90.0) / size)
+    keys = np.where(np.isfinite(x) & np.isfinite(y), y * columns + x, -1)
+    return keys.astype(np.int64)
+
+
+class ClusterPyramid:
+    """Per-zoom grid clusters for every measure, indexed like the rollup cube"""
+
+    def __init__(self, measures, sources, zooms):
+        self.measures = list(measures)
+        self.sources = list(sources)
+        self.zooms = zooms
+        self.measure_index = {(source, name): i for i, (source, name) in enumerate(zip(self.sources, self.measures))}
+
+    def has_measure(self, source, measure):
+        return (source, measure) in self.measure_index
+
+    def clamp_zoom(self, zoom):
+        return int(min(max(zoom, min(self.zooms)), max(self.zooms)))
+
+    def clusters(self, zoom, source, measure, bbox=None):
+        """Cluster columns of one measure at a zoom level, optionally within a bbox"""
+        col = self.measure_index[(source, measure)]
+        data = self.zooms[self.clamp_zoom(zoom)]
+        mask = data['count'][:, col] > 0
+        lat = data['lat'][:, col]
+        lng = data['lng'][:, col]
+        if bbox is not None:
+            west, south, east, north = bbox
+            in_lng = (lng >= west) & (lng <= east) if west <= east else (lng >= west) | (lng <= east)
+            mask &= (lat >= south) & (lat <= north) & in_lng
+        return {
+            'lat': _widen(lat[mask]),
+            'lng': _widen(lng[mask]),
+            'Data_Value': _widen(data['value'][mask, col]),
+            'TotalPopulation': data['population'][mask, col].astype(np.float64).round(),
+            'LocationCount': data['count'][mask, col],
+        }
+
+
+def _widen(values):
+    """Float64 copy of stored float32 values without float32 noise digits"""
+    return np.round(values.astype(np.float64), VALUE_DECIMALS)
+
+
+def build_cluster_pyramid(geo, measures, sources, values):
+    """Roll every measure column up to grid cells at every pyramid zoom"""
+    zooms = {}
+    for zoom in CLUSTER_ZOOMS:
+        keys = cell_keys(geo['lat'].values, geo['lng'].values, zoom)
+        rolled = rollup_matrix(values, geo['TotalPopulation'].values, geo['lat'].values,
+                               geo['lng'].values, np.where(keys >= 0, keys, None).astype(object))
+        # Served as float32: cells only need map precision
+        zooms[zoom] = {
+            'value': rolled['value'].astype(np.float32),
+            'lat': rolled['lat'].astype(np.float32),
+            'lng': rolled['lng'].astype(np.float32),
+            'population': rolled['population'].astype(np.float32),
+            'count': rolled['count'].astype(np.int32),
+        }
+    return ClusterPyramid(measures, sources, zooms)
+
+
+def build_cluster_pyramid_from_stores(measure_store, sdoh_store=None):
+    """Cluster the resident health matrix and (optionally) every SDOH column"""
+    values, _, _ = measure_store.matrices_float64()
+    measures = list(measure_store.measures['Measure_Clean'])
+    sources = ['health'] * len(measures)
+    if sdoh_store is not None:
+        values = np.hstack([values, sdoh_store.aligned_matrix(measure_store.geo['CountyFIPS'].values)])
+        measures += list(sdoh_store.columns)
+        sources += ['sdoh'] * len(sdoh_store.columns)
+    return build_cluster_pyramid(measure_store.geo, measures, sources, values)
+
+
+def save_cluster_pyramid(pyramid, data_dir='data'):
+    arrays = {'measures': np.asarray(pyramid.measures, dtype=str), 'sources': np.asarray(pyramid.sources, dtype=str)}
+    for zoom, data in pyramid.zooms.items():
+        for field in CLUSTER_FIELDS:
+            arrays[f'z{zoom}_{field}'] = data[field]
+
+    path = os.path.join(data_dir, CLUSTER_FILE)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+
+def load_cluster_pyramid(data_dir='data'):
+    """Load the persisted cluster pyramid, or return None if it has not been built"""
+    path = os.path.join(data_dir, CLUSTER_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as arrays:
+        zooms = {zoom: {field: arrays[f'z{zoom}_{field}'] for field in CLUSTER_FIELDS} for zoom in CLUSTER_ZOOMS}
+        return ClusterPyramid(arrays['measures'].tolist(), arrays['sources'].tolist(), zooms)
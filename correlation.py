@@ -0,0 +1,200 @@
+"""
+Health x SDOH correlation matrix
+Pearson and Spearman correlations between every PLACES measure and every
+SDOH column in vectorized passes, cached to disk per data version
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from measure_store import data_version
+
+CORRELATION_FILE = 'correlations_{version}.npz'
+
+METHODS = ['pearson', 'spearman']
+
+# Pairs with fewer counties in common than this are reported as missing
+MIN_PAIRS = 30
+
+DEFAULT_TOP_K = 10
+
+# Bumped when the saved matrices change meaning, so older files are not reused
+CORRELATION_FORMAT = 2
+
+
+def rank_columns(values):
+    """Average ranks of each column over its non-missing entries (NaN stays NaN)"""
+    return pd.DataFrame(values).rank(method='average').to_numpy(dtype=np.float64)
+
+
+def correlation_matrix(x, y, weights=None):
+    """Pearson correlation of every column of x against every column of y
+
+    Missing values are dropped pairwise: each (i, j) cell only uses the rows
+    where both x[:, i] and y[:, j] are present.  All moments come from a
+    handful of matrix products over the masked, zero-filled inputs.
+    Returns the correlation matrix and the number of rows behind each cell.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if weights is None:
+        weights = np.ones(len(x))
+    weights = np.where(np.isnan(weights), 0.0, np.asarray(weights, dtype=np.float64))
+
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+    # Centre each column first so the moment sums do not cancel catastrophically
+    x = np.where(mx, x - np.nanmean(x, axis=0), 0.0)
+    y = np.where(my, y - np.nanmean(y, axis=0), 0.0)
+    wx = mx * weights[:, None]
+    xw = x * weights[:, None]
+
+    n = mx.astype(np.float64).T @ my
+    w = wx.T @ my
+    sx = xw.T @ my
+    sy = wx.T @ y
+    sxx = (xw * x).T @ my
+    syy = wx.T @ (y * y)
+    sxy = xw.T @ y
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy / w - sx * sy / w ** 2
+        var_x = sxx / w - (sx / w) ** 2
+        var_y = syy / w - (sy / w) ** 2
+        r = cov / np.sqrt(var_x * var_y)
+    r = np.clip(r, -1.0, 1.0)
+    r[(n < MIN_PAIRS) | ~np.isfinite(r)] = np.nan
+    return r, n.astype(np.int64)
+
+
+def mask_groups(values):
+    """(present-row mask, column positions) for each distinct pattern of missing values"""
+    present = ~np.isnan(values)
+    groups = {}
+    for j in range(values.shape[1]):
+        groups.setdefault(present[:, j].tobytes(), []).append(j)
+    return [(present[:, columns[0]], np.array(columns)) for columns in groups.values()]
+
+
+def spearman_matrix(x, y, weights=None):
+    """Spearman correlation of every column of x against every column of y
+
+    Pairwise complete like correlation_matrix: each pair is ranked over just
+    the rows where both columns are present.  Columns sharing a pattern of
+    missing rows share those rows, so each pair of patterns is ranked and
+    correlated as one block.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    weights = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=np.float64)
+    r = np.full((x.shape[1], y.shape[1]), np.nan)
+    n = np.zeros((x.shape[1], y.shape[1]), dtype=np.int64)
+    for present_x, columns_x in mask_groups(x):
+        for present_y, columns_y in mask_groups(y):
+            rows = np.flatnonzero(present_x & present_y)
+            block = np.ix_(columns_x, columns_y)
+            r[block], n[block] = correlation_matrix(rank_columns(x[np.ix_(rows, columns_x)]),
+                                                    rank_columns(y[np.ix_(rows, columns_y)]), weights[rows])
+    return r, n
+
+
+class CorrelationMatrix:
+    """Correlations between health measures (rows) and SDOH columns (columns)"""
+
+    def __init__(self, health_measures, sdoh_columns, results, counts):
+        self.health_measures = list(health_measures)
+        self.sdoh_columns = list(sdoh_columns)
+        self.results = results
+        self.counts = counts
+        self.health_index = {name: i for i, name in enumerate(self.health_measures)}
+
+    def has_measure(self, measure_name):
+        return measure_name in self.health_index
+
+    def top_drivers(self, measure_name, method='pearson', weighted=False, k=DEFAULT_TOP_K):
+        """The k SDOH columns with the strongest correlation to a health measure"""
+        row = self.health_index[measure_name]
+        r = self.results[(method, weighted)][row]
+        n = self.counts[(method, weighted)][row]
+        valid = np.flatnonzero(~np.isnan(r))
+        k = min(k, len(valid))
+        if k == 0:
+            return []
+        strength = np.abs(r[valid])
+        top = valid[np.argpartition(-strength, k - 1)[:k]]
+        top = top[np.argsort(-np.abs(r[top]), kind='stable')]
+        return [
+            {'column': self.sdoh_columns[i], 'r': float(r[i]), 'n': int(n[i])}
+            for i in top
+        ]
+
+
+def build_correlation_matrix(health_measures, health_values, sdoh_columns, sdoh_values, weights):
+    """Pearson and Spearman, unweighted and population-weighted"""
+    results = {}
+    counts = {}
+    for method in METHODS:
+        correlate = correlation_matrix if method == 'pearson' else spearman_matrix
+        for weighted in (False, True):
+            r, n = correlate(health_values, sdoh_values, weights if weighted else None)
+            results[(method, weighted)] = r
+            counts[(method, weighted)] = n
+
+    return CorrelationMatrix(health_measures, sdoh_columns, results, counts)
+
+
+def save_correlation_matrix(matrix, version, data_dir='data'):
+    arrays = {
+        'health_measures': np.asarray(matrix.health_measures, dtype=str),
+        'sdoh_columns': np.asarray(matrix.sdoh_columns, dtype=str),
+    }
+    for (method, weighted), r in matrix.results.items():
+        suffix = f"{method}_{'weighted' if weighted else 'unweighted'}"
+        arrays[f'r_{suffix}'] = r
+        arrays[f'n_{suffix}'] = matrix.counts[(method, weighted)]
+
+    path = os.path.join(data_dir, CORRELATION_FILE.format(version=version))
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+
+def load_correlation_matrix(version, data_dir='data'):
+    """Load cached correlations for a data version, or return None"""
+    path = os.path.join(data_dir, CORRELATION_FILE.format(version=version))
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as arrays:
+        results = {}
+        counts = {}
+        for method in METHODS:
+            for weighted in (False, True):
+                suffix = f"{method}_{'weighted' if weighted else 'unweighted'}"
+                results[(method, weighted)] = arrays[f'r_{suffix}']
+                counts[(method, weighted)] = arrays[f'n_{suffix}']
+        return CorrelationMatrix(arrays['health_measures'].tolist(), arrays['sdoh_columns'].tolist(),
+                                 results, counts)
+
+
+def correlation_inputs(measure_store, sdoh_store):
+    """Health and SDOH matrices aligned on the measure store's CountyFIPS rows"""
+    health_values, _, _ = measure_store.matrices_float64()
+    sdoh_values = sdoh_store.aligned_matrix(measure_store.geo['CountyFIPS'].values)
+    return health_values, sdoh_values
+
+
+def load_or_build_correlations(measure_store, sdoh_store, data_dir='data'):
+    """Cached correlations for the current data, computing and saving them on a miss"""
+    health_values, sdoh_values = correlation_inputs(measure_store, sdoh_store)
+    weights = measure_store.geo['TotalPopulation'].to_numpy(dtype=np.float64)
+    version = data_version(health_values, sdoh_values, weights, np.array([CORRELATION_FORMAT]))
+
+    matrix = load_correlation_matrix(version, data_dir)
+    if matrix is None:
+        matrix = build_correlation_matrix(measure_store.measures['Measure_Clean'], health_values,
+                                          sdoh_store.columns, sdoh_values, weights)
+        save_correlation_matrix(matrix, version, data_dir)
+    return matrix, version
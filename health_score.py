@@ -0,0 +1,186 @@
+"""
+Composite Health Score (0-100%) over the county x measure matrix
+Positive indicators raise the score, negative indicators lower it
+(see Health Score Methodology in README.md)
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rollup import level_keys, rollup_matrix
+
+# Indicator weights keyed by Measure_Short from data/available_measures.csv.
+# The sign gives the direction: higher values of a negative indicator lower the score.
+DEFAULT_WEIGHTS = {
+    # Positive indicators
+    'Cervical Cancer Screening': 1.0,
+    'Colorectal Cancer Screening': 1.0,
+    'Mammography': 1.0,
+    'Annual Checkup': 1.0,
+    'Dental Visit': 1.0,
+    'Taking BP Medication': 1.0,
+    'Cholesterol Screening': 1.0,
+    # Negative indicators
+    'Current Asthma': -1.0,
+    'Diabetes': -1.0,
+    'High Blood Pressure': -1.0,
+    'High Cholesterol': -1.0,
+    'Current Smoking': -1.0,
+    'Binge Drinking': -1.0,
+    'Obesity': -1.0,
+    'Coronary Heart Disease': -1.0,
+    'COPD': -1.0,
+    'Arthritis': -1.0,
+}
+
+NORMALIZATIONS = ['minmax', 'zscore']
+
+# A county needs at least this share of the total indicator weight to get a score
+MIN_COVERAGE = 0.5
+
+# Weight configurations kept in memory (least recently used are dropped)
+SCORE_CACHE_SIZE = 32
+
+SCORE_DECIMALS = 2
+
+
+def normalize_columns(values, normalization):
+    """Scale each column independently, ignoring missing values"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if normalization == 'zscore':
+            spread = np.nanstd(values, axis=0)
+            scaled = (values - np.nanmean(values, axis=0)) / spread
+        else:
+            low = np.nanmin(values, axis=0)
+            spread = np.nanmax(values, axis=0) - low
+            scaled = (values - low) / spread
+    # Constant columns carry no information
+    scaled[:, ~(spread > 0)] = np.nan
+    return scaled
+
+
+def composite_scores(values, weights, normalization='minmax'):
+    """Weighted composite of the normalized indicator columns, scaled to 0-100
+
+    Negative weights flip an indicator so that higher always means healthier.
+    Each county averages over the indicators it has; counties below
+    MIN_COVERAGE of the total weight get NaN.  Min-max composites are already
+    in [0, 1]; z-score composites are rescaled to [0, 1] across counties.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    scaled = normalize_columns(np.asarray(values, dtype=np.float64), normalization)
+    if normalization == 'minmax':
+        # 1 - x flips a negative indicator while staying in [0, 1]
+        scaled = np.where(weights < 0, 1.0 - scaled, scaled)
+    else:
+        scaled = scaled * np.sign(weights)
+
+    valid = ~np.isnan(scaled)
+    magnitude = np.abs(weights)
+    covered = valid @ magnitude
+    with np.errstate(invalid='ignore', divide='ignore'):
+        composite = np.where(valid, scaled, 0.0) @ magnitude / covered
+    composite[covered < MIN_COVERAGE * magnitude.sum()] = np.nan
+
+    if normalization == 'zscore' and np.any(~np.isnan(composite)):
+        low = np.nanmin(composite)
+        spread = np.nanmax(composite) - low
+        composite = (composite - low) / spread if spread > 0 else np.where(np.isnan(composite), np.nan, 0.5)
+
+    return composite * 100, valid.sum(axis=1)
+
+
+class HealthScoreEngine:
+    """Scores every county and state for a weight configuration, memoized per configuration"""
+
+    def __init__(self, measure_store):
+        self.store = measure_store
+        self.values, _, _ = measure_store.matrices_float64()
+        measures = measure_store.measures
+        # Weights may name a measure by Measure_Short or Measure_Clean
+        self.columns = {}
+        for i, (clean, short) in enumerate(zip(measures['Measure_Clean'], measures['Measure_Short'])):
+            self.columns[clean] = i
+            self.columns[short] = i
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def resolve_weights(self, weights):
+        """Map indicator names to store columns; raises KeyError for unknown names, ValueError for bad weights"""
+        unknown = [name for name in weights if name not in self.columns]
+        if unknown:
+            raise KeyError(f"Unknown indicators: {', '.join(unknown)}")
+        resolved = {}
+        for name, weight in weights.items():
+            try:
+                weight = float(weight)
+            except (TypeError, ValueError):
+                raise ValueError(f"Weight of {name} must be a number")
+            if not np.isfinite(weight):
+                raise ValueError(f"Weight of {name} must be a finite number")
+            if weight != 0:
+                resolved[self.columns[name]] = resolved.get(self.columns[name], 0.0) + weight
+        return resolved
+
+    def score(self, weights=None, normalization='minmax'):
+        """County and state scores for a weight configuration"""
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization, expected one of {NORMALIZATIONS}")
+        resolved = self.resolve_weights(DEFAULT_WEIGHTS if weights is None else weights)
+        if not resolved:
+            raise ValueError("At least one indicator needs a non-zero weight")
+
+        key = (normalization, tuple(sorted(resolved.items())))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        columns = list(resolved)
+        scores, indicator_counts = composite_scores(self.values[:, columns],
+                                                    [resolved[c] for c in columns], normalization)
+        result = self.build_result(scores, indicator_counts, resolved, normalization)
+
+        with self.lock:
+            self.cache[key] = result
+            if len(self.cache) > SCORE_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return result
+
+    def build_result(self, scores, indicator_counts, resolved, normalization):
+        geo = self.store.geo
+        mask = ~np.isnan(scores)
+
+        county = {
+            'CountyFIPS': geo['CountyFIPS'].values[mask].tolist(),
+            'LocationName': geo['LocationName'].values[mask].tolist(),
+            'StateDesc': geo['StateDesc'].values[mask].tolist(),
+            'lat': geo['lat'].values[mask].tolist(),
+            'lng': geo['lng'].values[mask].tolist(),
+            'TotalPopulation': geo['TotalPopulation'].values[mask].tolist(),
+            'Health_Score': np.round(scores[mask], SCORE_DECIMALS).tolist(),
+            'Indicator_Count': indicator_counts[mask].tolist(),
+        }
+
+        # Population-weighted state scores, as for the state measure views
+        rolled = rollup_matrix(scores, geo['TotalPopulation'].values, geo['lat'].values, geo['lng'].values,
+                               level_keys('state', geo['StateDesc'].values))
+        state_mask = rolled['count'][:, 0] > 0
+        state = {
+            'StateDesc': rolled['keys'][state_mask].tolist(),
+            'lat': rolled['lat'][state_mask, 0].tolist(),
+            'lng': rolled['lng'][state_mask, 0].tolist(),
+            'TotalPopulation': rolled['population'][state_mask, 0].tolist(),
+            'Health_Score': np.round(rolled['value'][state_mask, 0], SCORE_DECIMALS).tolist(),
+            'LocationCount': rolled['count'][state_mask, 0].tolist(),
+        }
+
+        short_names = self.store.measures['Measure_Short']
+        return {
+            'normalization': normalization,
+            'weights': {short_names[c]: w for c, w in resolved.items()},
+            'county': [dict(zip(county, row)) for row in zip(*county.values())],
+            'state': [dict(zip(state, row)) for row in zip(*state.values())],
+        }
@@ -0,0 +1,311 @@
+"""
+Local spatial statistics: Getis-Ord Gi* and Local Moran's I
+County centroids get a sparse binary spatial weights matrix once per data
+version, either each county's K nearest counties or every county within a
+distance band, held as CSR arrays (indptr, indices) and saved next to the
+data.  Spatial lags are sparse matrix-vector products (np.bincount over the
+stored entries).  Pseudo p-values come from conditional permutations, each
+county's own value held while its neighbours are drawn from the other
+counties, with chunks of counties spread over a thread pool.  Results are
+cached per measure.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from measure_store import data_version
+from spatial_index import haversine_miles
+
+WEIGHTS_FILE = 'spatial_weights_{kind}_{version}.npz'
+
+# 'knn': the KNN_NEIGHBOURS nearest counties; 'band': every county within
+# BAND_MILES.  A band wide enough to reach the remotest Alaska and Hawaii
+# counties (~500 miles) would link hundreds of counties to each mainland one,
+# so those few counties are left without neighbours (and statistics) instead.
+WEIGHT_KINDS = ['knn', 'band']
+KNN_NEIGHBOURS = 8
+BAND_MILES = 75.0
+
+PERMUTATIONS = 999
+PERMUTATION_SEED = 0
+SIGNIFICANCE = 0.05
+
+# Counties per block of haversine distances while building the weights
+BUILD_BLOCK = 512
+
+# Values gathered (counties x permutations x neighbours) per permutation chunk
+PERMUTATION_CHUNK_VALUES = 4_000_000
+
+# numpy gathers and reductions release the GIL, so threads run chunks in parallel
+WORKERS = os.cpu_count() or 1
+
+RESULT_CACHE_SIZE = 64
+
+
+class SpatialWeights:
+    """Binary spatial weights in CSR form: row i's neighbours are indices[indptr[i]:indptr[i + 1]]"""
+
+    def __init__(self, indptr, indices, kind, threshold=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.kind = kind
+        # Band width in miles ('band' weights only)
+        self.threshold = threshold
+        self.row_ids = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def cardinalities(self):
+        """Number of neighbours of each row"""
+        return np.diff(self.indptr)
+
+    def lag(self, values):
+        """Sum of each row's neighbours' values (W @ values)"""
+        return np.bincount(self.row_ids, weights=values[self.indices], minlength=len(self))
+
+    def subset(self, keep):
+        """Weights among the rows where ``keep`` is true, renumbered in row order"""
+        entries = keep[self.row_ids] & keep[self.indices]
+        renumbered = np.cumsum(keep) - 1
+        counts = np.bincount(renumbered[self.row_ids[entries]], minlength=int(keep.sum()))
+        return SpatialWeights(np.concatenate([[0], np.cumsum(counts)]), renumbered[self.indices[entries]],
+                              self.kind, self.threshold)
+
+
+def distance_blocks(lat, lng):
+    """(rows, miles) blocks of the rows x all distance matrix; self and unlocated pairs are inf"""
+    located = np.isfinite(lat) & np.isfinite(lng)
+    for start in range(0, len(lat), BUILD_BLOCK):
+        rows = np.arange(start, min(start + BUILD_BLOCK, len(lat)))
+        with np.errstate(invalid='ignore'):
+            miles = haversine_miles(lat[rows, None], lng[rows, None], lat[None, :], lng[None, :])
+        miles[:, ~located] = np.inf
+        miles[~located[rows]] = np.inf
+        miles[np.arange(len(rows)), rows] = np.inf
+        yield rows, miles
+
+
+def csr_from_masks(blocks, n):
+    """CSR arrays from (rows, boolean rows x n neighbour mask) blocks"""
+    indices, counts = [], []
+    for rows, mask in blocks:
+        block_rows, block_columns = np.nonzero(mask)
+        indices.append(block_columns)
+        counts.append(np.bincount(block_rows, minlength=len(rows)))
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(counts)]), indices
+
+
+def knn_weights(lat, lng, k=KNN_NEIGHBOURS):
+    """Each located row's k nearest located rows"""
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    k = min(k, int((np.isfinite(lat) & np.isfinite(lng)).sum()) - 1)
+
+    def masks():
+        for rows, miles in distance_blocks(lat, lng):
+            mask = np.zeros(miles.shape, dtype=bool)
+            if k > 0:
+                nearest = np.argpartition(miles, k - 1, axis=1)[:, :k]
+                np.put_along_axis(mask, nearest, True, axis=1)
+            yield rows, mask & np.isfinite(miles)
+
+    indptr, indices = csr_from_masks(masks(), len(lat))
+    return SpatialWeights(indptr, indices, 'knn')
+
+
+def band_weights(lat, lng, miles=BAND_MILES):
+    """Each located row's located rows within ``miles``"""
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    indptr, indices = csr_from_masks(((rows, block <= miles) for rows, block in distance_blocks(lat, lng)),
+                                     len(lat))
+    return SpatialWeights(indptr, indices, 'band', miles)
+
+
+def save_weights(weights, version, data_dir='data'):
+    path = os.path.join(data_dir, WEIGHTS_FILE.format(kind=weights.kind, version=version))
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, indptr=weights.indptr, indices=weights.indices,
+                 threshold=np.nan if weights.threshold is None else weights.threshold)
+    os.replace(path + '.tmp', path)
+
+
+def load_weights(kind, version, data_dir='data'):
+    """Load saved weights for a data version, or return None"""
+    path = os.path.join(data_dir, WEIGHTS_FILE.format(kind=kind, version=version))
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        threshold = float(arrays['threshold'])
+        return SpatialWeights(arrays['indptr'], arrays['indices'], kind,
+                              None if np.isnan(threshold) else threshold)
+
+
+def load_or_build_weights(measure_store, data_dir='data'):
+    """Saved weights of every kind for the county centroids, building and saving them on a miss"""
+    lat = measure_store.geo['lat'].to_numpy(dtype=np.float64)
+    lng = measure_store.geo['lng'].to_numpy(dtype=np.float64)
+    version = data_version(lat, lng, np.array([KNN_NEIGHBOURS, BAND_MILES]))
+    weights = {}
+    for kind in WEIGHT_KINDS:
+        weights[kind] = load_weights(kind, version, data_dir)
+        if weights[kind] is None:
+            weights[kind] = knn_weights(lat, lng) if kind == 'knn' else band_weights(lat, lng)
+            save_weights(weights[kind], version, data_dir)
+    return weights, version
+
+
+def permutation_draws(n, size, permutations, seed=PERMUTATION_SEED):
+    """Per permutation, ``size`` distinct positions among n - 1 others, in random order"""
+    rng = np.random.default_rng(seed)
+    keys = rng.random((permutations, n - 1))
+    picked = np.argpartition(keys, size - 1, axis=1)[:, :size] if size < n - 1 else np.argsort(keys, axis=1)
+    order = np.argsort(np.take_along_axis(keys, picked, axis=1), axis=1)
+    return np.take_along_axis(picked, order, axis=1)
+
+
+def permuted_lags(z, cardinalities, rows, draws):
+    """Neighbour sums of ``rows`` with each row's neighbours replaced by each permutation's draw"""
+    # Draws index the other n - 1 rows; shift past the row itself
+    positions = draws[None, :, :] + (draws[None, :, :] >= rows[:, None, None])
+    used = np.arange(draws.shape[1])[None, :] < cardinalities[rows][:, None]
+    return np.einsum('rpj,rj->rp', z[positions], used.astype(np.float64))
+
+
+def folded_p_values(observed, permuted):
+    """Pseudo p-values, (extreme + 1) / (permutations + 1), from the side the observation falls on"""
+    # Ties count on both sides, so a row whose permutations all equal it is not significant
+    larger = (permuted >= observed[:, None]).sum(axis=1)
+    smaller = (permuted <= observed[:, None]).sum(axis=1)
+    return (np.minimum(larger, smaller) + 1.0) / (permuted.shape[1] + 1.0)
+
+
+def local_statistics(values, weights, permutations=PERMUTATIONS, seed=PERMUTATION_SEED, workers=WORKERS):
+    """Gi* z-scores and Local Moran's I with permutation pseudo p-values for every row
+
+    Rows without a value are left out of the analysis (NaN results), as are
+    neighbour links to them; rows left without neighbours are NaN too.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    result = {name: np.full(len(values), np.nan)
+              for name in ('gi_z', 'gi_p', 'moran_i', 'moran_p', 'lag')}
+    result['neighbours'] = np.zeros(len(values), dtype=np.int64)
+    n = int(valid.sum())
+    if n < 3:
+        return result
+
+    weights = weights.subset(valid)
+    x = values[valid]
+    z = x - x.mean()
+    m2 = (z ** 2).mean()
+    cardinalities = weights.cardinalities()
+    lag = weights.lag(z)
+    linked = cardinalities > 0
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Local Moran's I on row-standardized weights
+        row_lag = lag / cardinalities
+        moran = z / m2 * row_lag
+        # Gi* on binary weights that include the row itself
+        own = cardinalities + 1.0
+        spread = np.sqrt(m2) * np.sqrt((n * own - own ** 2) / (n - 1))
+        gi = (lag + z) / spread
+    if m2 == 0:
+        moran[:] = np.nan
+        gi[:] = np.nan
+    moran[~linked] = np.nan
+    gi[~linked] = np.nan
+
+    gi_p = np.full(n, np.nan)
+    moran_p = np.full(n, np.nan)
+    # Rows in order of neighbour count, so each chunk only draws as many neighbours as it uses
+    rows = np.flatnonzero(linked)
+    rows = rows[np.argsort(cardinalities[rows], kind='stable')]
+    if permutations > 0 and len(rows) and m2 > 0:
+        draws = permutation_draws(n, int(cardinalities.max()), permutations, seed)
+
+        def run(chunk_rows):
+            # With the row's own value held, Gi* rises with the neighbour sum and Local
+            # Moran's I rises or falls with it (the sign of z), so one folded count serves both
+            used = draws[:, :cardinalities[chunk_rows[-1]]]
+            p_values = folded_p_values(lag[chunk_rows], permuted_lags(z, cardinalities, chunk_rows, used))
+            gi_p[chunk_rows] = p_values
+            moran_p[chunk_rows] = np.where(z[chunk_rows] == 0, 1.0, p_values)
+
+        chunks, start = [], 0
+        while start < len(rows):
+            # A chunk's last row has its most neighbours, which sets the chunk's gather size
+            end = start + 1
+            while (end < len(rows) and
+                   (end + 1 - start) * cardinalities[rows[end]] * permutations <= PERMUTATION_CHUNK_VALUES):
+                end += 1
+            chunks.append(rows[start:end])
+            start = end
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as pool:
+            list(pool.map(run, chunks))
+
+    result['gi_z'][valid] = gi
+    result['gi_p'][valid] = gi_p
+    result['moran_i'][valid] = moran
+    result['moran_p'][valid] = moran_p
+    result['lag'][valid] = row_lag
+    result['neighbours'][valid] = cardinalities
+    return result
+
+
+def hotspot_labels(gi_z, gi_p, significance=SIGNIFICANCE):
+    """'hot' / 'cold' for significant Gi* z-scores, None otherwise"""
+    return [None if not p <= significance else ('hot' if score > 0 else 'cold')
+            for score, p in zip(gi_z.tolist(), gi_p.tolist())]
+
+
+def cluster_labels(values, lag, moran_p, significance=SIGNIFICANCE):
+    """Moran scatterplot quadrant ('HH', 'LL', 'HL', 'LH') of significant rows, None otherwise
+
+    ``lag`` is the row-standardized neighbour mean of the centred values.
+    """
+    centred = values - np.nanmean(values)
+    return [None if not p <= significance else ('H' if value > 0 else 'L') + ('H' if neighbours > 0 else 'L')
+            for value, neighbours, p in zip(centred.tolist(), lag.tolist(), moran_p.tolist())]
+
+
+class HotspotEngine:
+    """Local statistics of county measures over saved spatial weights, memoized per measure"""
+
+    def __init__(self, measure_store, sdoh_store, weights):
+        self.store = measure_store
+        self.sdoh_store = sdoh_store
+        self.weights = weights
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def values(self, source, column):
+        """A PLACES ('health') or SDOH column in county store row order"""
+        if source == 'sdoh':
+            return self.sdoh_store.aligned_matrix(self.store.geo['CountyFIPS'].values, [column])[:, 0]
+        return self.store.measure_matrix([column])[:, 0]
+
+    def analyze(self, source, column, kind='knn'):
+        """Values and local statistics of one measure over one kind of weights"""
+        if kind not in self.weights:
+            raise ValueError(f"Unknown weights, expected one of {WEIGHT_KINDS}")
+        key = (source, column, kind)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        values = self.values(source, column)
+        result = dict(local_statistics(values, self.weights[kind]), values=values)
+
+        with self.lock:
+            self.cache[key] = result
+            if len(self.cache) > RESULT_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return result
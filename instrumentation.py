@@ -0,0 +1,181 @@
+"""
+Request metrics in the Prometheus text format, and queued logging
+Per-route histograms of the time each request spends loading (waiting for
+the data snapshot), computing and serializing, response sizes, response
+cache hits and misses and snapshot build durations.  The counts live in
+process memory, so under a pre-forking server each worker reports its own.
+
+Log records are put on a queue by the request thread and written by a
+listener thread, so a slow stdout never blocks a request.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds (request phases) and bytes (response bodies)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KB .. 256 MB
+SNAPSHOT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+PHASES = ('load', 'compute', 'serialize', 'total')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counts per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Bucketed observations per label combination (cumulative buckets, sum and count)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        # One slot per bucket plus +Inf, then the sum
+        slot = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self.lock:
+            series = {labels: list(counts) for labels, counts in self.series.items()}
+        for labels, counts in sorted(series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                total += count
+                le = 'le="{}"'.format(bound if bound == '+Inf' else _number(float(bound)))
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {total}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {total}"
+
+
+request_seconds = Histogram('http_request_duration_seconds',
+                            'Request time by route and phase (load, compute, serialize, total)',
+                            LATENCY_BUCKETS, ('route', 'phase'))
+response_bytes = Histogram('http_response_bytes', 'Response body bytes as sent (after compression)',
+                           SIZE_BUCKETS, ('route',))
+requests_total = Counter('http_requests_total', 'Requests by route and status code', ('route', 'status'))
+cache_lookups = Counter('response_cache_lookups_total', 'Response cache lookups by route and result',
+                        ('route', 'result'))
+snapshot_load_seconds = Histogram('snapshot_load_seconds', 'Time to build a data snapshot', SNAPSHOT_BUCKETS)
+
+METRICS = [request_seconds, response_bytes, requests_total, cache_lookups, snapshot_load_seconds]
+
+
+def render_metrics(metrics=METRICS):
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimer:
+    """Time one request spends in each phase; compute is what the others leave over"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES[:-1], 0.0)
+        self.depth = dict.fromkeys(PHASES[:-1], 0)
+
+    @contextmanager
+    def phase(self, name):
+        # Only the outermost of nested timers (e.g. jsonify inside an encoder) counts
+        self.depth[name] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth[name] -= 1
+            if self.depth[name] == 0:
+                self.seconds[name] += time.perf_counter() - started
+
+    def record(self, route, status, body_bytes):
+        total = time.perf_counter() - self.started
+        phases = dict(self.seconds, total=total)
+        phases['compute'] = max(total - phases['load'] - phases['serialize'], 0.0)
+        for phase in PHASES:
+            request_seconds.observe(phases[phase], route, phase)
+        if body_bytes is not None:
+            response_bytes.observe(body_bytes, route)
+        requests_total.inc(route, str(status))
+
+
+def queued_logger(name, level=logging.INFO):
+    """Logger whose records are queued by the caller and written to stdout by a listener thread"""
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter('%(message)s'))
+
+    def start_listener():
+        listener = logging.handlers.QueueListener(records, output)
+        listener.start()
+        atexit.register(listener.stop)
+
+    start_listener()
+    # The listener thread doesn't survive fork; each pre-forked worker starts its own
+    os.register_at_fork(after_in_child=start_listener)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,110 @@
+"""
+Content-hash manifest for incremental preprocessing
+Records, per preprocessing stage, the hashes of its input files, of the code
+that builds it and of the files it wrote.  A stage whose inputs, code and
+outputs all still match is skipped on the next run.
+"""
+
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = 'manifest.json'
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """sha1 of a file's contents, read in chunks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def expand_paths(paths):
+    """Files named by ``paths``, with directories expanded to their (sorted) files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if os.path.isfile(os.path.join(path, name))]
+        else:
+            files.append(path)
+    return files
+
+
+def hash_paths(paths):
+    """{path: sha1} for every file under ``paths``; missing files hash to None"""
+    return {path: file_hash(path) if os.path.exists(path) else None for path in expand_paths(paths)}
+
+
+def code_hash(*modules):
+    """Short hash of the named source files (relative to this directory)"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in modules:
+        digest.update(name.encode())
+        digest.update(file_hash(os.path.join(directory, name)).encode())
+    return digest.hexdigest()[:16]
+
+
+class Manifest:
+    """Stage records of one data directory, saved as data/manifest.json"""
+
+    def __init__(self, data_dir='data', force=False):
+        self.path = os.path.join(data_dir, MANIFEST_FILE)
+        self.force = force
+        self.stages = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.stages = json.load(f).get('stages', {})
+
+    def is_current(self, stage, inputs, outputs, code):
+        """True when the stage was built from these inputs and code, and its outputs are untouched"""
+        record = self.stages.get(stage)
+        if self.force or record is None or record['code'] != code:
+            return False
+        if record['inputs'] != hash_paths(inputs):
+            return False
+        current = hash_paths(outputs)
+        return current == record['outputs'] and None not in current.values()
+
+    def record(self, stage, inputs, outputs, code):
+        """Remember a finished stage; stages that left an output missing are not recorded"""
+        hashes = hash_paths(outputs)
+        if not hashes or None in hashes.values():
+            self.stages.pop(stage, None)
+            return False
+        self.stages[stage] = {'code': code, 'inputs': hash_paths(inputs), 'outputs': hashes}
+        return True
+
+    def retain(self, stages):
+        """Forget the records of stages no longer in ``stages`` (renamed or split)"""
+        for stage in [stage for stage in self.stages if stage not in stages]:
+            del self.stages[stage]
+
+    @property
+    def version(self):
+        """Short hash over every recorded output, so any data change gives a new version"""
+        digest = hashlib.sha1()
+        for stage in sorted(self.stages):
+            for path, value in sorted(self.stages[stage]['outputs'].items()):
+                digest.update(f"{path}={value}\n".encode())
+        return digest.hexdigest()[:16]
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'stages': self.stages}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def load_manifest_version(data_dir='data'):
+    """Data version recorded by the last preprocessing run, or None without a manifest"""
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get('version')
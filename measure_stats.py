@@ -0,0 +1,124 @@
+"""
+Distribution summaries and legend class breaks for a measure
+Computed once per measure and level so clients do not re-sort every value
+"""
+
+import numpy as np
+
+HISTOGRAM_BINS = 20
+CLASS_COUNT = 5
+QUANTILES = [0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95]
+
+# Summary values are rounded to keep the payload small
+DECIMALS = 4
+
+# Jenks runs on at most this many evenly spaced order statistics
+JENKS_SAMPLE = 512
+
+
+def calculate_quartiles(values):
+    """Quartile breaks matching calculateQuartiles in static/app.js"""
+    values = np.sort(values[~np.isnan(values)])
+    if len(values) == 0:
+        return None
+    n = len(values)
+    return {
+        'q1': float(values[int(n * 0.25)]),
+        'q2': float(values[int(n * 0.5)]),
+        'q3': float(values[int(n * 0.75)]),
+        'min': float(values[0]),
+        'max': float(values[-1])
+    }
+
+
+def jenks_breaks(sorted_values, class_count=CLASS_COUNT):
+    """Fisher-Jenks natural breaks as class edges [min, ..., max]
+
+    Dynamic programming over a matrix of within-segment squared deviations,
+    so each class count is one vectorized min over an n x n matrix.
+    """
+    n = len(sorted_values)
+    if n == 0:
+        return []
+    if n > JENKS_SAMPLE:
+        positions = np.linspace(0, n - 1, JENKS_SAMPLE).round().astype(int)
+        sorted_values = sorted_values[positions]
+        n = JENKS_SAMPLE
+    class_count = min(class_count, n)
+
+    s1 = np.r_[0.0, np.cumsum(sorted_values)]
+    s2 = np.r_[0.0, np.cumsum(sorted_values ** 2)]
+    start = np.arange(n)[:, None]
+    end = np.arange(n)[None, :]
+    size = end - start + 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # ssd[i, j]: squared deviation of sorted_values[i..j] around its mean
+        ssd = (s2[end + 1] - s2[start]) - (s1[end + 1] - s1[start]) ** 2 / size
+    ssd = np.where(size > 0, np.maximum(ssd, 0.0), np.inf)
+
+    cost = ssd[0].copy()
+    splits = []
+    for _ in range(1, class_count):
+        # candidate[i, j]: best cost ending a class at i - 1, then sorted_values[i..j]
+        previous = np.r_[np.inf, cost[:-1]]
+        candidate = previous[:, None] + ssd
+        best_start = np.argmin(candidate, axis=0)
+        cost = candidate[best_start, np.arange(n)]
+        splits.append(best_start)
+
+    edges = [float(sorted_values[-1])]
+    j = n - 1
+    for best_start in reversed(splits):
+        i = best_start[j]
+        edges.append(float(sorted_values[i]))
+        j = i - 1
+    edges.append(float(sorted_values[0]))
+    return sorted(set(edges))
+
+
+def summarize_values(values, weights=None):
+    """Summary statistics, histogram and legend breaks for one set of values"""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    clean = np.sort(values[valid])
+    if len(clean) == 0:
+        return {'count': 0}
+
+    quartiles = calculate_quartiles(clean)
+    iqr = quartiles['q3'] - quartiles['q1']
+    counts, edges = np.histogram(clean, bins=HISTOGRAM_BINS)
+
+    summary = {
+        'count': int(len(clean)),
+        'mean': float(clean.mean()),
+        'std': float(clean.std(ddof=1)) if len(clean) > 1 else 0.0,
+        'min': float(clean[0]),
+        'max': float(clean[-1]),
+        'quartiles': quartiles,
+        # Outlier-clamped color scale bounds used by the map (1.5 IQR rule)
+        'color_bounds': [quartiles['q1'] - 1.5 * iqr, quartiles['q3'] + 1.5 * iqr],
+        'quantiles': {f'p{int(q * 100)}': float(v) for q, v in zip(QUANTILES, np.quantile(clean, QUANTILES))},
+        'histogram': {'edges': edges.tolist(), 'counts': counts.tolist()},
+        'breaks': {
+            'quantile': np.quantile(clean, np.linspace(0, 1, CLASS_COUNT + 1)).tolist(),
+            'jenks': jenks_breaks(clean)
+        }
+    }
+
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[valid]
+        weights = np.where(np.isnan(weights), 0.0, weights)
+        if weights.sum() > 0:
+            summary['weighted_mean'] = float(np.average(values[valid], weights=weights))
+
+    return _rounded(summary)
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, DECIMALS)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rounded(v) for v in value]
+    return value
@@ -0,0 +1,201 @@
+"""
+Resident location x measure store for the PLACES health measures
+Built once from the preprocessed files so requests only slice columns.
+Counties are keyed by CountyFIPS; places (cities/towns) carry no FIPS in
+the preprocessed files, so they are keyed by state, name and centroid.
+"""
+
+import hashlib
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# float32 keeps ~7 significant digits; PLACES publishes values to one decimal
+VALUE_DECIMALS = 4
+
+COUNTY_GEO_COLUMNS = ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'CountyFIPS']
+
+PLACE_GEO_COLUMNS = ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'LocationKey']
+
+COUNTY_RESPONSE_COLUMNS = [
+    'LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation',
+    'Data_Value', 'Data_Value_Unit', 'Data_Value_Type',
+    'Low_Confidence_Limit', 'High_Confidence_Limit'
+]
+
+STATE_RESPONSE_COLUMNS = [
+    'StateDesc', 'lat', 'lng', 'TotalPopulation',
+    'Data_Value', 'Data_Value_Unit', 'Data_Value_Type',
+    'Low_Confidence_Limit', 'High_Confidence_Limit',
+    'Measure_Short', 'LocationCount', 'LocationName'
+]
+
+
+def create_safe_filename(measure):
+    """Create a safe filename from measure name"""
+    # Remove special characters and replace spaces with underscores
+    safe_name = re.sub(r'[^\w\s-]', '', measure)
+    safe_name = re.sub(r'[-\s]+', '_', safe_name)
+    return safe_name[:50] + '.csv'
+
+
+def parse_population(series):
+    """Convert a TotalPopulation column to float (handle comma-separated values)"""
+    return series.astype(str).str.replace(',', '').astype(float)
+
+
+def place_keys(frame):
+    """Identity of each place row: state, name and centroid"""
+    return (frame['StateDesc'].astype(str) + '|' + frame['LocationName'].astype(str) + '|'
+            + frame['lat'].astype(str) + '|' + frame['lng'].astype(str))
+
+
+class MeasureStore:
+    """Dense location x measure matrices plus a location key -> row index
+
+    Rows follow data/county_locations_summary.csv (or data/locations_summary.csv
+    for places) and columns follow data/available_measures.csv.  Missing
+    values are NaN.
+    """
+
+    def __init__(self, geo, measures, values, low, high, units, value_types, short_names, key_column='CountyFIPS'):
+        self.geo = geo
+        self.measures = measures
+        self.values = values
+        self.low = low
+        self.high = high
+        self.units = units
+        self.value_types = value_types
+        self.short_names = short_names
+        self.measure_index = {name: i for i, name in enumerate(measures['Measure_Clean'])}
+        self.key_column = key_column
+        self.key_index = {key: i for i, key in enumerate(geo[key_column])}
+
+    def __len__(self):
+        return len(self.geo)
+
+    def has_measure(self, measure_name):
+        return measure_name in self.measure_index
+
+    def column(self, measure_name):
+        """Return the float32 value column for a measure (a view, not a copy)"""
+        return self.values[:, self.measure_index[measure_name]]
+
+    def county_values(self, measure_name):
+        """Float64 copy of a measure's county values, in row order"""
+        return _as_float64(self.column(measure_name))
+
+    def measure_matrix(self, measure_names):
+        """Float64 n x k copy of the value columns of ``measure_names``"""
+        return _as_float64(self.values[:, [self.measure_index[name] for name in measure_names]])
+
+    def matrices_float64(self):
+        """Float64 copies of the value and CI matrices for numeric work"""
+        return _as_float64(self.values), _as_float64(self.low), _as_float64(self.high)
+
+    def measure_short(self, measure_name):
+        """Measure_Short as written in the preprocessed measure files"""
+        return self.short_names[self.measure_index[measure_name]]
+
+    def county_frame(self, measure_name, rows=None):
+        """Build the county response frame for a measure from column slices
+
+        ``rows`` optionally restricts the frame to a boolean mask of store rows.
+        """
+        col = self.measure_index[measure_name]
+        values = self.values[:, col]
+        mask = ~np.isnan(values)
+        if rows is not None:
+            mask &= rows
+
+        frame = self.geo.loc[mask, ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation']].copy()
+        frame['Data_Value'] = _as_float64(values[mask])
+        frame['Data_Value_Unit'] = self.units[col]
+        frame['Data_Value_Type'] = self.value_types[col]
+        frame['Low_Confidence_Limit'] = _as_float64(self.low[mask, col])
+        frame['High_Confidence_Limit'] = _as_float64(self.high[mask, col])
+        frame[self.key_column] = self.geo[self.key_column].values[mask]
+        frame['Measure_Short'] = self.measure_short(measure_name)
+        return frame
+
+    def unit(self, measure_name):
+        return self.units[self.measure_index[measure_name]]
+
+    def value_type(self, measure_name):
+        return self.value_types[self.measure_index[measure_name]]
+
+
+def _as_float64(values):
+    """Widen float32 values for serialization without float32 noise digits"""
+    return np.round(values.astype(np.float64), VALUE_DECIMALS)
+
+
+def data_version(*arrays):
+    """Short content hash of a set of arrays, used to key caches derived from them"""
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def build_measure_store(data_dir='data', dtype=np.float32):
+    """Read every preprocessed county measure file once"""
+    locations = pd.read_csv(os.path.join(data_dir, 'county_locations_summary.csv'),
+                            dtype={'CountyFIPS': str})
+    locations['TotalPopulation'] = parse_population(locations['TotalPopulation'])
+    locations['CountyFIPS'] = locations['CountyFIPS'].str.zfill(5)
+
+    geo = locations.rename(columns={'CountyName': 'LocationName'})[COUNTY_GEO_COLUMNS].reset_index(drop=True)
+    return _fill_store(geo, 'CountyFIPS', os.path.join(data_dir, 'county_measures'), data_dir, dtype,
+                       lambda measure_data: measure_data['CountyFIPS'].str.zfill(5), {'CountyFIPS': str})
+
+
+def build_place_store(data_dir='data', dtype=np.float32):
+    """Read every preprocessed place-level measure file once, or return None without them"""
+    summary_path = os.path.join(data_dir, 'locations_summary.csv')
+    if not os.path.exists(summary_path) or not os.path.isdir(os.path.join(data_dir, 'measures')):
+        return None
+
+    locations = pd.read_csv(summary_path, dtype={'LocationName': str, 'StateDesc': str})
+    locations['TotalPopulation'] = parse_population(locations['TotalPopulation'])
+    locations['LocationKey'] = place_keys(locations)
+    geo = locations.drop_duplicates('LocationKey')[PLACE_GEO_COLUMNS].reset_index(drop=True)
+    return _fill_store(geo, 'LocationKey', os.path.join(data_dir, 'measures'), data_dir, dtype,
+                       place_keys, {'LocationName': str, 'StateDesc': str})
+
+
+def _fill_store(geo, key_column, measure_dir, data_dir, dtype, measure_keys, read_dtypes):
+    """Scatter each measure file into the store matrices by its location keys"""
+    row_index = pd.Index(geo[key_column])
+
+    measures = pd.read_csv(os.path.join(data_dir, 'available_measures.csv'))
+    measure_files = [create_safe_filename(m) for m in measures['Measure_Clean']]
+    present = [os.path.exists(os.path.join(measure_dir, f)) for f in measure_files]
+    measures = measures[present].reset_index(drop=True)
+    measure_files = [f for f, p in zip(measure_files, present) if p]
+
+    n_rows, n_cols = len(geo), len(measures)
+    values = np.full((n_rows, n_cols), np.nan, dtype=dtype)
+    low = np.full((n_rows, n_cols), np.nan, dtype=dtype)
+    high = np.full((n_rows, n_cols), np.nan, dtype=dtype)
+    units = []
+    value_types = []
+    short_names = []
+
+    for col, filename in enumerate(measure_files):
+        measure_data = pd.read_csv(os.path.join(measure_dir, filename), dtype=read_dtypes)
+        rows = row_index.get_indexer(measure_keys(measure_data))
+        found = rows >= 0
+        rows = rows[found]
+        values[rows, col] = measure_data['Data_Value'].values[found]
+        low[rows, col] = measure_data['Low_Confidence_Limit'].values[found]
+        high[rows, col] = measure_data['High_Confidence_Limit'].values[found]
+        units.append(measure_data['Data_Value_Unit'].iat[0] if len(measure_data) else '%')
+        value_types.append(measure_data['Data_Value_Type'].iat[0] if len(measure_data) else 'Crude Prevalence')
+        short_names.append(measure_data['Measure_Short'].iat[0] if len(measure_data) else measures['Measure_Short'].iat[col])
+
+    return MeasureStore(geo, measures, values, low, high, units, value_types, short_names, key_column)
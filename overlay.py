@@ -0,0 +1,78 @@
+"""
+Server-side health x SDOH overlay join
+Pairs a PLACES measure with an SDOH variable on CountyFIPS and precomputes
+the quartile classes the map uses to color split markers
+"""
+
+import numpy as np
+
+from measure_stats import calculate_quartiles
+
+CLASS_LABELS = ['Low', 'Medium-Low', 'Medium-High', 'High']
+
+CLASS_COLUMNS = ['Health_Class', 'SDOH_Class', 'Bivariate_Class']
+
+
+def classify_quartiles(values, quartiles):
+    """Quartile class per value: 0 (Low) .. 3 (High), -1 where missing"""
+    classes = np.full(len(values), -1, dtype=np.int8)
+    if quartiles is None:
+        return classes
+    valid = ~np.isnan(values)
+    breaks = np.array([quartiles['q1'], quartiles['q2'], quartiles['q3']])
+    classes[valid] = np.searchsorted(breaks, values[valid], side='right')
+    return classes
+
+
+def _to_list(values, missing=None):
+    """Convert a column to plain Python values with None for missing entries"""
+    values = values.tolist()
+    if missing is None:
+        return [None if isinstance(v, float) and v != v else v for v in values]
+    return [None if v == missing else v for v in values]
+
+
+def overlay_columns(health_frame, sdoh_values, sdoh_all_values, health_all_values=None):
+    """Attach SDOH values and bivariate classes to a health response frame, as columns
+
+    ``sdoh_values`` is aligned to the rows of ``health_frame``;
+    ``sdoh_all_values`` is every SDOH value, used for the SDOH quartiles so
+    they match the SDOH-only map.  ``health_all_values`` does the same for
+    the health quartiles when ``health_frame`` is only part of the map.
+    Classes are -1 where a value is missing.
+    """
+    health_values = health_frame['Data_Value'].to_numpy(dtype=float)
+    if health_all_values is None:
+        health_all_values = health_values
+    health_quartiles = calculate_quartiles(np.asarray(health_all_values, dtype=float))
+    sdoh_quartiles = calculate_quartiles(np.asarray(sdoh_all_values, dtype=float))
+
+    health_class = classify_quartiles(health_values, health_quartiles)
+    sdoh_class = classify_quartiles(sdoh_values, sdoh_quartiles)
+
+    columns = {name: health_frame[name].to_numpy() for name in health_frame.columns}
+    columns['SDOH_Value'] = np.asarray(sdoh_values, dtype=float)
+    columns['Health_Class'] = health_class
+    columns['SDOH_Class'] = sdoh_class
+    # 4 x 4 bivariate class: health quartile * 4 + SDOH quartile
+    columns['Bivariate_Class'] = np.where((health_class >= 0) & (sdoh_class >= 0), health_class * 4 + sdoh_class, -1).astype(np.int8)
+
+    return {
+        'health_quartiles': health_quartiles,
+        'sdoh_quartiles': sdoh_quartiles,
+        'class_labels': CLASS_LABELS,
+        'columns': columns
+    }
+
+
+def build_overlay(health_frame, sdoh_values, sdoh_all_values, health_all_values=None):
+    """Overlay response with one record per row (see overlay_columns)"""
+    overlay = overlay_columns(health_frame, sdoh_values, sdoh_all_values, health_all_values)
+    columns = {
+        name: _to_list(values, missing=-1 if name in CLASS_COLUMNS else None)
+        for name, values in overlay.pop('columns').items()
+    }
+
+    names = list(columns)
+    overlay['data'] = [dict(zip(names, row)) for row in zip(*columns.values())]
+    return overlay
@@ -0,0 +1,142 @@
+"""
+Streaming ingest of the place-level (city/town) PLACES file
+The file is read in fixed-size chunks with only the columns the app uses,
+explicit dtypes and categoricals for the repeated strings.  Each chunk is
+cleaned once and appended to the per-measure files, while the location and
+measure summaries are folded incrementally, so peak memory depends on the
+chunk size and the number of places, not on the size of the file.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+PLACE_DATA_FILE = 'data/PLACES__Local_Data_for_Better_Health,_Place_Data_2020_release_20250913.csv'
+
+# Rows per chunk; peak memory follows this (about 200 MB at 50k rows), not the file size
+CHUNK_ROWS = 50_000
+
+PLACE_DTYPES = {
+    'StateDesc': 'category',
+    'LocationName': 'str',
+    'Measure': 'category',
+    'Short_Question_Text': 'category',
+    'Data_Value_Unit': 'category',
+    'Data_Value_Type': 'category',
+    'Data_Value': 'float64',
+    'Low_Confidence_Limit': 'float64',
+    'High_Confidence_Limit': 'float64',
+    'TotalPopulation': 'str',
+    'Geolocation': 'str',
+}
+
+PLACE_MEASURE_COLUMNS = [
+    'LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation',
+    'Data_Value', 'Data_Value_Unit', 'Data_Value_Type',
+    'Low_Confidence_Limit', 'High_Confidence_Limit', 'Measure_Short'
+]
+
+LOCATION_KEYS = ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation']
+
+COORD_PATTERN = r'POINT \(([^ ]+) ([^)]+)\)'
+
+
+def read_place_chunks(path=PLACE_DATA_FILE, chunksize=CHUNK_ROWS):
+    """Raw chunks of the place file, restricted to PLACE_DTYPES columns"""
+    return pd.read_csv(path, usecols=lambda column: column in PLACE_DTYPES, dtype=PLACE_DTYPES,
+                       chunksize=chunksize)
+
+
+def clean_place_chunk(chunk, short_name):
+    """Rows with a numeric value and US coordinates, with Measure_Clean/Measure_Short added
+
+    ``short_name`` builds a short measure name where Short_Question_Text is missing.
+    """
+    chunk = chunk.dropna(subset=['Data_Value'])
+
+    # Geolocation is parsed once, here
+    coords = chunk['Geolocation'].str.extract(COORD_PATTERN)
+    lat = pd.to_numeric(coords[1], errors='coerce')
+    lng = pd.to_numeric(coords[0], errors='coerce')
+    valid = lat.between(24, 72) & lng.between(-180, -65)  # Rough US bounds
+    chunk = chunk[valid].drop(columns='Geolocation')
+    chunk['lat'] = lat[valid]
+    chunk['lng'] = lng[valid]
+
+    chunk['TotalPopulation'] = chunk['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
+
+    measure = chunk['Measure'].astype(str).str.strip()
+    short_names = {name: short_name(name) for name in measure.unique()}
+    chunk['Measure_Clean'] = measure
+    chunk['Measure_Short'] = chunk['Short_Question_Text'].astype(object).fillna(measure.map(short_names))
+    return chunk
+
+
+class PlaceIngest:
+    """Incremental place-level outputs: per-measure files, location and measure summaries"""
+
+    def __init__(self, short_name, measures_dir=None, safe_filename=None):
+        self.short_name = short_name
+        self.measures_dir = measures_dir
+        self.safe_filename = safe_filename
+        self.measure_files = {}
+        self.measure_names = {}
+        self.location_counts = None
+        self.states = set()
+        self.rows_read = 0
+        self.rows_kept = 0
+
+    def add(self, chunk):
+        """Fold one raw chunk into the outputs"""
+        self.rows_read += len(chunk)
+        chunk = clean_place_chunk(chunk, self.short_name)
+        self.rows_kept += len(chunk)
+        self.states.update(chunk['StateDesc'].dropna().astype(str).unique())
+
+        pairs = chunk[['Measure_Clean', 'Measure_Short']].drop_duplicates()
+        for pair in zip(pairs['Measure_Clean'], pairs['Measure_Short']):
+            self.measure_names.setdefault(pair, None)
+
+        # Plain strings, so partial counts from different chunks align
+        keys = chunk[LOCATION_KEYS].dropna().astype({'StateDesc': str})
+        counts = keys.groupby(LOCATION_KEYS).size()
+        if self.location_counts is None:
+            self.location_counts = counts
+        else:
+            self.location_counts = self.location_counts.add(counts, fill_value=0).astype(np.int64)
+
+        if self.measures_dir is not None:
+            for measure, rows in chunk.groupby('Measure_Clean', sort=False):
+                self.append_measure(measure, rows[PLACE_MEASURE_COLUMNS])
+
+    def append_measure(self, measure, rows):
+        # A measure's file is truncated the first time this run sees it, then appended to
+        path = self.measure_files.get(measure)
+        if path is None:
+            path = os.path.join(self.measures_dir, self.safe_filename(measure))
+            self.measure_files[measure] = path
+            rows.to_csv(path, index=False)
+        else:
+            rows.to_csv(path, index=False, header=False, mode='a')
+
+    def locations(self):
+        """One row per place with its measure count, as data/locations_summary.csv"""
+        if self.location_counts is None:
+            return pd.DataFrame(columns=LOCATION_KEYS + ['measure_count'])
+        return self.location_counts.sort_index().reset_index(name='measure_count')
+
+    def measures(self):
+        """Distinct (Measure_Clean, Measure_Short) pairs in order of first appearance"""
+        return pd.DataFrame(list(self.measure_names), columns=['Measure_Clean', 'Measure_Short'])
+
+
+def ingest_place_data(short_name, measures_dir=None, safe_filename=None, path=PLACE_DATA_FILE,
+                      chunksize=CHUNK_ROWS):
+    """Stream the place file once; per-measure files are written when ``measures_dir`` is given"""
+    if measures_dir is not None:
+        os.makedirs(measures_dir, exist_ok=True)
+    ingest = PlaceIngest(short_name, measures_dir, safe_filename)
+    for chunk in read_place_chunks(path, chunksize):
+        ingest.add(chunk)
+    return ingest
@@ -9,77 +9,124 @@ import pandas as pd
 import numpy as np
 import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-def preprocess_places_data():
-    """Preprocess PLACES data into smaller, cleaned files"""
-    print("Loading PLACES data...")
-    print("This may take a few minutes for the full dataset...")
-    
-    # Load the full dataset
-    df = pd.read_csv('data/PLACES__Local_Data_for_Better_Health,_Place_Data_2020_release_20250913.csv')
-    
-    print(f"Original data shape: {df.shape}")
-    print(f"Total states in dataset: {len(df['StateDesc'].unique())}")
-    print(f"States: {sorted(df['StateDesc'].unique())}")
-    
-    # Clean the data - be more lenient with filtering
-    print("\nCleaning data...")
-    initial_count = len(df)
-    
-    # Only drop rows where both Data_Value and Geolocation are missing
-    df = df.dropna(subset=['Data_Value', 'Geolocation'], how='all')
-    print(f"After dropping rows with both Data_Value and Geolocation missing: {len(df)} (removed {initial_count - len(df)})")
-    
-    # Convert Data_Value to numeric, but keep rows that can't be converted
-    df['Data_Value'] = pd.to_numeric(df['Data_Value'], errors='coerce')
-    df = df.dropna(subset=['Data_Value'])
-    print(f"After numeric conversion of Data_Value: {len(df)} (removed {initial_count - len(df) - (initial_count - len(df))})")
-    
-    # Extract coordinates with better error handling
-    print("\nExtracting coordinates...")
-    coord_pattern = r'POINT \(([^ ]+) ([^)]+)\)'
-    
-    # Extract coordinates
-    coord_matches = df['Geolocation'].str.extract(coord_pattern)
-    df['lat'] = coord_matches[1]
-    df['lng'] = coord_matches[0]
-    
-    # Convert to numeric
-    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
-    df['lng'] = pd.to_numeric(df['lng'], errors='coerce')
-    
-    # Only drop rows where coordinates are invalid
-    valid_coords = df.dropna(subset=['lat', 'lng'])
-    print(f"After coordinate extraction: {len(valid_coords)} (removed {len(df) - len(valid_coords)})")
-    
-    # Check coordinate validity (should be within US bounds roughly)
-    valid_coords = valid_coords[
-        (valid_coords['lat'] >= 24) & (valid_coords['lat'] <= 72) &  # Latitude bounds for US
-        (valid_coords['lng'] >= -180) & (valid_coords['lng'] <= -65)  # Longitude bounds for US
-    ]
-    print(f"After coordinate validation: {len(valid_coords)} (removed {len(df) - len(valid_coords)})")
-    
-    df = valid_coords
+from measure_store import build_measure_store
+from rollup import aggregate_data_by_state, build_rollup_cube_from_stores, save_rollup_cube
+from sdoh_store import open_sdoh_store, write_sdoh_columns
+from correlation import load_or_build_correlations
+from hotspots import load_or_build_weights
+from clusters import CLUSTER_ZOOMS, build_cluster_pyramid_from_stores, save_cluster_pyramid
+from manifest import Manifest, code_hash
+from place_ingest import CHUNK_ROWS, ingest_place_data
+
+COUNTY_DATA_FILE = 'data/PLACES__County_Data_(GIS_Friendly_Format),_2020_release_20250914.csv'
+SDOH_DATA_FILE = 'data/SDOH_2020_COUNTY_1_0_data.csv'
+SDOH_CODING_FILE = 'data/SDOH_2020_COUNTY_1_0_coding.csv'
+
+# Inputs, outputs and source files of each incremental stage (see manifest.py).
+# Each stage reads only what its outputs are built from, so touching one input
+# (or deleting one output) rebuilds just the stages downstream of it.
+STAGES = {
+    'county_summary': {
+        'inputs': [COUNTY_DATA_FILE],
+        'outputs': ['data/county_locations_summary.csv'],
+        'code': ['preprocess_data.py'],
+    },
+    'county_measures': {
+        'inputs': [COUNTY_DATA_FILE],
+        'outputs': ['data/county_measures'],
+        'code': ['preprocess_data.py'],
+    },
+    'county_state_measures': {
+        'inputs': ['data/county_measures'],
+        'outputs': ['data/county_state_measures'],
+        'code': ['preprocess_data.py', 'rollup.py'],
+    },
+    'sdoh_cleaned': {
+        'inputs': [SDOH_DATA_FILE],
+        'outputs': ['data/sdoh_county_cleaned.csv'],
+        'code': ['preprocess_data.py'],
+    },
+    'sdoh_columns': {
+        'inputs': ['data/sdoh_county_cleaned.csv', 'data/county_locations_summary.csv'],
+        'outputs': ['data/sdoh_columns.npy', 'data/sdoh_columns.json'],
+        'code': ['preprocess_data.py', 'sdoh_store.py'],
+    },
+    'sdoh_measures': {
+        'inputs': [SDOH_DATA_FILE, SDOH_CODING_FILE],
+        'outputs': ['data/sdoh_measures.csv'],
+        'code': ['preprocess_data.py'],
+    },
+    'rollups': {
+        'inputs': ['data/available_measures.csv', 'data/county_locations_summary.csv', 'data/county_measures',
+                   'data/sdoh_columns.npy', 'data/sdoh_columns.json'],
+        'outputs': ['data/rollups.npz'],
+        'code': ['preprocess_data.py', 'rollup.py', 'measure_store.py', 'sdoh_store.py'],
+    },
+    'clusters': {
+        'inputs': ['data/available_measures.csv', 'data/county_locations_summary.csv', 'data/county_measures',
+                   'data/sdoh_columns.npy', 'data/sdoh_columns.json'],
+        'outputs': ['data/clusters.npz'],
+        'code': ['preprocess_data.py', 'clusters.py', 'rollup.py', 'measure_store.py', 'sdoh_store.py'],
+    },
+}
+
+# PLACES county GIS columns and the measure each one holds
+COUNTY_MEASURE_COLUMNS = {
+    'ACCESS2_AdjPrev': 'Current lack of health insurance among adults aged 18-64 years',
+    'ARTHRITIS_AdjPrev': 'Arthritis among adults aged >=18 years',
+    'BINGE_AdjPrev': 'Binge drinking among adults aged >=18 years',
+    'BPHIGH_AdjPrev': 'High blood pressure among adults aged >=18 years',
+    'BPMED_AdjPrev': 'Taking medicine for high blood pressure control among adults aged >=18 years with high blood pressure',
+    'CANCER_AdjPrev': 'Cancer (excluding skin cancer) among adults aged >=18 years',
+    'CASTHMA_AdjPrev': 'Current asthma among adults aged >=18 years',
+    'CERVICAL_AdjPrev': 'Cervical cancer screening among adult women aged 21-65 years',
+    'CHD_AdjPrev': 'Coronary heart disease among adults aged >=18 years',
+    'CHECKUP_AdjPrev': 'Visits to doctor for routine checkup within the past year among adults aged >=18 years',
+    'CHOLSCREEN_AdjPrev': 'Cholesterol screening among adults aged >=18 years',
+    'COLON_SCREEN_AdjPrev': 'Fecal occult blood test, sigmoidoscopy, or colonoscopy among adults aged 50-75 years',
+    'COPD_AdjPrev': 'Chronic obstructive pulmonary disease among adults aged >=18 years',
+    'COREM_AdjPrev': 'Older adult men aged >=65 years who are up to date on a core set of clinical preventive services: Flu shot past year, PPV shot ever, Colorectal cancer screening',
+    'COREW_AdjPrev': 'Older adult women aged >=65 years who are up to date on a core set of clinical preventive services: Flu shot past year, PPV shot ever, Colorectal cancer screening, and Mammogram past 2 years',
+    'CSMOKING_AdjPrev': 'Current smoking among adults aged >=18 years',
+    'DENTAL_AdjPrev': 'Visits to dentist or dental clinic among adults aged >=18 years',
+    'DIABETES_AdjPrev': 'Diagnosed diabetes among adults aged >=18 years',
+    'HIGHCHOL_AdjPrev': 'High cholesterol among adults aged >=18 years who have been screened in the past 5 years',
+    'KIDNEY_AdjPrev': 'Chronic kidney disease among adults aged >=18 years',
+    'LPA_AdjPrev': 'No leisure-time physical activity among adults aged >=18 years',
+    'MAMMOUSE_AdjPrev': 'Mammography use among women aged 50-74 years',
+    'MHLTH_AdjPrev': 'Mental health not good for >=14 days among adults aged >=18 years',
+    'OBESITY_AdjPrev': 'Obesity among adults aged >=18 years',
+    'PHLTH_AdjPrev': 'Physical health not good for >=14 days among adults aged >=18 years',
+    'SLEEP_AdjPrev': 'Sleeping less than 7 hours among adults aged >=18 years',
+    'STROKE_AdjPrev': 'Stroke among adults aged >=18 years',
+    'TEETHLOST_AdjPrev': 'All teeth lost among adults aged >=65 years'
+}
+
+def preprocess_places_data(chunksize=CHUNK_ROWS):
+    """Preprocess PLACES data into smaller, cleaned files
     
-    print(f"Final cleaned data shape: {df.shape}")
-    print(f"States after cleaning: {len(df['StateDesc'].unique())}")
-    print(f"States: {sorted(df['StateDesc'].unique())}")
+    The place-level file is streamed in chunks (see place_ingest.py), so
+    memory stays bounded however large the file is.
+    """
+    print("Streaming PLACES data...")
+    started = time.perf_counter()
     
-    # Clean measure names
-    print("\nProcessing measure names...")
-    df['Measure_Clean'] = df['Measure'].str.strip()
+    ingest = ingest_place_data(create_short_measure_name, measures_dir='data/measures',
+                               safe_filename=create_safe_filename, chunksize=chunksize)
     
-    # Use Short_Question_Text if available, otherwise create short names
-    df['Measure_Short'] = df['Short_Question_Text'].fillna(df['Measure_Clean'].apply(create_short_measure_name))
+    print(f"Read {ingest.rows_read} rows, kept {ingest.rows_kept} with a value and valid coordinates")
+    print(f"States after cleaning: {len(ingest.states)}")
+    print(f"States: {sorted(ingest.states)}")
+    print(f"Created {len(ingest.measure_files)} individual measure files in {time.perf_counter() - started:.2f}s")
     
     # Create location summary - include ALL locations
     print("\nCreating location summary...")
-    
-    # Convert TotalPopulation to numeric, handling comma-separated values
-    print("Converting TotalPopulation to numeric...")
-    df['TotalPopulation'] = df['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
-    
-    locations = df.groupby(['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation']).size().reset_index(name='measure_count')
+    locations = ingest.locations()
     
     # Save locations summary
     locations.to_csv('data/locations_summary.csv', index=False)
@@ -95,7 +142,7 @@ def preprocess_places_data():
         print(f"  ... and {len(state_counts) - 20} more states")
     
     # Create measures list
-    measures_df = df[['Measure_Clean', 'Measure_Short']].drop_duplicates().reset_index(drop=True)
+    measures_df = ingest.measures()
     measures_df.to_csv('data/available_measures.csv', index=False)
     print(f"\nSaved {len(measures_df)} measures to available_measures.csv")
     
@@ -104,53 +151,19 @@ def preprocess_places_data():
     for i, row in measures_df.head(10).iterrows():
         print(f"  {row['Measure_Short']}")
     
-    # Create individual measure files for faster loading
-    print("\nCreating individual measure files...")
-    os.makedirs('data/measures', exist_ok=True)
-    
-    measure_count = 0
-    for measure in df['Measure_Clean'].unique():
-        measure_data = df[df['Measure_Clean'] == measure][
-            ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 
-             'Data_Value', 'Data_Value_Unit', 'Data_Value_Type',
-             'Low_Confidence_Limit', 'High_Confidence_Limit', 'Measure_Short']
-        ].copy()
-        
-        # Ensure TotalPopulation is numeric in measure files too
-        measure_data['TotalPopulation'] = measure_data['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
-        
-        # Create safe filename
-        safe_filename = create_safe_filename(measure)
-        measure_data.to_csv(f'data/measures/{safe_filename}', index=False)
-        measure_count += 1
-        
-        if measure_count % 10 == 0:
-            print(f"  Processed {measure_count} measures...")
-    
-    print(f"Created {measure_count} individual measure files")
-    
-    # Create state aggregate files
+    # Create state aggregate files, one measure file in memory at a time
     print("\nCreating state aggregate files...")
     os.makedirs('data/state_measures', exist_ok=True)
     
     state_measure_count = 0
-    for measure in df['Measure_Clean'].unique():
-        measure_data = df[df['Measure_Clean'] == measure][
-            ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 
-             'Data_Value', 'Data_Value_Unit', 'Data_Value_Type',
-             'Low_Confidence_Limit', 'High_Confidence_Limit', 'Measure_Short']
-        ].copy()
-        
-        # Ensure TotalPopulation is numeric
-        measure_data['TotalPopulation'] = measure_data['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
+    for measure, path in ingest.measure_files.items():
+        measure_data = pd.read_csv(path)
         
         # Aggregate by state
         state_aggregated = aggregate_data_by_state(measure_data)
         
         if len(state_aggregated) > 0:
-            # Create safe filename
-            safe_filename = create_safe_filename(measure)
-            state_aggregated.to_csv(f'data/state_measures/{safe_filename}', index=False)
+            state_aggregated.to_csv(f'data/state_measures/{os.path.basename(path)}', index=False)
             state_measure_count += 1
             
             if state_measure_count % 10 == 0:
@@ -193,54 +206,6 @@ def create_short_measure_name(measure):
     
     return ' - '.join(key_terms[:3]) if key_terms else measure[:50]
 
-def aggregate_data_by_state(measure_data):
-    """Aggregate data by state, calculating weighted averages"""
-    if len(measure_data) == 0:
-        return pd.DataFrame()
-    
-    # Group by state and calculate weighted averages manually
-    state_data = []
-    
-    for state_name, group in measure_data.groupby('StateDesc'):
-        # Calculate basic aggregations
-        avg_lat = group['lat'].mean()
-        avg_lng = group['lng'].mean()
-        total_pop = group['TotalPopulation'].sum()
-        location_count = len(group)
-        
-        # Calculate weighted average for Data_Value
-        valid_data = group.dropna(subset=['Data_Value', 'TotalPopulation'])
-        if len(valid_data) > 0:
-            weights = valid_data['TotalPopulation']
-            values = valid_data['Data_Value']
-            
-            if weights.sum() > 0:
-                weighted_avg = (values * weights).sum() / weights.sum()
-            else:
-                weighted_avg = values.mean()
-        else:
-            weighted_avg = np.nan
-        
-        # Get other fields from first row
-        first_row = group.iloc[0]
-        
-        state_data.append({
-            'StateDesc': state_name,
-            'lat': avg_lat,
-            'lng': avg_lng,
-            'TotalPopulation': total_pop,
-            'Data_Value': weighted_avg,
-            'Data_Value_Unit': first_row['Data_Value_Unit'],
-            'Data_Value_Type': first_row['Data_Value_Type'],
-            'Low_Confidence_Limit': group['Low_Confidence_Limit'].mean(),
-            'High_Confidence_Limit': group['High_Confidence_Limit'].mean(),
-            'Measure_Short': first_row['Measure_Short'],
-            'LocationCount': location_count,
-            'LocationName': state_name
-        })
-    
-    return pd.DataFrame(state_data)
-
 def calculate_weighted_average(data, value_col, weight_col):
     """Calculate weighted average of values"""
     if len(data) == 0:
@@ -276,18 +241,21 @@ def create_safe_filename(measure):
 def load_sdoh_column_descriptions():
     """Load SDOH column descriptions from the coding file"""
     try:
-        coding_df = pd.read_csv('data/SDOH_2020_COUNTY_1_0_coding.csv', encoding='latin-1')
+        coding_df = pd.read_csv(SDOH_CODING_FILE, encoding='latin-1')
         # Create a dictionary mapping column names to their labels
         return dict(zip(coding_df['name'], coding_df['label']))
     except Exception as e:
         print(f"Error loading SDOH coding file: {e}")
         return {}
 
-def preprocess_sdoh_data():
-    """Preprocess SDOH county data - include ALL columns from the original dataset"""
+# Identifier columns of the SDOH data file; every other column is an SDOH variable
+SDOH_ID_COLUMNS = ['YEAR', 'COUNTYFIPS', 'STATEFIPS', 'STATE', 'COUNTY', 'REGION', 'TERRITORY']
+
+def preprocess_sdoh_cleaned():
+    """Clean the SDOH county data - keep ALL columns from the original dataset"""
     print("\nLoading SDOH county data...")
     try:
-        df = pd.read_csv('data/SDOH_2020_COUNTY_1_0_data.csv', encoding='latin-1')
+        df = pd.read_csv(SDOH_DATA_FILE, encoding='latin-1')
         print(f"SDOH data shape: {df.shape}")
         
         # Clean the data - remove rows with missing COUNTYFIPS
@@ -296,13 +264,8 @@ def preprocess_sdoh_data():
         # Ensure COUNTYFIPS is 5 digits with leading zeros
         df['COUNTYFIPS'] = df['COUNTYFIPS'].astype(str).str.zfill(5)
         
-        # Define columns to exclude (non-SDOH data)
-        exclude_cols = [
-            'YEAR', 'COUNTYFIPS', 'STATEFIPS', 'STATE', 'COUNTY', 'REGION', 'TERRITORY'
-        ]
-        
-        # Get all columns except the excluded ones
-        data_cols = [col for col in df.columns if col not in exclude_cols]
+        # Get all columns except the identifiers
+        data_cols = [col for col in df.columns if col not in SDOH_ID_COLUMNS]
         
         print(f"Found {len(data_cols)} data columns in SDOH dataset")
         
@@ -317,6 +280,36 @@ def preprocess_sdoh_data():
         # Save cleaned SDOH data
         sdoh_subset.to_csv('data/sdoh_county_cleaned.csv', index=False)
         print(f"Saved {len(sdoh_subset)} SDOH county records")
+        return len(sdoh_subset)
+    except Exception as e:
+        print(f"Error processing SDOH data: {e}")
+        import traceback
+        traceback.print_exc()
+        return 0
+
+def preprocess_sdoh_columns():
+    """Save a columnar copy of the cleaned SDOH data aligned to the county locations for memory-mapped access"""
+    try:
+        sdoh_subset = pd.read_csv('data/sdoh_county_cleaned.csv', dtype={'CountyFIPS': str}, low_memory=False)
+        if os.path.exists('data/county_locations_summary.csv'):
+            fips_order = pd.read_csv('data/county_locations_summary.csv', dtype={'CountyFIPS': str})['CountyFIPS']
+        else:
+            fips_order = []
+        column_count, row_count = write_sdoh_columns(sdoh_subset, fips_order)
+        print(f"Saved {column_count} SDOH columns x {row_count} counties to sdoh_columns.npy")
+        return column_count
+    except Exception as e:
+        print(f"Error writing SDOH columns: {e}")
+        import traceback
+        traceback.print_exc()
+        return 0
+
+def preprocess_sdoh_measures():
+    """List ALL SDOH data columns as measures, named from the coding file"""
+    try:
+        # Only the header is needed
+        columns = pd.read_csv(SDOH_DATA_FILE, encoding='latin-1', nrows=0).columns
+        data_cols = [col for col in columns if col not in SDOH_ID_COLUMNS]
         
         # Get column descriptions from coding file
         column_descriptions = load_sdoh_column_descriptions()
@@ -340,20 +333,52 @@ def preprocess_sdoh_data():
         sdoh_measures_df = pd.DataFrame(sdoh_measures)
         sdoh_measures_df.to_csv('data/sdoh_measures.csv', index=False)
         print(f"Saved {len(sdoh_measures)} SDOH measures")
-        
-        return len(sdoh_subset)
+        return len(sdoh_measures)
     except Exception as e:
-        print(f"Error processing SDOH data: {e}")
+        print(f"Error listing SDOH measures: {e}")
         import traceback
         traceback.print_exc()
         return 0
 
-def preprocess_county_data():
-    """Preprocess county data into smaller, cleaned files"""
+def preprocess_sdoh_data():
+    """Preprocess SDOH county data: cleaned rows, memory-mapped columns and the measure list"""
+    record_count = preprocess_sdoh_cleaned()
+    preprocess_sdoh_columns()
+    preprocess_sdoh_measures()
+    return record_count
+
+def write_county_measure_file(measure_data, safe_filename):
+    """Write one measure's county file (process pool worker)"""
+    measure_data.to_csv(f'data/county_measures/{safe_filename}', index=False)
+    return safe_filename
+
+def write_county_state_measure_file(safe_filename):
+    """Aggregate one county measure file to states (process pool worker)"""
+    measure_data = pd.read_csv(f'data/county_measures/{safe_filename}', dtype={'CountyFIPS': str})
+    aggregate_data_by_state(measure_data).to_csv(f'data/county_state_measures/{safe_filename}', index=False)
+    return safe_filename
+
+def parse_confidence_intervals(intervals):
+    """Low and high limits of every "(low, high)" cell of a frame, in one vectorized pass"""
+    # Stack every column into one series so a single str.extract parses them all
+    stacked = pd.Series(intervals.astype(str).to_numpy().ravel(order='F'))
+    limits = stacked.str.extract(r'([\d.]+)[^\d.]+([\d.]+)')
+    shape = intervals.shape
+    low = pd.to_numeric(limits[0], errors='coerce').to_numpy().reshape(shape, order='F')
+    high = pd.to_numeric(limits[1], errors='coerce').to_numpy().reshape(shape, order='F')
+    return low, high
+
+@lru_cache(maxsize=1)
+def clean_county_data(path, modified, size):
+    """Cleaned county rows, their location columns and parsed confidence limits
+
+    Keyed by the file's modification time and size, so stages run in one
+    process parse the county file once.
+    """
     print("Loading county data...")
     
     # Load the county dataset
-    df = pd.read_csv('data/PLACES__County_Data_(GIS_Friendly_Format),_2020_release_20250914.csv')
+    df = pd.read_csv(path)
     
     print(f"Original county data shape: {df.shape}")
     print(f"Total counties: {len(df)}")
@@ -361,7 +386,6 @@ def preprocess_county_data():
     
     # Clean the data
     print("\nCleaning county data...")
-    initial_count = len(df)
     
     # Convert TotalPopulation to numeric, handling comma-separated values
     df['TotalPopulation'] = df['TotalPopulation'].astype(str).str.replace(',', '').astype(float)
@@ -370,12 +394,8 @@ def preprocess_county_data():
     print("Extracting coordinates...")
     coord_pattern = r'POINT \(([^ ]+) ([^)]+)\)'
     coord_matches = df['Geolocation'].str.extract(coord_pattern)
-    df['lat'] = coord_matches[1]
-    df['lng'] = coord_matches[0]
-    
-    # Convert to numeric
-    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
-    df['lng'] = pd.to_numeric(df['lng'], errors='coerce')
+    df['lat'] = pd.to_numeric(coord_matches[1], errors='coerce')
+    df['lng'] = pd.to_numeric(coord_matches[0], errors='coerce')
     
     # Only keep rows with valid coordinates
     valid_coords = df.dropna(subset=['lat', 'lng'])
@@ -392,197 +412,243 @@ def preprocess_county_data():
     
     print(f"Final cleaned county data shape: {df.shape}")
     
-    # Create county summary
-    print("\nCreating county summary...")
+    # Columns shared by the county summary and every measure file
     counties = df[['CountyName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'CountyFIPS']].copy()
     
     # Ensure CountyFIPS is treated as string to preserve leading zeros
     counties['CountyFIPS'] = counties['CountyFIPS'].astype(str).str.zfill(5)
     
-    counties['measure_count'] = 28  # All counties have all 28 measures
-    counties['location_type'] = 'County'
+    # Parse every confidence interval column at once
+    ci_columns = [column.replace('_AdjPrev', '_Adj95CI') for column in COUNTY_MEASURE_COLUMNS]
+    low_limits, high_limits = parse_confidence_intervals(df[ci_columns])
+    
+    return df, counties, low_limits, high_limits
+
+def load_county_data():
+    stat = os.stat(COUNTY_DATA_FILE)
+    return clean_county_data(COUNTY_DATA_FILE, stat.st_mtime_ns, stat.st_size)
+
+def preprocess_county_summary():
+    """Write the county locations summary"""
+    _, counties, _, _ = load_county_data()
+    
+    print("\nCreating county summary...")
+    summary = counties.copy()
+    summary['measure_count'] = 28  # All counties have all 28 measures
+    summary['location_type'] = 'County'
     
     # Save county summary
-    counties.to_csv('data/county_locations_summary.csv', index=False)
-    print(f"Saved {len(counties)} counties to county_locations_summary.csv")
+    summary.to_csv('data/county_locations_summary.csv', index=False)
+    print(f"Saved {len(summary)} counties to county_locations_summary.csv")
     
     # Show county counts by state
     print("\nCounty counts by state:")
-    state_counts = counties['StateDesc'].value_counts()
+    state_counts = summary['StateDesc'].value_counts()
     for state, count in state_counts.head(10).items():
         print(f"  {state}: {count} counties")
     
-    # Create measure mapping from county columns to measure names
-    measure_mapping = {
-        'ACCESS2_AdjPrev': 'Current lack of health insurance among adults aged 18-64 years',
-        'ARTHRITIS_AdjPrev': 'Arthritis among adults aged >=18 years',
-        'BINGE_AdjPrev': 'Binge drinking among adults aged >=18 years',
-        'BPHIGH_AdjPrev': 'High blood pressure among adults aged >=18 years',
-        'BPMED_AdjPrev': 'Taking medicine for high blood pressure control among adults aged >=18 years with high blood pressure',
-        'CANCER_AdjPrev': 'Cancer (excluding skin cancer) among adults aged >=18 years',
-        'CASTHMA_AdjPrev': 'Current asthma among adults aged >=18 years',
-        'CERVICAL_AdjPrev': 'Cervical cancer screening among adult women aged 21-65 years',
-        'CHD_AdjPrev': 'Coronary heart disease among adults aged >=18 years',
-        'CHECKUP_AdjPrev': 'Visits to doctor for routine checkup within the past year among adults aged >=18 years',
-        'CHOLSCREEN_AdjPrev': 'Cholesterol screening among adults aged >=18 years',
-        'COLON_SCREEN_AdjPrev': 'Fecal occult blood test, sigmoidoscopy, or colonoscopy among adults aged 50-75 years',
-        'COPD_AdjPrev': 'Chronic obstructive pulmonary disease among adults aged >=18 years',
-        'COREM_AdjPrev': 'Older adult men aged >=65 years who are up to date on a core set of clinical preventive services: Flu shot past year, PPV shot ever, Colorectal cancer screening',
-        'COREW_AdjPrev': 'Older adult women aged >=65 years who are up to date on a core set of clinical preventive services: Flu shot past year, PPV shot ever, Colorectal cancer screening, and Mammogram past 2 years',
-        'CSMOKING_AdjPrev': 'Current smoking among adults aged >=18 years',
-        'DENTAL_AdjPrev': 'Visits to dentist or dental clinic among adults aged >=18 years',
-        'DIABETES_AdjPrev': 'Diagnosed diabetes among adults aged >=18 years',
-        'HIGHCHOL_AdjPrev': 'High cholesterol among adults aged >=18 years who have been screened in the past 5 years',
-        'KIDNEY_AdjPrev': 'Chronic kidney disease among adults aged >=18 years',
-        'LPA_AdjPrev': 'No leisure-time physical activity among adults aged >=18 years',
-        'MAMMOUSE_AdjPrev': 'Mammography use among women aged 50-74 years',
-        'MHLTH_AdjPrev': 'Mental health not good for >=14 days among adults aged >=18 years',
-        'OBESITY_AdjPrev': 'Obesity among adults aged >=18 years',
-        'PHLTH_AdjPrev': 'Physical health not good for >=14 days among adults aged >=18 years',
-        'SLEEP_AdjPrev': 'Sleeping less than 7 hours among adults aged >=18 years',
-        'STROKE_AdjPrev': 'Stroke among adults aged >=18 years',
-        'TEETHLOST_AdjPrev': 'All teeth lost among adults aged >=65 years'
-    }
-    
-    # Create individual county measure files
-    print("\nCreating individual county measure files...")
+    return len(summary)
+
+def preprocess_county_measures(workers=None):
+    """Write one county file per measure"""
+    df, counties, low_limits, high_limits = load_county_data()
+    
+    print("\nCreating county measure files...")
     os.makedirs('data/county_measures', exist_ok=True)
     
-    measure_count = 0
-    for county_col, measure_name in measure_mapping.items():
-        # Get the confidence interval column
-        ci_col = county_col.replace('_AdjPrev', '_Adj95CI')
-        
-        # Create measure data
-        measure_data = df[['CountyName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'CountyFIPS', county_col, ci_col]].copy()
-        measure_data.columns = ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'CountyFIPS', 'Data_Value', 'Confidence_Interval']
-        
-        # Ensure CountyFIPS is treated as string to preserve leading zeros
-        measure_data['CountyFIPS'] = measure_data['CountyFIPS'].astype(str).str.zfill(5)
-        
-        # Parse confidence intervals to get low and high limits
-        def parse_confidence_interval(ci_str):
-            if pd.isna(ci_str) or ci_str == '':
-                return np.nan, np.nan
-            try:
-                # Extract numbers from format like "(11.6, 16.3)"
-                numbers = re.findall(r'[\d.]+', str(ci_str))
-                if len(numbers) >= 2:
-                    return float(numbers[0]), float(numbers[1])
-                return np.nan, np.nan
-            except:
-                return np.nan, np.nan
-        
-        ci_parsed = measure_data['Confidence_Interval'].apply(parse_confidence_interval)
-        measure_data['Low_Confidence_Limit'] = [x[0] for x in ci_parsed]
-        measure_data['High_Confidence_Limit'] = [x[1] for x in ci_parsed]
-        
-        # Add other required columns
-        measure_data['Data_Value_Unit'] = '%'
-        measure_data['Data_Value_Type'] = 'Crude Prevalence'
-        measure_data['Measure_Short'] = create_short_measure_name(measure_name)
-        
-        # Drop the raw confidence interval column
-        measure_data = measure_data.drop('Confidence_Interval', axis=1)
+    base = counties.rename(columns={'CountyName': 'LocationName'})
+    jobs = []
+    for i, (county_col, measure_name) in enumerate(COUNTY_MEASURE_COLUMNS.items()):
+        measure_data = base.assign(
+            Data_Value=df[county_col].values,
+            Low_Confidence_Limit=low_limits[:, i],
+            High_Confidence_Limit=high_limits[:, i],
+            Data_Value_Unit='%',
+            Data_Value_Type='Crude Prevalence',
+            Measure_Short=create_short_measure_name(measure_name),
+        )
         
         # Only keep rows with valid data values
         measure_data = measure_data.dropna(subset=['Data_Value'])
-        
-        # Create safe filename
-        safe_filename = create_safe_filename(measure_name)
-        measure_data.to_csv(f'data/county_measures/{safe_filename}', index=False)
-        measure_count += 1
-        
-        if measure_count % 10 == 0:
-            print(f"  Processed {measure_count} county measures...")
+        jobs.append((measure_data, create_safe_filename(measure_name)))
     
-    print(f"Created {measure_count} individual county measure files")
+    measure_count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(write_county_measure_file, *zip(*jobs)):
+            measure_count += 1
+            
+            if measure_count % 10 == 0:
+                print(f"  Processed {measure_count} county measures...")
     
-    # Create state aggregate files for counties
-    print("\nCreating state aggregate files for counties...")
+    print(f"Created {measure_count} county measure files")
+    return measure_count
+
+def preprocess_county_state_measures(workers=None):
+    """Write the state aggregate file of every county measure file"""
+    print("\nCreating county state aggregate files...")
     os.makedirs('data/county_state_measures', exist_ok=True)
     
-    state_measure_count = 0
-    for county_col, measure_name in measure_mapping.items():
-        # Get the confidence interval column
-        ci_col = county_col.replace('_AdjPrev', '_Adj95CI')
-        
-        # Create measure data
-        measure_data = df[['CountyName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'CountyFIPS', county_col, ci_col]].copy()
-        measure_data.columns = ['LocationName', 'lat', 'lng', 'StateDesc', 'TotalPopulation', 'CountyFIPS', 'Data_Value', 'Confidence_Interval']
-        
-        # Ensure CountyFIPS is treated as string to preserve leading zeros
-        measure_data['CountyFIPS'] = measure_data['CountyFIPS'].astype(str).str.zfill(5)
-        
-        # Parse confidence intervals
-        def parse_confidence_interval(ci_str):
-            if pd.isna(ci_str) or ci_str == '':
-                return np.nan, np.nan
-            try:
-                numbers = re.findall(r'[\d.]+', str(ci_str))
-                if len(numbers) >= 2:
-                    return float(numbers[0]), float(numbers[1])
-                return np.nan, np.nan
-            except:
-                return np.nan, np.nan
-        
-        ci_parsed = measure_data['Confidence_Interval'].apply(parse_confidence_interval)
-        measure_data['Low_Confidence_Limit'] = [x[0] for x in ci_parsed]
-        measure_data['High_Confidence_Limit'] = [x[1] for x in ci_parsed]
-        
-        # Add other required columns
-        measure_data['Data_Value_Unit'] = '%'
-        measure_data['Data_Value_Type'] = 'Crude Prevalence'
-        measure_data['Measure_Short'] = create_short_measure_name(measure_name)
-        
-        # Drop the raw confidence interval column
-        measure_data = measure_data.drop('Confidence_Interval', axis=1)
-        
-        # Only keep rows with valid data values
-        measure_data = measure_data.dropna(subset=['Data_Value'])
-        
-        # Aggregate by state
-        state_aggregated = aggregate_data_by_state(measure_data)
-        
-        # Create safe filename
-        safe_filename = create_safe_filename(measure_name)
-        state_aggregated.to_csv(f'data/county_state_measures/{safe_filename}', index=False)
-        state_measure_count += 1
-        
-        if state_measure_count % 10 == 0:
-            print(f"  Processed {state_measure_count} county state measures...")
+    filenames = sorted(name for name in os.listdir('data/county_measures') if name.endswith('.csv'))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        aggregate_count = sum(1 for _ in pool.map(write_county_state_measure_file, filenames))
+    
+    print(f"Created {aggregate_count} county state aggregate files")
+    return aggregate_count
+
+def preprocess_county_data(workers=None):
+    """Preprocess county data into smaller, cleaned files: summary, measure files and state aggregates"""
+    timings = {}
+    started = time.perf_counter()
+    county_count = preprocess_county_summary()
+    timings['summary'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    measure_count = preprocess_county_measures(workers)
+    timings['measures'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    preprocess_county_state_measures(workers)
+    timings['state aggregates'] = time.perf_counter() - started
+    
+    print("\nCounty preprocessing timings:")
+    for stage, seconds in timings.items():
+        print(f"  {stage}: {seconds:.2f}s")
+    
+    return measure_count, county_count
+
+def preprocess_rollups():
+    """Roll every county health and SDOH measure up to state, division and nation"""
+    print("\nBuilding state/division/nation rollups...")
     
-    print(f"Created {state_measure_count} county state aggregate files")
+    # Full precision here; the app serves these values directly
+    measure_store = build_measure_store(dtype=np.float64)
+    sdoh_store = open_sdoh_store()
     
-    return measure_count, len(counties)
+    cube = build_rollup_cube_from_stores(measure_store, sdoh_store)
+    save_rollup_cube(cube)
+    print(f"Saved rollups for {len(cube.measures)} measures to rollups.npz")
+    
+    return len(cube.measures)
 
-def main():
-    """Main preprocessing function"""
+def preprocess_clusters():
+    """Build the zoom-level grid cluster pyramid for every health and SDOH measure"""
+    print("\nBuilding zoom-level cluster pyramid...")
+    
+    measure_store = build_measure_store(dtype=np.float64)
+    sdoh_store = open_sdoh_store()
+    
+    pyramid = build_cluster_pyramid_from_stores(measure_store, sdoh_store)
+    save_cluster_pyramid(pyramid)
+    print(f"Saved clusters for {len(pyramid.measures)} measures at zooms {CLUSTER_ZOOMS} to clusters.npz")
+    
+    return len(pyramid.measures)
+
+def preprocess_correlations():
+    """Compute the health x SDOH correlation matrix ahead of the first request"""
+    print("\nComputing health x SDOH correlations...")
+    
+    sdoh_store = open_sdoh_store()
+    if sdoh_store is None:
+        print("SDOH columns not found, skipping correlations")
+        return 0
+    
+    # Same resident store the app uses, so the data version matches
+    matrix, version = load_or_build_correlations(build_measure_store(), sdoh_store)
+    print(f"Saved correlations for {len(matrix.health_measures)} x {len(matrix.sdoh_columns)} measures (version {version})")
+    
+    return len(matrix.health_measures) * len(matrix.sdoh_columns)
+
+def preprocess_spatial_weights():
+    """Build the county spatial weights used by the hotspot statistics ahead of the first request"""
+    print("\nBuilding county spatial weights...")
+    
+    weights, version = load_or_build_weights(build_measure_store())
+    for kind, matrix in weights.items():
+        print(f"Saved {kind} weights with {matrix.indices.size} links (version {version})")
+    
+    return sum(matrix.indices.size for matrix in weights.values())
+
+def run_stage(manifest, stage, build):
+    """Run one preprocessing stage unless the manifest shows it is up to date
+    
+    The stage is only recorded in memory; main() saves the manifest once every
+    stage has succeeded, so the app never picks up the version of a partial run.
+    Returns the stage's result, or None when it was skipped.
+    """
+    spec = STAGES[stage]
+    code = code_hash(*spec['code'])
+    if manifest.is_current(stage, spec['inputs'], spec['outputs'], code):
+        print(f"\nSkipping {stage}: inputs, code and outputs unchanged")
+        return None
+    
+    started = time.perf_counter()
+    result = build()
+    manifest.record(stage, spec['inputs'], spec['outputs'], code)
+    print(f"Stage {stage} took {time.perf_counter() - started:.2f}s")
+    return result
+
+def main(force=False):
+    """Main preprocessing function; unchanged stages are skipped unless ``force``"""
     print("Starting data preprocessing...")
     print("=" * 60)
     
     # Create data directory
     os.makedirs('data', exist_ok=True)
+    manifest = Manifest('data', force=force)
+    manifest.retain(STAGES)
+    
+    # Process county data: locations summary, per-measure files, then their state aggregates
+    county_count = run_stage(manifest, 'county_summary', preprocess_county_summary)
+    county_measure_count = run_stage(manifest, 'county_measures', preprocess_county_measures)
+    run_stage(manifest, 'county_state_measures', preprocess_county_state_measures)
+    
+    # Process SDOH data: cleaned rows, their memory-mapped columns and the measure list
+    sdoh_count = run_stage(manifest, 'sdoh_cleaned', preprocess_sdoh_cleaned)
+    run_stage(manifest, 'sdoh_columns', preprocess_sdoh_columns)
+    run_stage(manifest, 'sdoh_measures', preprocess_sdoh_measures)
+    
+    # Roll up every measure to state, division and nation
+    rollup_count = run_stage(manifest, 'rollups', preprocess_rollups)
+    
+    # Grid clusters for the low zoom county views
+    cluster_count = run_stage(manifest, 'clusters', preprocess_clusters)
+    
+    # Correlate every health measure with every SDOH variable (already cached by data version)
+    correlation_count = preprocess_correlations()
+    
+    # Neighbour links between county centroids (also cached by data version)
+    weight_links = preprocess_spatial_weights()
     
-    # Process county data
-    county_measure_count, county_count = preprocess_county_data()
+    # Publish the new data version only now that every stage has finished
+    manifest.save()
     
-    # Process SDOH data
-    sdoh_count = preprocess_sdoh_data()
+    def summary(count):
+        return 'unchanged' if count is None else count
     
     print("\n" + "=" * 60)
     print("PREPROCESSING COMPLETE!")
     print("=" * 60)
-    print(f"County locations processed: {county_count}")
-    print(f"County measures processed: {county_measure_count}")
-    print(f"SDOH records: {sdoh_count}")
+    print(f"County locations processed: {summary(county_count)}")
+    print(f"County measures processed: {summary(county_measure_count)}")
+    print(f"SDOH records: {summary(sdoh_count)}")
+    print(f"Measures rolled up: {summary(rollup_count)}")
+    print(f"Measures clustered: {summary(cluster_count)}")
+    print(f"Correlation pairs computed: {correlation_count}")
+    print(f"Spatial weight links: {weight_links}")
+    print(f"Data version: {manifest.version}")
     print("\nFiles created:")
     print("- data/county_locations_summary.csv (county data)")
     print("- data/available_measures.csv")
     print("- data/county_measures/*.csv (individual county measure files)")
     print("- data/county_state_measures/*.csv (county state aggregate files)")
     print("- data/sdoh_cleaned.csv")
+    print("- data/sdoh_columns.npy + data/sdoh_columns.json (memory-mapped SDOH columns)")
+    print("- data/rollups.npz (state, census division and national rollups)")
+    print("- data/clusters.npz (zoom-level county clusters)")
+    print("- data/correlations_<version>.npz (health x SDOH correlation matrix)")
+    print("- data/spatial_weights_<kind>_<version>.npz (county neighbour links for hotspot statistics)")
+    print("- data/manifest.json (input/output hashes for incremental runs)")
     print("\nYou can now use these smaller files for faster loading!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(force='--force' in sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Opt-in sampling profiles of individual requests
+A profiled request's thread is sampled by a helper thread every few
+milliseconds; each sample is the request's Python stack, and the samples
+are stored in the collapsed-stack format flame graph tools read
+(``frame;frame;frame count`` per line) with a small JSON summary alongside.
+The directory keeps the newest PROFILE_KEEP profiles.
+
+Profiling is off unless enabled by the environment:
+    HEALTH_EQUITY_PROFILE_RATE   fraction of requests to profile (e.g. 0.01)
+    HEALTH_EQUITY_PROFILE_TOKEN  profile any request sent with ``X-Profile: <token>``;
+                                 also required to read profiles from /admin/profiles
+    HEALTH_EQUITY_PROFILE_DIR    where profiles are written (default profiles/)
+"""
+
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_DIR = 'profiles'
+
+# Profiles kept before the oldest are deleted
+PROFILE_KEEP = 200
+
+# Seconds between stack samples of a profiled request
+SAMPLE_INTERVAL = 0.002
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class StackSampler:
+    """Counts the collapsed Python stacks of one thread, sampled from a helper thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='request-profiler', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        """Stop sampling; returns the elapsed seconds"""
+        self.stopped.set()
+        self.thread.join()
+        return time.perf_counter() - self.started
+
+
+class ProfileStore:
+    """Rotating directory of collapsed-stack profiles and their summaries"""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.sequence = 0
+
+    def save(self, stacks, summary):
+        """Write one profile; returns its name"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self.sequence += 1
+            # Names sort by time, so rotation drops the oldest
+            name = f"{time.time_ns() // 1_000_000:015d}-{os.getpid()}-{self.sequence}"
+        with open(os.path.join(self.directory, name + '.collapsed'), 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump(dict(summary, name=name), f)
+        self.rotate()
+        return name
+
+    def names(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(entry[:-len('.json')] for entry in os.listdir(self.directory) if entry.endswith('.json'))
+
+    def rotate(self):
+        for name in self.names()[:-self.keep]:
+            for suffix in ('.json', '.collapsed'):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass  # Another worker rotated it first
+
+    def slowest(self, limit=20):
+        """Summaries of the kept profiles, slowest first"""
+        summaries = []
+        for name in self.names():
+            try:
+                with open(os.path.join(self.directory, name + '.json')) as f:
+                    summaries.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        summaries.sort(key=lambda summary: summary['seconds'], reverse=True)
+        return summaries[:limit]
+
+    def collapsed(self, name):
+        """Collapsed stacks of a profile, or None if it is not kept (or the name is not one of ours)"""
+        if name not in self.names():
+            return None
+        with open(os.path.join(self.directory, name + '.collapsed')) as f:
+            return f.read()
+
+
+class RequestProfiler:
+    """Decides which requests are profiled and stores their profiles"""
+
+    def __init__(self, rate=0.0, token=None, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.rate = rate
+        self.token = token
+        self.store = ProfileStore(directory, keep)
+
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        return cls(rate=float(environ.get('HEALTH_EQUITY_PROFILE_RATE', 0) or 0),
+                   token=environ.get('HEALTH_EQUITY_PROFILE_TOKEN') or None,
+                   directory=environ.get('HEALTH_EQUITY_PROFILE_DIR') or PROFILE_DIR)
+
+    @property
+    def enabled(self):
+        return self.rate > 0 or self.token is not None
+
+    def authorized(self, headers):
+        """Whether the request carries the profiling token (always false without one)"""
+        return self.token is not None and hmac.compare_digest(headers.get(PROFILE_HEADER, ''), self.token)
+
+    def wants(self, headers):
+        if self.authorized(headers):
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+    def start(self):
+        return StackSampler(threading.get_ident())
+
+    def finish(self, sampler, **summary):
+        """Stop a request's sampler and store its profile; returns the profile name"""
+        seconds = sampler.stop()
+        summary.update(seconds=round(seconds, 6), samples=sum(sampler.stacks.values()),
+                       created=time.time())
+        return self.store.save(sampler.stacks, summary)
@@ -0,0 +1,69 @@
+"""
+Top-k / bottom-k rankings of a resident value column
+Rows are grouped by state once per snapshot (StateSegments), so a state
+ranking touches only that state's rows.  np.argpartition selects the k
+extreme values in linear time and only those k are sorted; percentile
+ranks are counted for the k selected rows only.
+"""
+
+import numpy as np
+
+ORDERS = ('desc', 'asc')
+DEFAULT_K = 25
+MAX_K = 1000
+
+# Up to this many value comparisons (k x ranked rows) percentiles are counted
+# directly; above it the ranked values are sorted once and searched instead
+COMPARE_LIMIT = 4_000_000
+
+
+class StateSegments:
+    """Row positions of each state, as slices of one state-sorted position array"""
+
+    def __init__(self, states):
+        states = np.asarray(states, dtype=object).astype(str)
+        self.order = np.argsort(states, kind='stable')
+        names, starts = np.unique(states[self.order], return_index=True)
+        ends = np.append(starts[1:], len(states))
+        self.slices = {name: slice(start, end) for name, start, end in zip(names, starts, ends)}
+
+    def __contains__(self, state):
+        return state in self.slices
+
+    def rows(self, state=None):
+        """Row positions of one state, or None (every row) without a state"""
+        if state is None:
+            return None
+        return self.order[self.slices[state]]
+
+
+def rank_rows(values, k, order='desc', rows=None):
+    """The k highest ('desc') or lowest ('asc') non-missing values, first to k-th
+
+    ``rows`` restricts the ranking to those row positions.  Returns the row
+    positions, each one's percentile rank (percent of ranked rows with a
+    lower value, ties counted half) and the number of rows ranked.
+    """
+    positions = np.arange(len(values)) if rows is None else np.asarray(rows)
+    scope = np.asarray(values[positions], dtype=np.float64)
+    valid = ~np.isnan(scope)
+    positions, scope = positions[valid], scope[valid]
+    count = len(scope)
+    k = min(k, count)
+    if k == 0:
+        return positions[:0], np.empty(0), count
+
+    keys = -scope if order == 'desc' else scope
+    picked = np.argpartition(keys, k - 1)[:k] if k < count else np.arange(count)
+    picked = picked[np.argsort(keys[picked], kind='stable')]
+
+    selected = scope[picked]
+    if k * count <= COMPARE_LIMIT:
+        below = (scope[None, :] < selected[:, None]).sum(axis=1)
+        equal = (scope[None, :] == selected[:, None]).sum(axis=1)
+    else:
+        ordered = np.sort(scope)
+        below = np.searchsorted(ordered, selected, side='left')
+        equal = np.searchsorted(ordered, selected, side='right') - below
+    percentiles = 100.0 * (below + 0.5 * equal) / count
+    return positions[picked], percentiles, count
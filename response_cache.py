@@ -0,0 +1,134 @@
+"""
+Pre-serialized, pre-compressed response cache
+The first request for a URL stores the final body bytes with gzip (and,
+when the brotli package is installed, brotli) variants compressed once
+(at the highest level unless the body is large); repeat requests are a
+dict lookup plus a socket write
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Total bytes (all encodings) kept before the least recently used entries are dropped
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+# Highest levels cost 3-4x the time of the defaults for a few percent smaller
+# bodies; above this size (e.g. whole-country place-level responses) the
+# first request would wait on compression, so the default levels are used
+LARGE_BODY_BYTES = 128 * 1024
+GZIP_LEVELS = (9, 6)
+BROTLI_QUALITIES = (11, 5)
+
+# Query parameter carrying the data version in immutable URLs
+VERSION_PARAM = 'v'
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+def code_version(directory=None):
+    """Short hash of the app's Python sources, so new code never reuses old cached bytes"""
+    directory = directory or os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(name.encode())
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class CachedResponse:
+    """One serialized body with its compressed variants and strong ETag"""
+
+    def __init__(self, body, mimetype, version):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = f"{version[:8]}-{hashlib.sha1(body).hexdigest()[:16]}"
+        self.encodings = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            large = len(body) >= LARGE_BODY_BYTES
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=GZIP_LEVELS[large])
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=BROTLI_QUALITIES[large])
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(data) for data in self.encodings.values())
+
+    def serve(self, request, immutable=False):
+        """Response for a request: 304 on a matching If-None-Match, else the best encoding"""
+        headers = {
+            'Cache-Control': IMMUTABLE if immutable else REVALIDATE,
+            'Vary': 'Accept, Accept-Encoding',
+        }
+
+        # Each encoding is its own representation, so it gets its own strong ETag
+        encoding = None
+        for candidate in ('br', 'gzip'):
+            if candidate in self.encodings and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        etag = self.etag if encoding is None else f"{self.etag}-{encoding}"
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        body = self.body if encoding is None else self.encodings[encoding]
+        response = Response(body, mimetype=self.mimetype, headers=headers)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        return response
+
+
+class ResponseCache:
+    """Byte-bounded LRU of CachedResponse entries, safe to share between threads"""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).size
+            if entry.size > self.max_bytes:
+                return
+            self.entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= dropped.size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
@@ -0,0 +1,269 @@
+"""
+Hierarchical rollups (county -> state -> census division -> nation)
+Population-weighted segment reductions over every health and SDOH
+measure at once, persisted so state views are lookups
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_FILE = 'rollups.npz'
+
+LEVELS = ['state', 'division', 'nation']
+
+NATION_NAME = 'United States'
+
+CENSUS_DIVISIONS = {
+    'New England': ['Connecticut', 'Maine', 'Massachusetts', 'New Hampshire', 'Rhode Island', 'Vermont'],
+    'Middle Atlantic': ['New Jersey', 'New York', 'Pennsylvania'],
+    'East North Central': ['Illinois', 'Indiana', 'Michigan', 'Ohio', 'Wisconsin'],
+    'West North Central': ['Iowa', 'Kansas', 'Minnesota', 'Missouri', 'Nebraska', 'North Dakota', 'South Dakota'],
+    'South Atlantic': ['Delaware', 'District of Columbia', 'Florida', 'Georgia', 'Maryland',
+                       'North Carolina', 'South Carolina', 'Virginia', 'West Virginia'],
+    'East South Central': ['Alabama', 'Kentucky', 'Mississippi', 'Tennessee'],
+    'West South Central': ['Arkansas', 'Louisiana', 'Oklahoma', 'Texas'],
+    'Mountain': ['Arizona', 'Colorado', 'Idaho', 'Montana', 'Nevada', 'New Mexico', 'Utah', 'Wyoming'],
+    'Pacific': ['Alaska', 'California', 'Hawaii', 'Oregon', 'Washington'],
+}
+
+STATE_DIVISIONS = {state: division for division, states in CENSUS_DIVISIONS.items() for state in states}
+
+ROLLUP_FIELDS = ['value', 'low', 'high', 'lat', 'lng', 'population', 'count']
+
+
+def level_keys(level, states):
+    """Group key of every county for a rollup level (None where it has no group)"""
+    states = np.asarray(states, dtype=object)
+    if level == 'state':
+        return states
+    if level == 'division':
+        return np.array([STATE_DIVISIONS.get(s) for s in states], dtype=object)
+    if level == 'nation':
+        return np.full(len(states), NATION_NAME, dtype=object)
+    raise ValueError(f"Unknown rollup level: {level}")
+
+
+def rollup_matrix(values, population, lat, lng, keys, low=None, high=None):
+    """Roll an n x k matrix up to groups in one pass of segment sums
+
+    Each measure gets a population-weighted mean (plain mean if the group
+    has no population), plain means of the confidence limits, mean
+    coordinates, summed population and the number of counties with a value.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    population = np.asarray(population, dtype=np.float64)
+
+    codes, names = pd.factorize(pd.Series(keys, dtype=object), sort=True)
+    rows = np.flatnonzero(codes >= 0)
+    rows = rows[np.argsort(codes[rows], kind='stable')]
+    sorted_codes = codes[rows]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+    def segment_sum(matrix):
+        return np.add.reduceat(matrix[rows], starts, axis=0)
+
+    valid = ~np.isnan(values)
+    has_pop = ~np.isnan(population)[:, None]
+    weights = np.where(valid & has_pop, population[:, None], 0.0)
+    filled = np.where(valid, values, 0.0)
+
+    count = segment_sum(valid.astype(np.int64))
+    value_sum = segment_sum(filled)
+    weighted_sum = segment_sum(filled * weights)
+    total_weight = segment_sum(weights)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        value = np.where(total_weight > 0, weighted_sum / total_weight, value_sum / count)
+        result = {
+            'keys': np.asarray(names, dtype=str),
+            'value': value,
+            'lat': segment_sum(np.where(valid, np.asarray(lat, dtype=np.float64)[:, None], 0.0)) / count,
+            'lng': segment_sum(np.where(valid, np.asarray(lng, dtype=np.float64)[:, None], 0.0)) / count,
+            'population': segment_sum(np.where(valid & has_pop, population[:, None], 0.0)),
+            'count': count,
+        }
+        for field, limits in (('low', low), ('high', high)):
+            if limits is None:
+                result[field] = np.full(value.shape, np.nan)
+                continue
+            limits = np.asarray(limits, dtype=np.float64)
+            if limits.ndim == 1:
+                limits = limits[:, None]
+            limit_valid = valid & ~np.isnan(limits)
+            result[field] = segment_sum(np.where(limit_valid, limits, 0.0)) / segment_sum(limit_valid.astype(np.int64))
+
+    return result
+
+
+class RollupCube:
+    """Rollups for every measure at every level, indexed by measure key"""
+
+    def __init__(self, measures, sources, levels):
+        self.measures = list(measures)
+        self.sources = list(sources)
+        self.levels = levels
+        self.measure_index = {(source, name): i for i, (source, name) in enumerate(zip(self.sources, self.measures))}
+
+    def has_measure(self, source, measure):
+        return (source, measure) in self.measure_index
+
+    def frame(self, level, source, measure):
+        """Rollup rows of one measure at one level (groups without a value are dropped)"""
+        col = self.measure_index[(source, measure)]
+        data = self.levels[level]
+        mask = data['count'][:, col] > 0
+        return pd.DataFrame({
+            'LocationName': data['keys'][mask],
+            'lat': data['lat'][mask, col],
+            'lng': data['lng'][mask, col],
+            'TotalPopulation': data['population'][mask, col],
+            'Data_Value': data['value'][mask, col],
+            'Low_Confidence_Limit': data['low'][mask, col],
+            'High_Confidence_Limit': data['high'][mask, col],
+            'LocationCount': data['count'][mask, col],
+        })
+
+    def values(self, level, source, measure):
+        """Group key -> rolled-up value for one measure"""
+        col = self.measure_index[(source, measure)]
+        data = self.levels[level]
+        return dict(zip(data['keys'], data['value'][:, col]))
+
+
+def build_rollup_cube(geo, health_measures, health_values, health_low, health_high,
+                      sdoh_columns=(), sdoh_values=None):
+    """Roll every health measure and SDOH column up to every level in one pass per level"""
+    values = health_values
+    low = health_low
+    high = health_high
+    if sdoh_values is not None and len(sdoh_columns):
+        filler = np.full(sdoh_values.shape, np.nan)
+        values = np.hstack([health_values, sdoh_values])
+        low = np.hstack([health_low, filler])
+        high = np.hstack([health_high, filler])
+
+    measures = list(health_measures) + list(sdoh_columns)
+    sources = ['health'] * len(health_measures) + ['sdoh'] * len(sdoh_columns)
+
+    levels = {}
+    for level in LEVELS:
+        keys = level_keys(level, geo['StateDesc'].values)
+        levels[level] = rollup_matrix(values, geo['TotalPopulation'].values, geo['lat'].values,
+                                      geo['lng'].values, keys, low=low, high=high)
+
+    return RollupCube(measures, sources, levels)
+
+
+def save_rollup_cube(cube, data_dir='data'):
+    arrays = {'measures': np.asarray(cube.measures, dtype=str), 'sources': np.asarray(cube.sources, dtype=str)}
+    for level, data in cube.levels.items():
+        arrays[f'{level}_keys'] = data['keys']
+        for field in ROLLUP_FIELDS:
+            arrays[f'{level}_{field}'] = data[field]
+
+    path = os.path.join(data_dir, ROLLUP_FILE)
+    # np.savez appends .npz to names without it, so write through a file object
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+
+def load_rollup_cube(data_dir='data'):
+    """Load the persisted rollups, or return None if they have not been built"""
+    path = os.path.join(data_dir, ROLLUP_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as arrays:
+        levels = {}
+        for level in LEVELS:
+            levels[level] = {'keys': arrays[f'{level}_keys']}
+            for field in ROLLUP_FIELDS:
+                levels[level][field] = arrays[f'{level}_{field}']
+        return RollupCube(arrays['measures'].tolist(), arrays['sources'].tolist(), levels)
+
+
+def _nansum(values):
+    """Sum skipping NaN the way pandas does: NaN read as 0, then numpy's pairwise sum"""
+    return np.where(np.isnan(values), 0.0, values).sum()
+
+
+def _nanmean(values):
+    count = np.count_nonzero(~np.isnan(values))
+    return _nansum(values) / count if count else np.nan
+
+
+def aggregate_data_by_state(measure_data):
+    """Aggregate data by state, calculating weighted averages
+
+    Each state is summed over its own rows in file order, as the original
+    pandas loop did, so the versioned county_state_measures files come out
+    byte-identical.  The one-pass segment sums of rollup_matrix agree with
+    them only to float rounding.
+    """
+    measure_data = measure_data[measure_data['StateDesc'].notna()]
+    if len(measure_data) == 0:
+        return pd.DataFrame()
+
+    states = measure_data['StateDesc'].to_numpy(dtype=object)
+    order = np.argsort(states, kind='stable')
+    keys, starts = np.unique(states[order], return_index=True)
+    bounds = np.append(starts, len(order))
+    columns = {
+        name: measure_data[name].to_numpy(dtype=np.float64)[order]
+        for name in ['lat', 'lng', 'TotalPopulation', 'Data_Value', 'Low_Confidence_Limit', 'High_Confidence_Limit']
+    }
+
+    aggregated = {name: np.empty(len(keys)) for name in columns}
+    for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        group = {name: column[start:stop] for name, column in columns.items()}
+        for name in ['lat', 'lng', 'Low_Confidence_Limit', 'High_Confidence_Limit']:
+            aggregated[name][i] = _nanmean(group[name])
+        aggregated['TotalPopulation'][i] = _nansum(group['TotalPopulation'])
+
+        # Population-weighted Data_Value over rows with both; plain mean if the weights sum to zero
+        valid = ~np.isnan(group['Data_Value']) & ~np.isnan(group['TotalPopulation'])
+        values, weights = group['Data_Value'][valid], group['TotalPopulation'][valid]
+        if len(values) == 0:
+            aggregated['Data_Value'][i] = np.nan
+        elif weights.sum() > 0:
+            aggregated['Data_Value'][i] = (values * weights).sum() / weights.sum()
+        else:
+            aggregated['Data_Value'][i] = values.mean()
+
+    # Other fields come from the first row of each state
+    first_rows = measure_data.iloc[order[starts]]
+
+    return pd.DataFrame({
+        'StateDesc': keys,
+        'lat': aggregated['lat'],
+        'lng': aggregated['lng'],
+        'TotalPopulation': aggregated['TotalPopulation'],
+        'Data_Value': aggregated['Data_Value'],
+        'Data_Value_Unit': first_rows['Data_Value_Unit'].values,
+        'Data_Value_Type': first_rows['Data_Value_Type'].values,
+        'Low_Confidence_Limit': aggregated['Low_Confidence_Limit'],
+        'High_Confidence_Limit': aggregated['High_Confidence_Limit'],
+        'Measure_Short': first_rows['Measure_Short'].values,
+        'LocationCount': np.diff(bounds),
+        'LocationName': keys
+    })
+
+
+def build_rollup_cube_from_stores(measure_store, sdoh_store=None):
+    """Roll up the resident health matrix and (optionally) every SDOH column"""
+    sdoh_columns = []
+    sdoh_values = None
+    if sdoh_store is not None:
+        sdoh_values = sdoh_store.aligned_matrix(measure_store.geo['CountyFIPS'].values)
+        sdoh_columns = sdoh_store.columns
+
+    values, low, high = measure_store.matrices_float64()
+    return build_rollup_cube(
+        measure_store.geo, measure_store.measures['Measure_Clean'],
+        values, low, high, sdoh_columns, sdoh_values
+    )
@@ -0,0 +1,120 @@
+"""
+Columnar, memory-mapped store for the SDOH county variables
+Each SDOH column is one contiguous float64 array so a request only
+touches the pages of the variable it asks for
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SDOH_COLUMNS_FILE = 'sdoh_columns.npy'
+SDOH_INDEX_FILE = 'sdoh_columns.json'
+
+
+def write_sdoh_columns(sdoh_df, fips_order, data_dir='data'):
+    """Write the cleaned SDOH frame as a column-major float64 array
+
+    Rows are aligned to ``fips_order`` (the county locations order), with
+    any SDOH-only counties appended after it, so row i means the same
+    county here and in the measure store.
+    """
+    sdoh_df = sdoh_df.drop_duplicates(subset='CountyFIPS').set_index('CountyFIPS')
+
+    fips = [str(f).zfill(5) for f in fips_order]
+    known = set(fips)
+    fips += [f for f in sdoh_df.index if f not in known]
+
+    aligned = sdoh_df.reindex(fips)
+    columns = list(aligned.columns)
+
+    # Write both files to temporary paths and swap them in so a running app never
+    # maps a partial file; the index goes first and its lengths give the matrix shape
+    columns_path = os.path.join(data_dir, SDOH_COLUMNS_FILE)
+    index_path = os.path.join(data_dir, SDOH_INDEX_FILE)
+    shape = (len(columns), len(fips))
+    matrix = np.lib.format.open_memmap(columns_path + '.tmp', mode='w+', dtype='<f8', shape=shape)
+    for i, col in enumerate(columns):
+        matrix[i] = pd.to_numeric(aligned[col], errors='coerce').values
+    matrix.flush()
+    del matrix
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'fips': fips, 'columns': columns}, f)
+
+    os.replace(index_path + '.tmp', index_path)
+    os.replace(columns_path + '.tmp', columns_path)
+
+    return len(columns), len(fips)
+
+
+class SDOHStore:
+    """Read-only view over the memory-mapped SDOH columns"""
+
+    def __init__(self, fips, columns, matrix):
+        self.fips = fips
+        self.columns = columns
+        self.matrix = matrix
+        self.column_index = {name: i for i, name in enumerate(columns)}
+        self.fips_lookup = pd.Index(fips)
+        self.geo = None
+
+    def __len__(self):
+        return len(self.fips)
+
+    def has_column(self, column_name):
+        return column_name in self.column_index
+
+    def column(self, column_name):
+        """Return one SDOH variable as a contiguous float64 array (no copy)"""
+        return self.matrix[self.column_index[column_name]]
+
+    def rows_for(self, fips):
+        """Row positions for an array of CountyFIPS codes (-1 where absent)"""
+        return self.fips_lookup.get_indexer(fips)
+
+    def values_for(self, column_name, fips):
+        """One SDOH variable gathered into the order of ``fips`` (NaN where absent)"""
+        rows = self.rows_for(fips)
+        values = self.column(column_name)[np.maximum(rows, 0)]
+        return np.where(rows >= 0, values, np.nan)
+
+    def aligned_matrix(self, fips, columns=None):
+        """SDOH columns (all by default) gathered into the order of ``fips`` as an n x k float64 matrix"""
+        rows = self.rows_for(fips)
+        matrix = self.matrix if columns is None else self.matrix[[self.column_index[c] for c in columns]]
+        values = np.asarray(matrix[:, np.maximum(rows, 0)], dtype=np.float64).T
+        values[rows < 0] = np.nan
+        return values
+
+    def attach_locations(self, locations):
+        """Pre-join county names, states and coordinates onto the SDOH row order"""
+        located = locations.drop_duplicates(subset='CountyFIPS').set_index('CountyFIPS').reindex(self.fips)
+        self.geo = {
+            'CountyFIPS': self.fips,
+            'LocationName': located['CountyName'].fillna('Unknown County').to_numpy(dtype=object),
+            'StateDesc': located['StateDesc'].fillna('Unknown State').to_numpy(dtype=object),
+            'lat': located['lat'].fillna(0).to_numpy(dtype=float),
+            'lng': located['lng'].fillna(0).to_numpy(dtype=float),
+            'TotalPopulation': located['TotalPopulation'].fillna(0).to_numpy(dtype=float),
+        }
+
+
+def open_sdoh_store(data_dir='data'):
+    """Memory-map the SDOH columns, or return None if they have not been built"""
+    columns_path = os.path.join(data_dir, SDOH_COLUMNS_FILE)
+    index_path = os.path.join(data_dir, SDOH_INDEX_FILE)
+    if not (os.path.exists(columns_path) and os.path.exists(index_path)):
+        return None
+
+    with open(index_path) as f:
+        index = json.load(f)
+
+    matrix = np.load(columns_path, mmap_mode='r')
+    # A write interrupted between swapping the index and the matrix leaves them mismatched
+    expected = (len(index['columns']), len(index['fips']))
+    if matrix.shape != expected:
+        raise ValueError(f"{SDOH_INDEX_FILE} describes a {expected} matrix but {SDOH_COLUMNS_FILE} "
+                         f"is {matrix.shape}; rerun preprocess_data.py")
+    return SDOHStore(np.array(index['fips'], dtype=object), index['columns'], matrix)
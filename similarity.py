@@ -0,0 +1,122 @@
+"""
+"Counties like this one": nearest neighbours in a standardized measure space
+Each county is a vector of every PLACES measure plus a chosen set of SDOH
+variables, z-scored per column (missing values sit at the column mean).
+A query is one BLAS matrix-vector product over the precomputed matrix,
+|x - y|^2 = |x|^2 + |y|^2 - 2 x.y, and np.argpartition picks the nearest
+rows.  That is linear in rows and well under a millisecond even over every
+place, so no tree is needed at these dimensions; neighbour lists are
+cached per row.
+"""
+
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+# SDOH variables used when a request names none: income, insurance,
+# employment, education, age and access
+DEFAULT_SDOH_COLUMNS = [
+    'ACS_PCT_PERSON_INC_BELOW99', 'ACS_MEDIAN_HH_INC', 'ACS_PCT_UNINSURED', 'ACS_PCT_UNEMPLOY',
+    'ACS_PCT_LT_HS', 'ACS_PCT_BACHELOR_DGR', 'ACS_PCT_AGE_ABOVE65', 'ACS_PCT_HU_NO_VEH',
+    'ACS_PCT_HH_NO_INTERNET',
+]
+
+DEFAULT_K = 10
+MAX_K = 100
+
+# Feature sets (level + SDOH columns) and neighbour lists kept in memory
+INDEX_CACHE_SIZE = 8
+NEIGHBOUR_CACHE_SIZE = 4096
+
+
+def standardize(values):
+    """Z-score each column; missing values become 0 (the column mean), constant columns 0"""
+    with warnings.catch_warnings():
+        # All-missing columns are zeroed below
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        spread = np.nanstd(values, axis=0)
+        scaled = (values - mean) / spread
+    scaled[:, ~(spread > 0)] = 0.0
+    scaled[np.isnan(scaled)] = 0.0
+    return scaled
+
+
+class SimilarityIndex:
+    """Standardized row vectors with their squared norms"""
+
+    def __init__(self, values):
+        self.vectors = np.ascontiguousarray(standardize(np.asarray(values, dtype=np.float64)))
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        # Rows without a single value would tie at the centre; never return them
+        self.empty = np.isnan(values).all(axis=1)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def nearest(self, row, k):
+        """Rows of the k nearest other rows, nearest first, with their distances"""
+        distances = self.norms + self.norms[row] - 2.0 * (self.vectors @ self.vectors[row])
+        distances[row] = np.inf
+        distances[self.empty] = np.inf
+        k = min(k, int(np.isfinite(distances).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        picked = np.argpartition(distances, k - 1)[:k]
+        picked = picked[np.argsort(distances[picked], kind='stable')]
+        return picked, np.sqrt(np.maximum(distances[picked], 0.0))
+
+
+class SimilarityEngine:
+    """Builds a SimilarityIndex per feature set and caches neighbour lists"""
+
+    def __init__(self, measure_store, sdoh_store=None, place_store=None):
+        self.stores = {'county': measure_store, 'place': place_store}
+        self.sdoh_store = sdoh_store
+        self.indexes = OrderedDict()
+        self.neighbours = OrderedDict()
+        self.lock = threading.Lock()
+
+    def default_sdoh_columns(self):
+        if self.sdoh_store is None:
+            return []
+        return [column for column in DEFAULT_SDOH_COLUMNS if self.sdoh_store.has_column(column)]
+
+    def index(self, level, sdoh_columns=()):
+        """The index over a level's rows for every PLACES measure plus ``sdoh_columns`` (counties only)"""
+        key = (level, tuple(sdoh_columns))
+        with self.lock:
+            if key in self.indexes:
+                self.indexes.move_to_end(key)
+                return self.indexes[key]
+
+        store = self.stores[level]
+        values = store.measure_matrix(list(store.measures['Measure_Clean']))
+        if sdoh_columns:
+            sdoh_values = self.sdoh_store.aligned_matrix(store.geo['CountyFIPS'].values, list(sdoh_columns))
+            values = np.hstack([values, sdoh_values])
+        index = SimilarityIndex(values)
+
+        with self.lock:
+            self.indexes[key] = index
+            if len(self.indexes) > INDEX_CACHE_SIZE:
+                self.indexes.popitem(last=False)
+        return index
+
+    def nearest(self, level, row, k, sdoh_columns=()):
+        """Up to k most similar rows to ``row`` with their distances; MAX_K are cached per row"""
+        key = (level, tuple(sdoh_columns), row)
+        with self.lock:
+            cached = self.neighbours.get(key)
+            if cached is not None:
+                self.neighbours.move_to_end(key)
+        if cached is None:
+            cached = self.index(level, sdoh_columns).nearest(row, MAX_K)
+            with self.lock:
+                self.neighbours[key] = cached
+                if len(self.neighbours) > NEIGHBOUR_CACHE_SIZE:
+                    self.neighbours.popitem(last=False)
+        rows, distances = cached
+        return rows[:k], distances[:k]
@@ -0,0 +1,101 @@
+"""
+Immutable data snapshots with atomic hot swap
+Everything the endpoints read is built into one DataSnapshot off the
+request path and published by a single reference assignment.  Requests
+that started on the old snapshot finish on it; new requests see the new one.
+"""
+
+import os
+import threading
+import time
+
+from instrumentation import queued_logger
+
+# How often each process checks the preprocessing manifest for a new data version
+MANIFEST_POLL_SECONDS = 30
+
+# The app's logger, so reload failures reach its handlers
+log = queued_logger('health_equity')
+
+
+class DataSnapshot:
+    """Bundle of resident data; read-only once published, apart from its memo caches"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class SnapshotHolder:
+    """Owns the current snapshot: first load, reloads and manifest polling
+
+    ``build`` returns a new DataSnapshot and ``on_swap`` (optional) is called
+    with each reloaded snapshot once it is published.  Builds are serialized
+    by a lock, so concurrent first requests load the data once.
+    """
+
+    def __init__(self, build, on_swap=None):
+        self.build = build
+        self.on_swap = on_swap
+        self.current = None
+        self.lock = threading.Lock()
+        self.last_error = None
+        self.watcher_pid = None
+
+    @property
+    def ready(self):
+        return self.current is not None
+
+    def get(self):
+        """The current snapshot, loading the first one if nothing is published yet"""
+        snapshot = self.current
+        if snapshot is None:
+            with self.lock:
+                if self.current is None:
+                    self.current = self.build()
+            snapshot = self.current
+        return snapshot
+
+    def reload(self):
+        """Build a new snapshot and swap it in; the old one stays published if the build fails"""
+        with self.lock:
+            try:
+                snapshot = self.build()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                log.exception(f"Snapshot reload failed, keeping the current snapshot: {self.last_error}")
+                return None
+            self.current = snapshot
+            self.last_error = None
+        if self.on_swap is not None:
+            self.on_swap(snapshot)
+        return snapshot
+
+    def reload_async(self):
+        thread = threading.Thread(target=self.reload, name='snapshot-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, current_version, interval=MANIFEST_POLL_SECONDS):
+        """Poll ``current_version()`` in a daemon thread and reload when it changes
+
+        Threads don't survive fork, so this is safe to call on every request:
+        it starts one watcher per process.
+        """
+        if self.watcher_pid == os.getpid():
+            return
+        self.watcher_pid = os.getpid()
+
+        def poll():
+            while True:
+                time.sleep(interval)
+                snapshot = self.current
+                try:
+                    version = current_version()
+                except Exception as e:
+                    log.exception(f"Manifest check failed: {e}")
+                    continue
+                if snapshot is not None and version is not None and version != snapshot.manifest_version:
+                    log.info(f"Manifest version changed to {version}, reloading data snapshot...")
+                    self.reload()
+
+        threading.Thread(target=poll, name='snapshot-watcher', daemon=True).start()
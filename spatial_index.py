@@ -0,0 +1,145 @@
+"""
+Uniform lat/lng grid index over county centroids
+Viewport (bounding box) queries only scan the grid cells they overlap.
+Radius and nearest-N queries scan the cells of the radius' bounding box,
+then refine the candidates with a vectorized haversine distance.
+"""
+
+import numpy as np
+
+# Cell size in degrees; a county is ~0.5 degrees across, so cells hold a handful each
+CELL_SIZE = 1.0
+
+MAX_ZOOM = 18
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Great-circle distance between antipodes; no point is further away
+MAX_DISTANCE_MILES = np.pi * EARTH_RADIUS_MILES
+
+# First radius tried by a nearest-N query, doubled until it holds N points
+NEAREST_START_MILES = 50.0
+
+
+def haversine_miles(lat, lng, lats, lngs):
+    """Great-circle miles from one point to each of ``lats``/``lngs``"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def radius_bbox(lat, lng, miles):
+    """A 'west,south,east,north' box holding every point within ``miles`` of lat/lng"""
+    degrees = np.degrees(miles / EARTH_RADIUS_MILES)
+    south, north = lat - degrees, lat + degrees
+    if south <= -90.0 or north >= 90.0:
+        # The circle covers a pole, so every longitude
+        return -180.0, max(south, -90.0), 180.0, min(north, 90.0)
+    # Widest longitude span of the circle, reached where its edge is tangent to a meridian
+    spread = np.degrees(np.arcsin(np.sin(np.radians(degrees)) / np.cos(np.radians(lat))))
+    west = (lng - spread + 180.0) % 360.0 - 180.0
+    east = (lng + spread + 180.0) % 360.0 - 180.0
+    return west, south, east, north
+
+
+def parse_bbox(text):
+    """Parse 'west,south,east,north' (Leaflet's toBBoxString order) into floats"""
+    try:
+        west, south, east, north = (float(part) for part in text.split(','))
+    except ValueError:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    if not all(np.isfinite([west, south, east, north])) or south > north:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    return west, south, east, north
+
+
+def snap_bbox(bbox, zoom):
+    """Grow a bbox outward to the map tile grid of a zoom level
+
+    Nearby viewports at the same zoom then ask for the same box, so the
+    query (and its response) can be reused while panning.
+    """
+    zoom = int(min(max(zoom, 0), MAX_ZOOM))
+    step = 360.0 / 2 ** zoom
+    west, south, east, north = bbox
+    return (
+        max(np.floor(west / step) * step, -180.0),
+        max(np.floor(south / step) * step, -90.0),
+        min(np.ceil(east / step) * step, 180.0),
+        min(np.ceil(north / step) * step, 90.0),
+    )
+
+
+class GridIndex:
+    """Rows bucketed by grid cell, stored as one array sorted by cell id"""
+
+    def __init__(self, lat, lng, cell_size=CELL_SIZE):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.cell_size = cell_size
+        self.columns = int(np.ceil(360.0 / cell_size))
+        self.rows_per_column = int(np.ceil(180.0 / cell_size))
+
+        located = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lng))
+        cells = self.cell_id(self.lat[located], self.lng[located])
+        order = np.argsort(cells, kind='stable')
+        self.rows = located[order]
+        # starts[c] .. starts[c + 1] are the positions in self.rows of cell c
+        self.starts = np.searchsorted(cells[order], np.arange(self.columns * self.rows_per_column + 1))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def cell_xy(self, lat, lng):
+        x = np.clip(((np.asarray(lng) + 180.0) // self.cell_size).astype(int), 0, self.columns - 1)
+        y = np.clip(((np.asarray(lat) + 90.0) // self.cell_size).astype(int), 0, self.rows_per_column - 1)
+        return x, y
+
+    def cell_id(self, lat, lng):
+        x, y = self.cell_xy(lat, lng)
+        return y * self.columns + x
+
+    def query(self, bbox):
+        """Sorted row positions inside a 'west,south,east,north' bbox (edges included)"""
+        west, south, east, north = bbox
+        if west > east:
+            # The box crosses the antimeridian
+            return np.union1d(self.query((west, south, 180.0, north)), self.query((-180.0, south, east, north)))
+
+        x0, y0 = self.cell_xy(south, west)
+        x1, y1 = self.cell_xy(north, east)
+        # Cells of one grid row are contiguous, so each grid row is one slice
+        candidates = np.concatenate([
+            self.rows[self.starts[y * self.columns + x0]:self.starts[y * self.columns + x1 + 1]]
+            for y in range(y0, y1 + 1)
+        ])
+        lat = self.lat[candidates]
+        lng = self.lng[candidates]
+        inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        return np.sort(candidates[inside])
+
+    def within(self, lat, lng, miles):
+        """Row positions within ``miles`` of lat/lng and their distances, nearest first"""
+        candidates = self.query(radius_bbox(lat, lng, miles))
+        distances = haversine_miles(lat, lng, self.lat[candidates], self.lng[candidates])
+        inside = distances <= miles
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return candidates[order], distances[order]
+
+    def nearest(self, lat, lng, n):
+        """Row positions of the n nearest located rows and their distances, nearest first"""
+        miles = NEAREST_START_MILES
+        rows, distances = self.within(lat, lng, miles)
+        # Every row within the radius is found, so once it holds n they are the n nearest
+        while len(rows) < n and miles < MAX_DISTANCE_MILES:
+            miles *= 2
+            rows, distances = self.within(lat, lng, miles)
+        return rows[:n], distances[:n]
+
+    def mask(self, bbox):
+        """Boolean row mask of a bbox query"""
+        mask = np.zeros(len(self.lat), dtype=bool)
+        mask[self.query(bbox)] = True
+        return mask
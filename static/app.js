@@ -1,33 +1,70 @@
+// Compact typed-array response format served by the data endpoints (see wire_format.py)
+const COLUMNS_BINARY_MIME = 'application/vnd.health-equity.columns';
+const COLUMNS_ACCEPT = `${COLUMNS_BINARY_MIME}, application/json;q=0.5`;
+const TYPED_ARRAYS = {
+    float32: Float32Array,
+    float64: Float64Array,
+    int8: Int8Array,
+    int16: Int16Array,
+    int32: Int32Array,
+    uint8: Uint8Array
+};
+
 class HealthEquityMap {
     constructor() {
         this.map = null;
         this.currentMeasure = null;
         this.currentData = [];
+        this.currentStats = null; // Precomputed distribution summary from /api/measure-stats
         this.markers = [];
         this.showSDOH = false;
         this.showOverlay = false;
         this.availableMeasures = [];
         this.availableSDOHMeasures = [];
         this.overlayHealthData = [];
-        this.overlaySDOHData = [];
+        this.overlayHealthQuartiles = null;
+        this.overlaySDOHQuartiles = null;
+        this.overlayClassLabels = [];
         this.currentHealthMeasure = null;
         this.currentSDOHMeasure = null;
         this.overlaySDOHMeasure = null; // Track SDOH measure in overlay mode
         this.minZoomForMarkers = 4; // Minimum zoom level to show markers
+        this.viewportMinZoom = 6; // County views at or above this zoom only fetch counties in view
+        this.loadedBounds = null; // Padded bounds of the last viewport fetch (null = all counties loaded)
+        this.requestedBounds = null;
         this.markersVisible = false;
         this.isStateView = false; // Toggle between state and county view
+        this.dataVersion = null; // Server data version; versioned data URLs are cached as immutable
         
         this.init();
     }
     
     async init() {
         this.initMap();
+        await this.loadDataVersion();
         await this.loadMeasures();
         await this.loadSDOHMeasures();
         this.setupEventListeners();
         this.showInitialSummaryStats();
     }
     
+    async loadDataVersion() {
+        // Data URLs carry the version so the browser can cache them indefinitely
+        try {
+            const response = await fetch('/api/data-version');
+            if (response.ok) {
+                this.dataVersion = (await response.json()).version;
+            }
+        } catch (error) {
+            console.warn('Could not load data version:', error);
+        }
+    }
+    
+    versionedUrl(url) {
+        if (!this.dataVersion) return url;
+        return `${url}${url.includes('?') ? '&' : '?'}v=${encodeURIComponent(this.dataVersion)}`;
+    }
+    
     initMap() {
         // Initialize map centered on United States
         this.map = L.map('map').setView([39.8283, -98.5795], 4);
@@ -42,6 +79,11 @@ class HealthEquityMap {
             this.handleZoomChange();
         });
         
+        // Fetch the counties in view after panning or zooming
+        this.map.on('moveend', () => {
+            this.handleViewportChange();
+        });
+        
         // Add legend
         this.addLegend();
     }
@@ -196,7 +238,7 @@ class HealthEquityMap {
         
         try {
             console.log('Loading measures...');
-            const response = await fetch('/api/measures');
+            const response = await fetch(this.versionedUrl('/api/measures'));
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
@@ -221,7 +263,7 @@ class HealthEquityMap {
     async loadSDOHMeasures() {
         try {
             console.log('Loading SDOH measures...');
-            const response = await fetch('/api/sdoh-measures');
+            const response = await fetch(this.versionedUrl('/api/sdoh-measures'));
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
@@ -476,7 +518,8 @@ class HealthEquityMap {
         this.currentSDOHMeasure = null;
         this.overlaySDOHMeasure = null;
         this.overlayHealthData = [];
-        this.overlaySDOHData = [];
+        this.overlayHealthQuartiles = null;
+        this.overlaySDOHQuartiles = null;
         document.getElementById('measure-select').value = '';
         
         // Reset SDOH dropdown
@@ -496,7 +539,7 @@ class HealthEquityMap {
         
         if (this.showOverlay) {
             // Overlay mode: show both health and SDOH data
-            const sdohClassification = state.sdohAvgValue !== null ? this.getValueClassification(state.sdohAvgValue, quartiles) : 'Unknown';
+            const sdohClassification = state.sdohAvgValue !== null ? this.getValueClassification(state.sdohAvgValue, this.overlaySDOHQuartiles) : 'Unknown';
             
             statsContent.innerHTML = `
                 <h4>${state.stateName} - State Statistics (Overlay)</h4>
@@ -589,8 +632,8 @@ class HealthEquityMap {
         
         if (this.showOverlay) {
             // Overlay mode: show both datasets
-            const matchingSDOH = this.findMatchingData(this.overlayHealthData, this.overlaySDOHData, location);
-            const sdohClassification = matchingSDOH ? this.getValueClassification(matchingSDOH.Data_Value, quartiles) : 'Unknown';
+            const matchingSDOH = this.getOverlaySDOH(location);
+            const sdohClassification = this.getOverlayClassLabel(location.SDOH_Class);
             
             statsContent.innerHTML = `
                 <h4>${location.LocationName} - County Statistics (Overlay)</h4>
@@ -792,22 +835,28 @@ class HealthEquityMap {
             console.log('Loading data for measure:', this.currentMeasure);
             
             // Choose API endpoint based on view mode
+            const viewportQuery = this.getViewportQuery('?');
             const apiEndpoint = this.isStateView ? 
                 `/api/state-measure-data/${encodeURIComponent(this.currentMeasure)}` :
-                `/api/measure-data/${encodeURIComponent(this.currentMeasure)}`;
+                `/api/measure-data/${encodeURIComponent(this.currentMeasure)}${viewportQuery}`;
             
-            const response = await fetch(apiEndpoint);
+            const [response] = await Promise.all([
+                fetch(this.versionedUrl(apiEndpoint), { headers: { Accept: COLUMNS_ACCEPT } }),
+                this.loadMeasureStats(this.currentMeasure)
+            ]);
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            this.currentData = await response.json();
+            this.currentData = (await this.readTable(response)).records;
+            this.loadedBounds = this.requestedBounds;
             
             console.log('Received data:', this.currentData.length, 'records');
             
             if (this.currentData.length === 0) {
-                this.showError('No data available for the selected measure.');
+                this.clearMap();
+                this.showError(this.loadedBounds ? 'No counties in view. Pan or zoom out to see data.' : 'No data available for the selected measure.');
                 return;
             }
             
@@ -820,8 +869,9 @@ class HealthEquityMap {
                 console.log('Rendering markers...');
                 this.renderMap();
             } else {
-                console.log('Zoom level too low for county markers, not rendering');
+                console.log('Zoom level too low for county markers, rendering clusters');
                 this.markersVisible = false;
+                this.renderClusters();
             }
             
             this.updateStatsPanel();
@@ -845,21 +895,29 @@ class HealthEquityMap {
         try {
             console.log('Loading SDOH data for measure:', this.currentMeasure);
             
-            // For now, SDOH data only supports county view (no state aggregation)
-            const apiEndpoint = `/api/sdoh-measure-data/${encodeURIComponent(this.currentMeasure)}`;
+            // Choose API endpoint based on view mode (state rollups are precomputed)
+            const viewportQuery = this.getViewportQuery('?');
+            const apiEndpoint = this.isStateView ?
+                `/api/sdoh-state-measure-data/${encodeURIComponent(this.currentMeasure)}` :
+                `/api/sdoh-measure-data/${encodeURIComponent(this.currentMeasure)}${viewportQuery}`;
             
-            const response = await fetch(apiEndpoint);
+            const [response] = await Promise.all([
+                fetch(this.versionedUrl(apiEndpoint), { headers: { Accept: COLUMNS_ACCEPT } }),
+                this.loadMeasureStats(this.currentMeasure)
+            ]);
             
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            this.currentData = await response.json();
+            this.currentData = (await this.readTable(response)).records;
+            this.loadedBounds = this.requestedBounds;
             
             console.log('Received SDOH data:', this.currentData.length, 'records');
             
             if (this.currentData.length === 0) {
-                this.showError('No SDOH data available for the selected measure.');
+                this.clearMap();
+                this.showError(this.loadedBounds ? 'No counties in view. Pan or zoom out to see data.' : 'No SDOH data available for the selected measure.');
                 return;
             }
             
@@ -872,8 +930,9 @@ class HealthEquityMap {
                 console.log('Rendering SDOH markers...');
                 this.renderMap();
             } else {
-                console.log('Zoom level too low for county markers, not rendering');
+                console.log('Zoom level too low for county markers, rendering clusters');
                 this.markersVisible = false;
+                this.renderClusters();
             }
             
             this.updateStatsPanel();
@@ -889,24 +948,101 @@ class HealthEquityMap {
         }
     }
 
-    findMatchingData(healthData, sdohData, location) {
-        // Find matching SDOH data for a health location
-        const matchingSDOH = sdohData.find(sdoh => 
-            sdoh.LocationName === location.LocationName && 
-            sdoh.StateDesc === location.StateDesc
-        );
+    async readTable(response) {
+        // Binary columnar responses carry the JSON metadata in their header; records responses are plain JSON
+        const contentType = response.headers.get('Content-Type') || '';
+        if (contentType.startsWith(COLUMNS_BINARY_MIME)) {
+            const table = this.decodeColumns(await response.arrayBuffer());
+            return { meta: table.meta, records: this.columnsToRecords(table) };
+        }
+        
+        const body = await response.json();
+        return Array.isArray(body) ? { meta: {}, records: body } : { meta: body, records: body.data };
+    }
+    
+    decodeColumns(buffer) {
+        // uint32 header length, JSON header, then 8-byte aligned little-endian column buffers
+        const headerLength = new DataView(buffer).getUint32(0, true);
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+        const dataStart = 4 + headerLength;
+        
+        const columns = {};
+        header.columns.forEach(column => {
+            const ArrayType = TYPED_ARRAYS[column.type];
+            columns[column.name] = new ArrayType(buffer, dataStart + column.offset, column.length);
+        });
+        
+        return { ...header, columns };
+    }
+    
+    columnsToRecords(table) {
+        // Rebuild the row objects the renderers use (missing values become null, as in the JSON records)
+        const names = Object.keys(table.columns);
+        const records = new Array(table.length);
+        
+        for (let i = 0; i < table.length; i++) {
+            const record = {};
+            for (const [name, value] of Object.entries(table.constants)) {
+                record[name] = value === table.null_values[name] ? null : value;
+            }
+            for (const name of names) {
+                let value = table.columns[name][i];
+                const dictionary = table.dictionaries[name];
+                if (dictionary) {
+                    value = value >= 0 ? dictionary[value] : null;
+                } else if (value === table.null_values[name] || Number.isNaN(value)) {
+                    value = null;
+                }
+                record[name] = value;
+            }
+            records[i] = record;
+        }
         
-        return matchingSDOH || null;
+        return records;
     }
     
-    findMatchingHealthData(healthData, sdohData, location) {
-        // Find matching health data for an SDOH location
-        const matchingHealth = healthData.find(health => 
-            health.LocationName === location.LocationName && 
-            health.StateDesc === location.StateDesc
-        );
+    async loadMeasureStats(measureName) {
+        // Quartiles and legend breaks are precomputed server-side; fall back to local computation on failure
+        if (this.currentStats && this.currentStats.measure === measureName) {
+            return; // Already loaded (viewport refetches keep the national summary)
+        }
+        this.currentStats = null;
+        try {
+            const response = await fetch(this.versionedUrl(`/api/measure-stats/${encodeURIComponent(measureName)}`));
+            if (response.ok) {
+                this.currentStats = await response.json();
+            }
+        } catch (error) {
+            console.warn('Could not load measure statistics:', error);
+        }
+    }
+    
+    getQuartiles(values) {
+        // Use the server summary for the current view when it is available
+        const level = this.isStateView ? 'state' : 'county';
+        if (!this.showOverlay && this.currentStats && this.currentStats[level] && this.currentStats[level].quartiles) {
+            return this.currentStats[level].quartiles;
+        }
+        return this.calculateQuartiles(values);
+    }
+    
+    getOverlaySDOH(location) {
+        // SDOH values are joined onto each overlay row by CountyFIPS on the server
+        if (location.SDOH_Value === null || location.SDOH_Value === undefined) {
+            return null;
+        }
         
-        return matchingHealth || null;
+        return {
+            Data_Value: location.SDOH_Value,
+            Data_Value_Unit: '',
+            TotalPopulation: location.TotalPopulation
+        };
+    }
+    
+    getOverlayClassLabel(classIndex) {
+        // Quartile classes are precomputed by /api/overlay
+        if (classIndex === null || classIndex === undefined) return 'Unknown';
+        return this.overlayClassLabels[classIndex] || 'Unknown';
     }
 
     async loadOverlayData() {
@@ -920,35 +1056,36 @@ class HealthEquityMap {
         try {
             console.log('Loading overlay data for health measure:', this.currentHealthMeasure, 'and SDOH measure:', this.currentSDOHMeasure);
             
-            // Load both health and SDOH data simultaneously
-            const [healthResponse, sdohResponse] = await Promise.all([
-                fetch(this.isStateView ? 
-                    `/api/state-measure-data/${encodeURIComponent(this.currentHealthMeasure)}` :
-                    `/api/measure-data/${encodeURIComponent(this.currentHealthMeasure)}`),
-                fetch(`/api/sdoh-measure-data/${encodeURIComponent(this.currentSDOHMeasure)}`)
-            ]);
+            // The server joins both measures on CountyFIPS and precomputes quartile classes
+            const params = new URLSearchParams({
+                health: this.currentHealthMeasure,
+                sdoh: this.currentSDOHMeasure,
+                view: this.isStateView ? 'state' : 'county'
+            });
+            const response = await fetch(this.versionedUrl(`/api/overlay?${params}${this.getViewportQuery('&')}`), {
+                headers: { Accept: COLUMNS_ACCEPT }
+            });
             
-            if (!healthResponse.ok) {
-                throw new Error(`HTTP error loading health data! status: ${healthResponse.status}`);
-            }
-            if (!sdohResponse.ok) {
-                throw new Error(`HTTP error loading SDOH data! status: ${sdohResponse.status}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error loading overlay data! status: ${response.status}`);
             }
             
-            this.overlayHealthData = await healthResponse.json();
-            this.overlaySDOHData = await sdohResponse.json();
+            const { meta: overlay, records } = await this.readTable(response);
+            this.overlayHealthData = records;
+            this.overlayHealthQuartiles = overlay.health_quartiles;
+            this.overlaySDOHQuartiles = overlay.sdoh_quartiles;
+            this.overlayClassLabels = overlay.class_labels;
+            this.loadedBounds = this.requestedBounds;
             
-            console.log('Loaded health data for overlay:', this.overlayHealthData.length, 'records');
-            console.log('Loaded SDOH data for overlay:', this.overlaySDOHData.length, 'records');
-            console.log('Sample health data:', this.overlayHealthData.slice(0, 2));
-            console.log('Sample SDOH data:', this.overlaySDOHData.slice(0, 2));
+            console.log('Loaded overlay data:', this.overlayHealthData.length, 'records');
             
             // Create combined dataset for rendering (use health data as primary)
             this.currentData = this.overlayHealthData;
             this.currentMeasure = this.currentHealthMeasure; // Set current measure for rendering
             
             if (this.currentData.length === 0) {
-                this.showError('No data available for the selected measures in overlay mode.');
+                this.clearMap();
+                this.showError(this.loadedBounds ? 'No counties in view. Pan or zoom out to see data.' : 'No data available for the selected measures in overlay mode.');
                 return;
             }
             
@@ -975,6 +1112,41 @@ class HealthEquityMap {
         }
     }
     
+    getViewportQuery(separator) {
+        // County views zoomed in past viewportMinZoom only ask for counties in (padded) view
+        this.requestedBounds = null;
+        if (this.isStateView || this.map.getZoom() < this.viewportMinZoom) {
+            return '';
+        }
+        
+        this.requestedBounds = this.map.getBounds().pad(0.5);
+        const params = new URLSearchParams({
+            bbox: this.requestedBounds.toBBoxString(),
+            zoom: this.map.getZoom()
+        });
+        return `${separator}${params}`;
+    }
+    
+    handleViewportChange() {
+        if (this.isStateView || !this.currentMeasure) return;
+        
+        const zoomedIn = this.map.getZoom() >= this.viewportMinZoom;
+        const needsFetch = zoomedIn ?
+            !(this.loadedBounds && this.loadedBounds.contains(this.map.getBounds())) :
+            this.loadedBounds !== null; // Zoomed back out with only part of the counties loaded
+        if (!needsFetch) return;
+        
+        if (this.showOverlay) {
+            if (this.currentHealthMeasure && this.currentSDOHMeasure) {
+                this.loadOverlayData();
+            }
+        } else if (this.showSDOH) {
+            this.loadSDOHMeasureData();
+        } else {
+            this.loadMeasureData();
+        }
+    }
+    
     handleZoomChange() {
         const currentZoom = this.map.getZoom();
         
@@ -985,6 +1157,10 @@ class HealthEquityMap {
             this.renderMap();
             this.markersVisible = true;
             this.hideZoomMessage();
+        } else if (!shouldShowMarkers && this.currentData.length > 0 && !this.showOverlay) {
+            // Too many counties to draw individually; show the grid clusters for this zoom
+            this.markersVisible = false;
+            this.renderClusters();
         } else if (!shouldShowMarkers && this.markersVisible) {
             this.clearMap();
             this.markersVisible = false;
@@ -1021,7 +1197,11 @@ class HealthEquityMap {
         if (currentZoom < this.minZoomForMarkers) {
                 console.log('Zoom level too low for county markers');
             this.markersVisible = false;
-                this.showZoomMessage();
+                if (this.showOverlay) {
+                    this.showZoomMessage();
+                } else {
+                    this.renderClusters();
+                }
             return;
             }
             console.log('Rendering county markers');
@@ -1031,6 +1211,72 @@ class HealthEquityMap {
         }
     }
     
+    async renderClusters() {
+        // Population-weighted grid clusters precomputed per zoom level (/api/measure-clusters)
+        const measure = this.currentMeasure;
+        const zoom = this.map.getZoom();
+        
+        try {
+            const response = await fetch(this.versionedUrl(`/api/measure-clusters/${encodeURIComponent(measure)}?zoom=${zoom}`));
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const result = await response.json();
+            
+            // Drop the response if the view changed while it was loading
+            if (measure !== this.currentMeasure || zoom !== this.map.getZoom() || this.isStateView || this.markersVisible) {
+                return;
+            }
+            
+            this.markers.forEach(marker => this.map.removeLayer(marker));
+            this.markers = [];
+            
+            // Color against the county distribution so colors match the zoomed-in map
+            const values = this.currentData.map(d => d.Data_Value).filter(v => !isNaN(v));
+            const quartiles = this.getQuartiles(values);
+            
+            result.clusters.forEach(cluster => {
+                const marker = this.createClusterMarker(cluster, quartiles, result);
+                marker.addTo(this.map);
+                this.markers.push(marker);
+            });
+            
+            console.log('Created', result.clusters.length, 'cluster markers at zoom', result.zoom);
+            this.hideZoomMessage();
+        } catch (error) {
+            console.warn('Could not load clusters:', error);
+            this.showZoomMessage();
+        }
+    }
+    
+    createClusterMarker(cluster, quartiles, result) {
+        const radius = Math.min(30, 6 + 2 * Math.sqrt(cluster.LocationCount));
+        const marker = L.circleMarker([cluster.lat, cluster.lng], {
+            radius: radius,
+            fillColor: this.getDataColor(cluster.Data_Value, quartiles, this.currentMeasure),
+            color: 'white',
+            weight: 2,
+            opacity: 1,
+            fillOpacity: 0.8,
+            className: 'cluster-marker'
+        });
+        
+        const valueDisplay = this.showSDOH ?
+            this.formatSDOHValue(cluster.Data_Value, this.currentMeasure, result.Data_Value_Unit) :
+            `${cluster.Data_Value.toFixed(1)}${result.Data_Value_Unit || ''}`;
+        
+        marker.bindPopup(`
+            <div class="popup-content">
+                <h4>${cluster.LocationCount} ${cluster.LocationCount === 1 ? 'county' : 'counties'}</h4>
+                <p><strong>${result.Measure_Short}:</strong> ${valueDisplay} (population-weighted)</p>
+                <p><strong>Population:</strong> ${cluster.TotalPopulation.toLocaleString()}</p>
+                <p style="font-size: 0.8rem; color: #666;">Zoom in to see individual counties</p>
+            </div>
+        `);
+        
+        return marker;
+    }
+    
     renderStateAggregation() {
         console.log('Rendering state-level aggregation');
         console.log('Current data length:', this.currentData.length);
@@ -1044,9 +1290,9 @@ class HealthEquityMap {
             return;
         }
         
-        // Calculate quartiles for state data
+        // Quartiles for state data
         const values = stateData.map(d => d.avgValue).filter(v => !isNaN(v));
-        const quartiles = this.calculateQuartiles(values);
+        const quartiles = this.getQuartiles(values);
         
         console.log('Creating state markers for', stateData.length, 'states');
         console.log('State value range:', Math.min(...values), 'to', Math.max(...values));
@@ -1071,9 +1317,9 @@ class HealthEquityMap {
     renderCountyMarkers() {
         console.log('Rendering county-level markers');
         
-        // Calculate quartiles for color coding
+        // Quartiles for color coding
         const values = this.currentData.map(d => d.Data_Value).filter(v => !isNaN(v));
-        const quartiles = this.calculateQuartiles(values);
+        const quartiles = this.getQuartiles(values);
         
         console.log('Creating markers for', this.currentData.length, 'locations');
         console.log('Value range:', Math.min(...values), 'to', Math.max(...values));
@@ -1125,7 +1371,7 @@ class HealthEquityMap {
                 stateGroups[state].healthValues.push(location.Data_Value);
                 
                 // Find matching SDOH data
-                const matchingSDOH = this.findMatchingData(this.overlayHealthData, this.overlaySDOHData, location);
+                const matchingSDOH = this.getOverlaySDOH(location);
                 if (matchingSDOH && matchingSDOH.Data_Value !== null && matchingSDOH.Data_Value !== undefined) {
                     stateGroups[state].sdohValues.push(matchingSDOH.Data_Value);
                 }
@@ -1273,13 +1519,7 @@ class HealthEquityMap {
         
         if (this.showOverlay && state.isOverlay && state.sdohAvgValue !== null) {
             // Overlay mode: create split state marker
-            const healthValues = this.overlayHealthData.map(d => d.Data_Value).filter(v => !isNaN(v));
-            const sdohValues = this.overlaySDOHData.map(d => d.Data_Value).filter(v => !isNaN(v));
-            
-            const healthQuartiles = this.calculateQuartiles(healthValues);
-            const sdohQuartiles = this.calculateQuartiles(sdohValues);
-            
-            marker = this.createSplitMarker(state, healthQuartiles, sdohQuartiles, value, state.sdohAvgValue, radius);
+            marker = this.createSplitMarker(state, this.overlayHealthQuartiles, this.overlaySDOHQuartiles, value, state.sdohAvgValue, radius);
         } else {
             // Regular mode: create normal state marker
             const color = this.getDataColor(value, quartiles, measureName, state);
@@ -1300,8 +1540,7 @@ class HealthEquityMap {
         
         if (this.showOverlay && state.isOverlay && state.sdohAvgValue !== null) {
             // Overlay mode: show both health and SDOH data
-            const sdohValues = this.overlaySDOHData.map(d => d.Data_Value).filter(v => !isNaN(v));
-            const sdohQuartiles = this.calculateQuartiles(sdohValues);
+            const sdohQuartiles = this.overlaySDOHQuartiles;
             const sdohClassification = this.getValueClassification(state.sdohAvgValue, sdohQuartiles);
             
             popupContent = `
@@ -1378,17 +1617,10 @@ class HealthEquityMap {
             // Overlay mode: use population-based radius for size, split colors for data values
             const radius = this.getMarkerRadius(location.TotalPopulation || 15);
             
-            const matchingSDOH = this.findMatchingData(this.overlayHealthData, this.overlaySDOHData, location);
+            const matchingSDOH = this.getOverlaySDOH(location);
             
-            if (matchingSDOH && matchingSDOH.Data_Value !== null && matchingSDOH.Data_Value !== undefined) {
-                // Calculate quartiles for both datasets
-                const healthValues = this.overlayHealthData.map(d => d.Data_Value).filter(v => !isNaN(v));
-                const sdohValues = this.overlaySDOHData.map(d => d.Data_Value).filter(v => !isNaN(v));
-                
-                const healthQuartiles = this.calculateQuartiles(healthValues);
-                const sdohQuartiles = this.calculateQuartiles(sdohValues);
-                
-                marker = this.createSplitMarker(location, healthQuartiles, sdohQuartiles, value, matchingSDOH.Data_Value, radius);
+            if (matchingSDOH) {
+                marker = this.createSplitMarker(location, this.overlayHealthQuartiles, this.overlaySDOHQuartiles, value, matchingSDOH.Data_Value, radius);
             } else {
                 // Fallback to regular marker if no SDOH data
                 const color = this.getDataColor(value, quartiles, measureName, location);
@@ -1438,13 +1670,9 @@ class HealthEquityMap {
         
         if (this.showOverlay) {
             // Overlay mode: show both health and SDOH data
-            const matchingSDOH = this.findMatchingData(this.overlayHealthData, this.overlaySDOHData, location);
-            
-            // Calculate SDOH quartiles for proper color calculation
-            const sdohValues = this.overlaySDOHData.map(d => d.Data_Value).filter(v => !isNaN(v));
-            const sdohQuartiles = this.calculateQuartiles(sdohValues);
-            
-            const sdohClassification = matchingSDOH ? this.getValueClassification(matchingSDOH.Data_Value, sdohQuartiles) : 'Unknown';
+            const matchingSDOH = this.getOverlaySDOH(location);
+            const sdohQuartiles = this.overlaySDOHQuartiles;
+            const sdohClassification = this.getOverlayClassLabel(location.SDOH_Class);
             
             popupContent = `
                 <div class="popup-content">
@@ -1631,31 +1859,22 @@ class HealthEquityMap {
                 return '#95a5a6';
             }
             
-            // Check if overlay data is available
-            if (!this.overlayHealthData || !this.overlaySDOHData) {
+            // Check if overlay quartiles are available
+            if (!this.overlayHealthQuartiles || !this.overlaySDOHQuartiles) {
                 console.warn('Overlay data not available for color calculation');
                 return '#95a5a6';
             }
             
-            // Find matching SDOH data for this location
-            const matchingSDOH = this.findMatchingData(this.overlayHealthData, this.overlaySDOHData, location);
+            // SDOH value joined onto this location by the server
+            const matchingSDOH = this.getOverlaySDOH(location);
             
             if (!matchingSDOH) {
                 console.warn('No matching SDOH data found for location:', location.LocationName);
                 return '#95a5a6';
             }
             
-            // Calculate quartiles for both datasets
-            const healthValues = this.overlayHealthData.map(d => d.Data_Value).filter(v => !isNaN(v));
-            const sdohValues = this.overlaySDOHData.map(d => d.Data_Value).filter(v => !isNaN(v));
-            
-            if (healthValues.length === 0 || sdohValues.length === 0) {
-                console.warn('No valid values found in overlay data');
-                return '#95a5a6';
-            }
-            
-            const healthQuartiles = this.calculateQuartiles(healthValues);
-            const sdohQuartiles = this.calculateQuartiles(sdohValues);
+            const healthQuartiles = this.overlayHealthQuartiles;
+            const sdohQuartiles = this.overlaySDOHQuartiles;
             
             // Calculate individual colors using the same logic as individual modes
             const healthColor = this.calculateHealthColor(value, healthQuartiles);
@@ -1854,7 +2073,9 @@ class HealthEquityMap {
                     <p style="margin: 0.25rem 0 0 0; color: #6c757d; font-size: 0.9rem;">Click on a location marker to see detailed information.</p>
                 </div>
             `;
-            this.showZoomMessage();
+            if (this.showOverlay) {
+                this.showZoomMessage();
+            }
             return;
         } else {
             this.hideZoomMessage();
@@ -1865,8 +2086,8 @@ class HealthEquityMap {
         const avgValue = values.length > 0 ? values.reduce((sum, v) => sum + v, 0) / values.length : 0;
         const totalPopulation = this.currentData.reduce((sum, d) => sum + (d.TotalPopulation || 0), 0);
         
-        // Calculate quartiles
-        const quartiles = this.calculateQuartiles(values);
+        // Quartiles
+        const quartiles = this.getQuartiles(values);
         
         // Calculate outlier-adjusted range using 1.5 IQR rule
         const q1 = quartiles.q1;
@@ -0,0 +1,186 @@
+"""
+Compact column-oriented response formats
+Row records repeat every key and constant per county; these formats send
+each column once, hoist constant columns, dictionary-encode strings and
+(in the binary form) ship numbers as little-endian typed arrays
+
+Binary layout: a little-endian uint32 header length, a UTF-8 JSON header
+padded with spaces so the data starts on an 8-byte boundary, then one
+8-byte aligned buffer per column.  The header lists each column's name,
+type (a JS typed array name without "Array"), byte offset from the start
+of the data and length, so a client can wrap the buffers without copying.
+"""
+
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify
+
+RECORDS_MIME = 'application/json'
+COLUMNS_MIME = 'application/vnd.health-equity.columns+json'
+BINARY_MIME = 'application/vnd.health-equity.columns'
+
+FORMATS = {
+    'records': RECORDS_MIME,
+    'columns': COLUMNS_MIME,
+    'binary': BINARY_MIME,
+}
+
+# Floats ship as float32 when that keeps them exact to this many decimals
+FLOAT_DECIMALS = 4
+
+ALIGNMENT = 8
+
+# Rows of the matrix value block serialized per streamed chunk
+MATRIX_CHUNK_ROWS = 512
+
+
+def negotiate_format(request):
+    """Response format from ?format= or the Accept header (records by default)"""
+    fmt = request.args.get('format')
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format, expected one of {list(FORMATS)}")
+        return fmt
+    best = request.accept_mimetypes.best_match(list(FORMATS.values()), default=RECORDS_MIME)
+    return next(name for name, mime in FORMATS.items() if mime == best)
+
+
+def _smallest_int(values):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values.astype(np.float64)
+
+
+def _narrow_float(values):
+    narrowed = values.astype(np.float32)
+    widened = np.round(narrowed.astype(np.float64), FLOAT_DECIMALS)
+    if np.array_equal(widened, np.round(values, FLOAT_DECIMALS), equal_nan=True):
+        return narrowed
+    return values.astype(np.float64)
+
+
+def split_columns(columns, narrow=False):
+    """Sort columns into typed arrays, string dictionaries and hoisted constants
+
+    ``columns`` maps names to arrays.  Strings become integer
+    codes into a per-column dictionary (-1 for missing).  A column holding a
+    single value in every row becomes a constant.  With ``narrow``, numbers
+    use the smallest typed array that keeps them exact.
+    """
+    arrays = {}
+    dictionaries = {}
+    constants = {}
+    for name in columns:
+        values = np.asarray(columns[name])
+        if len(values) and values.dtype.kind != 'f' and pd.Series(values).nunique(dropna=False) == 1:
+            constants[name] = values[0].item() if hasattr(values[0], 'item') else values[0]
+            continue
+
+        if values.dtype.kind in 'OUS':
+            codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+            dictionaries[name] = [u.item() if hasattr(u, 'item') else u for u in uniques]
+            arrays[name] = _smallest_int(codes) if narrow else codes
+        elif values.dtype.kind == 'b':
+            arrays[name] = values.astype(np.uint8)
+        elif values.dtype.kind in 'iu':
+            arrays[name] = _smallest_int(values) if narrow else values
+        else:
+            values = values.astype(np.float64)
+            if len(values) and not np.isnan(values[0]) and np.all(values == values[0]):
+                constants[name] = float(values[0])
+                continue
+            arrays[name] = _narrow_float(values) if narrow else values
+    return arrays, dictionaries, constants
+
+
+def _column_list(values, null_value=None):
+    values = values.tolist()
+    if null_value is not None:
+        return [None if v == null_value else v for v in values]
+    return [None if isinstance(v, float) and v != v else v for v in values]
+
+
+def encode_columns(columns, meta=None, null_values=None):
+    """Column-oriented JSON body: one list per column, strings as dictionary codes"""
+    null_values = null_values or {}
+    arrays, dictionaries, constants = split_columns(columns)
+    length = len(next(iter(columns.values()))) if len(columns) else 0
+    return {
+        'format': 'columns',
+        'length': int(length),
+        'meta': meta or {},
+        'constants': constants,
+        'dictionaries': dictionaries,
+        'null_values': null_values,
+        'columns': {
+            name: _column_list(values, -1 if name in dictionaries else null_values.get(name))
+            for name, values in arrays.items()
+        },
+    }
+
+
+def encode_binary(columns, meta=None, null_values=None):
+    """Header + aligned little-endian typed-array buffers (see module docstring)"""
+    arrays, dictionaries, constants = split_columns(columns, narrow=True)
+    length = len(next(iter(columns.values()))) if len(columns) else 0
+
+    layout = []
+    buffers = []
+    offset = 0
+    for name, values in arrays.items():
+        data = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<')).tobytes()
+        layout.append({'name': name, 'type': values.dtype.name, 'offset': offset, 'length': len(values)})
+        padding = -len(data) % ALIGNMENT
+        buffers.append(data + b'\0' * padding)
+        offset += len(data) + padding
+
+    header = json.dumps({
+        'format': 'binary',
+        'length': int(length),
+        'meta': meta or {},
+        'constants': constants,
+        'dictionaries': dictionaries,
+        'null_values': null_values or {},
+        'columns': layout,
+    }).encode('utf-8')
+    header += b' ' * (-(4 + len(header)) % ALIGNMENT)
+    return struct.pack('<I', len(header)) + header + b''.join(buffers)
+
+
+def columns_response(fmt, columns, meta=None, null_values=None):
+    """Flask response for the 'columns' or 'binary' format"""
+    if isinstance(columns, pd.DataFrame):
+        columns = {name: columns[name].to_numpy() for name in columns.columns}
+    if fmt == 'binary':
+        response = Response(encode_binary(columns, meta, null_values), mimetype=BINARY_MIME)
+    else:
+        response = jsonify(encode_columns(columns, meta, null_values))
+        response.mimetype = COLUMNS_MIME
+    response.vary.add('Accept')
+    return response
+
+
+def matrix_json_chunks(geography, measures, values, chunk_rows=MATRIX_CHUNK_ROWS):
+    """JSON body of a location x measure matrix, produced in pieces for streaming
+
+    ``geography`` maps column names to arrays sent once; ``values`` is the
+    n x k block (one column per entry of ``measures``), sent row-major with
+    null for missing values.
+    """
+    header = json.dumps({
+        'format': 'matrix',
+        'length': int(len(values)),
+        'measures': measures,
+        'geography': {name: _column_list(np.asarray(column)) for name, column in geography.items()},
+    })
+    yield header[:-1] + ', "values": ['
+    for start in range(0, len(values), chunk_rows):
+        block = values[start:start + chunk_rows]
+        rows = np.where(np.isnan(block), None, block).tolist()
+        yield (', ' if start else '') + json.dumps(rows)[1:-1]
+    yield ']}'